@@ -0,0 +1,56 @@
+from typing import Optional
+from fastapi import Depends, HTTPException, Request, status
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from app.config import settings
+from app.services.auth import AuthService
+from app.services.rate_limit import Rule, auth_limiter
+
+bearer_scheme = HTTPBearer(auto_error=False)
+
+
+async def get_current_user_id(
+        credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme)
+) -> str:
+    if credentials is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+    claims = await AuthService.authenticate(credentials.credentials)
+    return claims["user_id"]
+
+
+async def get_admin_user_id(user_id: str = Depends(get_current_user_id)) -> str:
+    if user_id not in settings.admin_user_ids:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+    return user_id
+
+
+def client_ip(request: Request) -> str:
+    # За прокси адрес клиента подставляет uvicorn (proxy_headers + FORWARDED_ALLOW_IPS)
+    return request.client.host if request.client else "unknown"
+
+
+def auth_rate_limit(scope: str, account_field: str):
+    """
+    Зависимость для входа/регистрации: лимит по IP и по учётной записи из поля
+    тела запроса. Подключается в dependencies роута, поэтому выполняется до
+    остальных зависимостей и до проверки пароля.
+    """
+
+    async def dependency(request: Request):
+        rules = [Rule("ip", client_ip(request), settings.auth_rate_ip_per_minute, settings.auth_rate_ip_burst)]
+        try:
+            # Тело уже прочитано FastAPI, request.json() возвращает его из кэша
+            body = await request.json()
+        except ValueError:
+            body = None
+        account = body.get(account_field) if isinstance(body, dict) else None
+        if isinstance(account, str) and account:
+            rules.append(Rule(
+                "user", account.strip().lower(), settings.auth_rate_user_per_minute, settings.auth_rate_user_burst
+            ))
+        await auth_limiter.hit(scope, rules)
+
+    return dependency
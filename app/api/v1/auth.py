@@ -1,30 +1,47 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+from typing import Optional
 from sqlalchemy.ext.asyncio import AsyncSession
+from app.api.deps import auth_rate_limit, bearer_scheme
 from app.database import get_db
-from app.schemas.user import UserCreate, UserLogin, TokenResponse
+from app.schemas.user import UserCreate, UserLogin, TokenResponse, VerifyEmailRequest
+from app.config import settings
 from app.services.auth import AuthService
+from app.services.genealogy import GenealogyService
+from app.services.ids import new_user_id
+from app.services.mail import send_after_commit
+from app.services.serialization import FastJSONRoute, model_response
+from app.services.stats import StatsService
 from app.models.user import User
 from sqlalchemy import select
+from datetime import timedelta
 import secrets
 
-router = APIRouter(prefix="/auth", tags=["Authentication"])
+router = APIRouter(prefix="/auth", tags=["Authentication"], route_class=FastJSONRoute)
 
 
-@router.post("/register", response_model=TokenResponse)
+@router.post(
+    "/register", response_model=TokenResponse, dependencies=[Depends(auth_rate_limit("register", "email"))]
+)
 async def register(user_data: UserCreate, db: AsyncSession = Depends(get_db)):
+    if user_data.password_confirmation is not None and user_data.password_confirmation != user_data.password:
+        raise HTTPException(status_code=400, detail="Passwords do not match")
+
     # Проверка существующего email
     result = await db.execute(select(User).where(User.email == user_data.email))
     if result.scalar_one_or_none():
         raise HTTPException(status_code=400, detail="Email already registered")
 
     # Проверка спонсора
+    sponsor = None
     if user_data.sponsor_id:
-        sponsor = await db.execute(select(User).where(User.id == user_data.sponsor_id))
-        if not sponsor.scalar_one_or_none():
+        result = await db.execute(select(User).where(User.id == user_data.sponsor_id))
+        sponsor = result.scalar_one_or_none()
+        if not sponsor:
             raise HTTPException(status_code=400, detail="Invalid sponsor ID")
 
     # Создание пользователя
-    user_id = f"ID{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    user_id = new_user_id()
     referral_code = secrets.token_urlsafe(8).upper()
 
     new_user = User(
@@ -33,40 +50,84 @@ async def register(user_data: UserCreate, db: AsyncSession = Depends(get_db)):
         email=user_data.email,
         phone=user_data.phone,
         city=user_data.city,
-        hashed_password=AuthService.get_password_hash(user_data.password),
+        hashed_password=await AuthService.hash_password(user_data.password),
         partnership_type=user_data.partnership_type,
         sponsor_id=user_data.sponsor_id,
         referral_code=referral_code
     )
+    GenealogyService.attach(new_user, sponsor)
 
     db.add(new_user)
+    await db.flush()
+    await StatsService.on_user_registered(db, new_user)
+    # Письмо уходит в очередь после commit, SMTP не задерживает ответ
+    email_token = AuthService.create_email_token(user_id, new_user.email)
+    send_after_commit(db.sync_session, new_user.email, "verify_email", {
+        "full_name": new_user.full_name,
+        "user_id": user_id,
+        "verify_url": f"{settings.frontend_url}/verify-email?token={email_token}",
+    })
     await db.commit()
     await db.refresh(new_user)
 
     # Создание токена
     access_token = AuthService.create_access_token(data={"sub": user_id})
 
-    return TokenResponse(
+    return model_response(TokenResponse(
         token=access_token,
         user=new_user
-    )
+    ))
 
 
-@router.post("/login", response_model=TokenResponse)
+@router.post(
+    "/login", response_model=TokenResponse, dependencies=[Depends(auth_rate_limit("login", "user_id"))]
+)
 async def login(credentials: UserLogin, db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(User).where(User.id == credentials.user_id))
     user = result.scalar_one_or_none()
 
-    if not user or not AuthService.verify_password(credentials.password, user.hashed_password):
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+
+    verified, new_hash = await AuthService.verify_and_update_password(
+        credentials.password, user.hashed_password
+    )
+    if not verified:
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
+    # Прозрачное обновление хэша после повышения bcrypt_rounds
+    if new_hash:
+        user.hashed_password = new_hash
+
     expires_delta = timedelta(days=30) if credentials.remember_me else None
     access_token = AuthService.create_access_token(
         data={"sub": user.id},
         expires_delta=expires_delta
     )
 
-    return TokenResponse(
+    return model_response(TokenResponse(
         token=access_token,
         user=user
-    )
\ No newline at end of file
+    ))
+
+
+@router.post("/verify-email")
+async def verify_email(data: VerifyEmailRequest, db: AsyncSession = Depends(get_db)):
+    claims = AuthService.verify_email_token(data.token)
+    user = await db.get(User, claims["sub"])
+    # Ссылка действительна только для адреса, на который её отправили
+    if user is None or user.email != claims.get("email"):
+        raise HTTPException(status_code=400, detail="Invalid or expired link")
+    user.email_verified = True
+    return {"success": True, "message": "Email verified"}
+
+
+@router.post("/logout")
+async def logout(credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme)):
+    if credentials:
+        try:
+            await AuthService.revoke_token(credentials.credentials)
+        except HTTPException:
+            # Просроченный или чужой токен отзывать незачем — выход идемпотентен
+            pass
+    return {"success": True, "message": "Logged out"}
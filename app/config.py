@@ -1,24 +1,102 @@
+from pydantic import model_validator
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from typing import Optional
 
 
 class Settings(BaseSettings):
     # Database
     database_url: str
+    database_read_url: Optional[str] = None
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    db_pool_timeout: float = 10.0
+    db_pool_recycle: int = 1800
+    db_pool_pre_ping: bool = True
+    db_statement_cache_size: int = 500
+    db_pgbouncer: bool = False
+    # Сколько секунд после записи клиент читает из primary, а не из реплики
+    db_replica_sticky_seconds: int = 5
 
     # Security
     secret_key: str
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 1440
+    bcrypt_rounds: int = 12
+    password_hash_workers: int = 4
+    password_hash_max_queue: int = 64
+    token_cache_max_entries: int = 50000
+    revocation_bloom_bits: int = 1 << 23
+    revocation_bloom_hashes: int = 7
+    revocation_rebuild_interval: int = 3600
+    # Лимит попыток входа и регистрации (token bucket): в минуту и допустимый
+    # всплеск — по IP клиента и по учётной записи (user_id / email)
+    auth_rate_ip_per_minute: int = 30
+    auth_rate_ip_burst: int = 10
+    auth_rate_user_per_minute: int = 5
+    auth_rate_user_burst: int = 5
+    rate_limit_local_max_entries: int = 100000
+    # Пользователи с доступом к /api/v1/admin/*
+    admin_user_ids: list[str] = []
 
     # Redis
     redis_url: str
 
-    # Email
+    # Cache
+    cache_local_ttl: int = 30
+    cache_local_max_entries: int = 10000
+    cache_redis_ttl: int = 300
+
+    # Email: пустой smtp_user — без AUTH; smtp_start_tls=None — STARTTLS, если сервер умеет
     smtp_host: str
     smtp_port: int
     smtp_user: str
     smtp_password: str
+    smtp_use_tls: bool = False
+    smtp_start_tls: Optional[bool] = None
+    smtp_timeout: float = 10.0
+    smtp_pool_size: int = 2
+    smtp_idle_timeout: float = 60.0
+    mail_from: str = "Fenix International <noreply@fenix.kz>"
+    # Очередь писем разбирают воркеры веб-сервера; False — если запущен
+    # отдельный python -m app.scripts.mail_worker
+    mail_worker_enabled: bool = True
+    mail_batch_size: int = 50
+    mail_max_attempts: int = 6
+    mail_retry_base_seconds: float = 30.0
+    mail_visibility_timeout: float = 300.0
+    mail_poll_interval: float = 1.0
+    # Ссылки в письмах
+    frontend_url: str = "http://localhost:5173"
+
+    # Media: изображения товаров. media_accel_redirect — префикс internal-location
+    # nginx (например "/protected-media"), тогда файлы отдаёт nginx через X-Accel-Redirect
+    media_root: str = "media"
+    media_url: str = "/media"
+    media_accel_redirect: Optional[str] = None
+    image_workers: int = 2
+    image_max_queue: int = 32
+    image_max_bytes: int = 10 * 1024 * 1024
+
+    # Product views (write-behind)
+    views_flush_interval: float = 5.0
+    views_max_pending: int = 10000
+    views_max_buffered: int = 100000
+
+    # Cart
+    min_order_amount: float = 10000
+    cart_price_ttl: int = 60
+    cart_price_max_entries: int = 20000
+    stock_reservation_minutes: int = 15
+
+    # Commissions: доля комиссионного пула товара на каждый уровень аплайна
+    commission_level_shares: list[float] = [0.5, 0.2, 0.1, 0.1, 0.1]
+
+    # IDs: срок аренды номера узла генератора в Redis (продлевается каждую треть срока)
+    ids_node_lease_ttl: int = 60
+
+    # Stats: сколько дней хранить журнал применённых событий
+    stats_events_retention_days: int = 90
 
     # CloudPayments
     cloudpayments_public_key: str
@@ -27,13 +105,52 @@ class Settings(BaseSettings):
     # CORS
     allowed_origins: list[str]
 
+    # Logging: доли выборки INFO-логов по шаблону пути роута, например
+    # {"/api/v1/shop/products/{product_id}": 0.01}; остальные роуты — полностью
+    log_level: str = "INFO"
+    log_queue_size: int = 10000
+    log_sample_rates: dict[str, float] = {}
+
     # Application
     debug: bool = False
     environment: str = "production"
 
+    # Server (python -m app.server): 0 воркеров — по числу доступных ядер
+    web_host: str = "0.0.0.0"
+    web_port: int = 8000
+    web_workers: int = 0
+    web_graceful_timeout: int = 30
+    web_keepalive: int = 5
+    web_max_requests: int = 0
+
     class Config:
         env_file = ".env"
 
+    @model_validator(mode="after")
+    def check_consistency(self):
+        """Ошибки конфигурации — при старте процесса, а не на первом запросе"""
+        errors = []
+        if sum(self.commission_level_shares) > 1:
+            errors.append("commission_level_shares: сумма долей больше 1")
+        if self.db_pool_size < 1 or self.db_max_overflow < 0:
+            errors.append("db_pool_size >= 1 и db_max_overflow >= 0")
+        if self.password_hash_workers < 1:
+            errors.append("password_hash_workers >= 1")
+        if self.smtp_pool_size < 1 or self.mail_batch_size < 1:
+            errors.append("smtp_pool_size >= 1 и mail_batch_size >= 1")
+        if self.image_workers < 1:
+            errors.append("image_workers >= 1")
+        if self.environment == "production":
+            if self.debug:
+                errors.append("debug в production")
+            if len(self.secret_key) < 32:
+                errors.append("secret_key короче 32 символов")
+            if not self.database_url.startswith("postgresql"):
+                errors.append("database_url в production должен указывать на PostgreSQL")
+        if errors:
+            raise ValueError("; ".join(errors))
+        return self
+
 
 @lru_cache()
 def get_settings():
@@ -1,14 +1,196 @@
+import time
+import uuid
+
+from fastapi import Request
+from starlette.datastructures import MutableHeaders
+from sqlalchemy import event
+from sqlalchemy.exc import InvalidRequestError, TimeoutError as PoolTimeoutError
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
-from sqlalchemy.orm import declarative_base
+from sqlalchemy.orm import declarative_base, Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
 from app.config import settings
 
-engine = create_async_engine(settings.database_url, echo=settings.debug)
+# Cookie, которой помечается клиент после собственной записи: пока она жива,
+# его GET-запросы идут в primary, а не в реплику (read-your-writes)
+PRIMARY_STICKY_COOKIE = "fenix_primary"
+
+
+class PoolMetricsMixin:
+    """
+    Счётчики пула на самом экземпляре пула: после engine.dispose() пул
+    пересоздаётся вместе со своими счётчиками, и pool_metrics() читает
+    актуальный engine.sync_engine.pool.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = {"checkouts": 0, "in_use": 0, "wait_ms_total": 0.0, "wait_ms_max": 0.0, "timeouts": 0}
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            # Только ожидание свободного соединения; отказ в подключении — не таймаут пула
+            self.metrics["timeouts"] += 1
+            raise
+        finally:
+            waited = (time.perf_counter() - started) * 1000
+            self.metrics["checkouts"] += 1
+            self.metrics["wait_ms_total"] += waited
+            self.metrics["wait_ms_max"] = max(self.metrics["wait_ms_max"], waited)
+        self.metrics["in_use"] += 1
+        return connection
+
+    def _do_return_conn(self, record):
+        self.metrics["in_use"] -= 1
+        super()._do_return_conn(record)
+
+
+class InstrumentedPool(PoolMetricsMixin, AsyncAdaptedQueuePool):
+    """QueuePool, который замеряет ожидание свободного соединения"""
+
+
+class InstrumentedNullPool(PoolMetricsMixin, NullPool):
+    """NullPool (за pgbouncer) со счётчиком открытых соединений"""
+
+
+def engine_options(url: str) -> dict:
+    options = {"echo": settings.debug}
+    if make_url(url).get_backend_name() != "postgresql":
+        return options
+
+    connect_args = {"statement_cache_size": settings.db_statement_cache_size}
+    if settings.db_pgbouncer:
+        # pgbouncer в режиме transaction: соединения сервера переиспользуются
+        # между клиентами, поэтому именованные prepared statements недопустимы,
+        # а пулом управляет сам pgbouncer
+        connect_args = {
+            "statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+        }
+        return {**options, "poolclass": InstrumentedNullPool, "connect_args": connect_args}
+
+    return {
+        **options,
+        "poolclass": InstrumentedPool,
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+        "connect_args": connect_args,
+    }
+
+
+engine = create_async_engine(settings.database_url, **engine_options(settings.database_url))
+# Реплика только читает, поэтому её соединения сразу в AUTOCOMMIT; без реплики
+# чтение идёт в primary, и режим переключается на время выдачи соединения
+read_engine = (
+    create_async_engine(
+        settings.database_read_url, isolation_level="AUTOCOMMIT", **engine_options(settings.database_read_url)
+    )
+    if settings.database_read_url else engine
+)
+
+
+def _casefold(value):
+    return value.casefold() if isinstance(value, str) else value
+
+
+def _register_sqlite_functions(engine_):
+    """lower() и LIKE в SQLite складывают регистр только у ASCII — для кириллицы нужен casefold()"""
+    if engine_.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(engine_.sync_engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        dbapi_connection.create_function("casefold", 1, _casefold, deterministic=True)
+
+
+_register_sqlite_functions(engine)
+if read_engine is not engine:
+    _register_sqlite_functions(read_engine)
+
 AsyncSessionLocal = async_sessionmaker(
     engine, class_=AsyncSession, expire_on_commit=False
 )
 
+
+class ReadOnlySession(Session):
+    """Сессия без записи: flush с изменениями — ошибка, а не тихий INSERT/UPDATE"""
+
+    def flush(self, objects=None):
+        if self.new or self.dirty or self.deleted:
+            raise InvalidRequestError("Сессия только для чтения: изменения не сохраняются")
+
+
+class ReadOnlyAsyncSession(AsyncSession):
+    """
+    Работает в AUTOCOMMIT (без BEGIN/COMMIT) и отдаёт соединение в пул сразу
+    после каждого запроса: результат AsyncSession.execute уже буферизован,
+    а commit() в этом режиме не ходит в БД, только освобождает соединение.
+    Объекты после него не протухают (expire_on_commit=False).
+    """
+    sync_session_class = ReadOnlySession
+
+    async def _release(self):
+        await self.commit()
+
+    async def execute(self, *args, **kwargs):
+        try:
+            return await super().execute(*args, **kwargs)
+        finally:
+            await self._release()
+
+    async def scalar(self, *args, **kwargs):
+        try:
+            return await super().scalar(*args, **kwargs)
+        finally:
+            await self._release()
+
+    async def scalars(self, *args, **kwargs):
+        try:
+            return await super().scalars(*args, **kwargs)
+        finally:
+            await self._release()
+
+    async def get(self, *args, **kwargs):
+        try:
+            return await super().get(*args, **kwargs)
+        finally:
+            await self._release()
+
+
+AsyncReadSessionLocal = async_sessionmaker(
+    read_engine if read_engine is not engine else engine.execution_options(isolation_level="AUTOCOMMIT"),
+    class_=ReadOnlyAsyncSession, expire_on_commit=False, autoflush=False
+)
+AsyncPrimaryReadSessionLocal = async_sessionmaker(
+    engine.execution_options(isolation_level="AUTOCOMMIT"),
+    class_=ReadOnlyAsyncSession, expire_on_commit=False, autoflush=False
+)
+
 Base = declarative_base()
 
+def pool_metrics() -> dict:
+    engines = {"primary": engine}
+    if read_engine is not engine:
+        engines["replica"] = read_engine
+    metrics = {}
+    for role, engine_ in engines.items():
+        pool = engine_.sync_engine.pool
+        if isinstance(pool, PoolMetricsMixin):
+            stats = dict(pool.metrics)
+        else:
+            stats = {"in_use": pool.checkedout()} if hasattr(pool, "checkedout") else {}
+        if isinstance(pool, InstrumentedPool):
+            stats.update(size=pool.size(), overflow=pool.overflow(), idle=pool.checkedin())
+        metrics[role] = stats
+    return metrics
+
+
 async def get_db():
     async with AsyncSessionLocal() as session:
         try:
@@ -18,4 +200,49 @@ async def get_db():
             await session.rollback()
             raise
         finally:
-            await session.close()
\ No newline at end of file
+            await session.close()
+
+
+async def get_read_db(request: Request):
+    """
+    Сессия для GET-роутов: без транзакции и commit, соединение держится
+    только на время запроса к БД. Читает из реплики, если клиент недавно
+    ничего не писал.
+    """
+    session_factory = AsyncReadSessionLocal
+    if request.cookies.get(PRIMARY_STICKY_COOKIE):
+        session_factory = AsyncPrimaryReadSessionLocal
+    async with session_factory() as session:
+        yield session
+
+
+class PrimaryStickyMiddleware:
+    """
+    ASGI-middleware: после успешной записи (не GET/HEAD/OPTIONS, статус < 400)
+    ставит клиенту PRIMARY_STICKY_COOKIE, и get_read_db какое-то время читает
+    для него из primary. Подключается, только если настроена реплика.
+    """
+
+    def __init__(self, app, sticky_seconds: int):
+        self.app = app
+        self.cookie = f"{PRIMARY_STICKY_COOKIE}=1; HttpOnly; Max-Age={sticky_seconds}; Path=/; SameSite=lax"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in ("GET", "HEAD", "OPTIONS"):
+            return await self.app(scope, receive, send)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                MutableHeaders(scope=message).append("set-cookie", self.cookie)
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+def dialect_insert(dialect_name: str):
+    """insert() с поддержкой on_conflict_do_* для текущей БД (PostgreSQL или SQLite)"""
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
@@ -1,12 +1,118 @@
 # backend/main.py
 # Полностью рабочая версия с правильным CORS
 
-from fastapi import FastAPI, HTTPException
+import asyncio
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, HTTPException, Depends, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, EmailStr
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from redis.exceptions import RedisError
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional, List
 from datetime import datetime
-import uvicorn
+
+from app.api.deps import get_admin_user_id, get_current_user_id
+from app.api.v1.auth import router as auth_router
+from app.config import settings
+from app.database import (
+    engine, read_engine, get_db, get_read_db, pool_metrics, AsyncReadSessionLocal, InstrumentedPool,
+    PrimaryStickyMiddleware
+)
+from app.models.order import Order, OrderStatus
+from app.models.user import User
+from app.schemas.cart import CartItemAdd, CartItemRemove
+from app.schemas.order import CheckoutRequest
+from app.services.cache import catalog_cache
+from app.services.cart import cart_service
+from app.services.catalog import CatalogService
+from app.services.genealogy import GenealogyService, relative_level
+from app.services.hashing import password_hasher
+from app.services.logs import log_pipeline, logger, RequestContextMiddleware
+from app.services.mail import mail_queue
+from app.services.metrics import MetricsMiddleware, instrument_engine, render_stats, request_metrics
+from app.services.http_cache import conditional_response
+from app.services.ids import id_generator
+from app.services.images import ProductImageService, image_processor, media_response
+from app.services.orders import OrderService
+from app.services.rate_limit import auth_limiter
+from app.services.product_sync import ProductSyncService
+from app.services.serialization import FastJSONResponse, FastJSONRoute
+from app.services.stats import StatsService
+from app.services.tokens import revocations, verified_tokens
+from app.services.views import view_counter
+
+log = logger.getChild("api")
+
+
+# ========== ЗАПУСК И ОСТАНОВКА ==========
+
+async def warm_pool(engine_):
+    """Открывает соединения пула заранее; заодно проверяет, что БД доступна"""
+    pool = engine_.sync_engine.pool
+    size = pool.size() if isinstance(pool, InstrumentedPool) else 1
+
+    async def ping():
+        async with engine_.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+    await asyncio.gather(*(ping() for _ in range(size)))
+
+
+async def warm_caches():
+    """Категории и первая страница каталога — самые частые запросы после деплоя"""
+    try:
+        async with AsyncReadSessionLocal() as db:
+            await CatalogService.categories_body(db)
+            await CatalogService.list_products_cached(
+                db, category_id=None, page=1, limit=20, sort=None, search=None, cursor=None
+            )
+    except Exception:
+        log.warning("⚠️ Не удалось прогреть кэш каталога", exc_info=True)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    log_pipeline.start()
+    # Без БД воркер не поднимается: ошибка при старте, а не на первом запросе
+    await warm_pool(engine)
+    if read_engine is not engine:
+        await warm_pool(read_engine)
+    try:
+        await cart_service.redis.ping()
+    except (RedisError, OSError):
+        log.warning("⚠️ Redis недоступен: кэш работает локально, корзины отвечают 503, "
+                    "запросы с токеном отклоняются до подключения (отзыв не проверить)")
+
+    await id_generator.start(cart_service.redis)
+    await catalog_cache.start()
+    await revocations.start()
+    await view_counter.start()
+    if settings.mail_worker_enabled:
+        await mail_queue.start()
+    await warm_caches()
+    log.info("🚀 Воркер готов")
+
+    yield
+
+    # Сюда сервер приходит, когда новые соединения уже не принимаются,
+    # а начатые запросы завершены (или истёк web_graceful_timeout)
+    log.info("🛑 Остановка воркера")
+    await view_counter.stop()
+    await mail_queue.stop()
+    await catalog_cache.stop()
+    await revocations.stop()
+    await id_generator.stop()
+    await cart_service.close()
+    await auth_limiter.close()
+    password_hasher.shutdown()
+    image_processor.shutdown()
+    await engine.dispose()
+    if read_engine is not engine:
+        await read_engine.dispose()
+    log_pipeline.stop()
+
 
 # Создаем приложение
 app = FastAPI(
@@ -14,8 +120,12 @@ app = FastAPI(
     description="REST API для MLM платформы",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=FastJSONResponse,
+    lifespan=lifespan
 )
+# До объявления роутов: ответы-словари кодируются orjson без jsonable_encoder
+app.router.route_class = FastJSONRoute
 
 # ==========================================
 # КРИТИЧНО! CORS ДОЛЖЕН БЫТЬ ПЕРВЫМ!
@@ -36,25 +146,16 @@ app.add_middleware(
     expose_headers=["*"]
 )
 
+# Read-your-writes нужен, только когда GET читают из реплики
+if settings.database_read_url:
+    app.add_middleware(PrimaryStickyMiddleware, sticky_seconds=settings.db_replica_sticky_seconds)
+app.add_middleware(MetricsMiddleware)
+# Последним — значит внешним: request id и выборка логов видны всем слоям ниже
+app.add_middleware(RequestContextMiddleware, sample_rates=settings.log_sample_rates)
 
-# ========== МОДЕЛИ ДАННЫХ ==========
-
-class RegisterRequest(BaseModel):
-    full_name: str
-    email: EmailStr
-    phone: str
-    sponsor_id: str
-    city: str
-    password: str
-    password_confirmation: str
-    partnership_type: str
-    agree_terms: bool = True
-
-
-class LoginRequest(BaseModel):
-    user_id: str
-    password: str
-    remember_me: bool = False
+instrument_engine(engine)
+if read_engine is not engine:
+    instrument_engine(read_engine)
 
 
 # ========== КОРНЕВЫЕ РОУТЫ ==========
@@ -75,112 +176,54 @@ async def root():
     }
 
 
+def service_stats() -> dict:
+    return {
+        "cache": catalog_cache.stats,
+        "password_hasher": password_hasher.stats,
+        "rate_limit": {**auth_limiter.stats, "local_keys": len(auth_limiter.local)},
+        "images": image_processor.stats,
+        "tokens": {**verified_tokens.stats, **revocations.stats},
+        "views": {**view_counter.stats, "pending": view_counter.pending},
+        "mail": {**mail_queue.stats, "smtp": mail_queue.smtp.stats},
+        "db_pool": pool_metrics(),
+        "logs": log_pipeline.stats
+    }
+
+
 @app.get("/health")
 async def health():
     """Health check"""
     return {
         "status": "healthy",
-        "timestamp": datetime.utcnow().isoformat()
+        "timestamp": datetime.utcnow().isoformat(),
+        **service_stats()
     }
 
 
-# ========== АУТЕНТИФИКАЦИЯ ==========
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Метрики воркера в текстовом формате Prometheus"""
+    lines = [*auth_limiter.rejected.render(), *render_stats(service_stats())]
+    body = request_metrics.render() + "\n".join(lines) + "\n"
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4; charset=utf-8")
 
-@app.post("/api/v1/auth/register")
-async def register(data: RegisterRequest):
-    """Регистрация нового пользователя"""
-    print(f"📝 Регистрация: {data.email}")
-
-    # Проверка паролей
-    if data.password != data.password_confirmation:
-        raise HTTPException(status_code=400, detail="Пароли не совпадают")
-
-    # Генерируем ID
-    user_id = f"ID{datetime.now().strftime('%Y%m%d%H%M%S')}"
-
-    return {
-        "success": True,
-        "token": f"token_{user_id}",
-        "user": {
-            "id": user_id,
-            "full_name": data.full_name,
-            "email": data.email,
-            "phone": data.phone,
-            "city": data.city,
-            "partnership_type": data.partnership_type,
-            "status": "active",
-            "balance": 0,
-            "bonus_balance": 0
-        }
-    }
-
-
-@app.post("/api/v1/auth/login")
-async def login(data: LoginRequest):
-    """Авторизация пользователя"""
-    print(f"🔐 Вход: {data.user_id}")
-
-    return {
-        "success": True,
-        "token": f"token_{data.user_id}",
-        "user": {
-            "id": data.user_id,
-            "full_name": "Тестовый Пользователь",
-            "email": "test@example.com",
-            "partnership_type": "leader",
-            "status": "active",
-            "balance": 50000,
-            "bonus_balance": 1500
-        }
-    }
 
+# ========== АУТЕНТИФИКАЦИЯ ==========
+# Регистрация, вход и выход — роутер app.api.v1.auth: bcrypt в пуле потоков,
+# лимит попыток до проверки пароля, JWT для эндпоинтов ниже
 
-@app.post("/api/v1/auth/logout")
-async def logout():
-    """Выход"""
-    return {"success": True, "message": "Выход выполнен"}
+app.include_router(auth_router, prefix="/api/v1")
 
 
 # ========== МАГАЗИН - КАТЕГОРИИ ==========
 
 @app.get("/api/v1/shop/categories")
-async def get_categories():
-    """Получить список категорий"""
-    print("📦 Запрос категорий")
+async def get_categories(request: Request, db: AsyncSession = Depends(get_read_db)):
+    """Получить список категорий (поддерживает If-None-Match)"""
+    log.info("📦 Запрос категорий")
 
-    return {
-        "success": True,
-        "data": [
-            {
-                "id": 1,
-                "name": "Косметика",
-                "slug": "cosmetics",
-                "image_url": "/images/categories/cosmetics.jpg",
-                "product_count": 25
-            },
-            {
-                "id": 2,
-                "name": "Леденцы",
-                "slug": "candies",
-                "image_url": "/images/categories/candies.jpg",
-                "product_count": 15
-            },
-            {
-                "id": 3,
-                "name": "Витамины",
-                "slug": "vitamins",
-                "image_url": "/images/categories/vitamins.jpg",
-                "product_count": 30
-            },
-            {
-                "id": 4,
-                "name": "Батончики",
-                "slug": "bars",
-                "image_url": "/images/categories/bars.jpg",
-                "product_count": 12
-            }
-        ]
-    }
+    body, etag = await CatalogService.categories_body(db)
+    return conditional_response(request, body, etag)
 
 
 # ========== МАГАЗИН - ПРОДУКТЫ ==========
@@ -190,213 +233,133 @@ async def get_products(
         category_id: Optional[int] = None,
         page: int = 1,
         limit: int = 20,
-        sort: str = "popular",
-        search: Optional[str] = None
+        sort: Optional[str] = None,
+        search: Optional[str] = None,
+        cursor: Optional[str] = None,
+        db: AsyncSession = Depends(get_read_db)
 ):
-    """Получить список продуктов"""
-    print(f"🛍️ Запрос продуктов (категория: {category_id})")
-
-    # Тестовые данные
-    all_products = [
-        {
-            "id": "prod_001",
-            "name": "Крем для лица антивозрастной",
-            "description": "Натуральный крем для ежедневного ухода",
-            "price": 8500,
-            "old_price": 12000,
-            "discount_percent": 30,
-            "currency": "KZT",
-            "category_id": 1,
-            "category_name": "Косметика",
-            "images": ["/images/products/cream1.jpg"],
-            "in_stock": True,
-            "stock_quantity": 50,
-            "bonus_points": 85,
-            "rating": 4.5,
-            "reviews_count": 23
-        },
-        {
-            "id": "prod_002",
-            "name": "Витамины группы B",
-            "description": "Комплекс витаминов для энергии",
-            "price": 5500,
-            "old_price": None,
-            "discount_percent": 0,
-            "currency": "KZT",
-            "category_id": 3,
-            "category_name": "Витамины",
-            "images": ["/images/products/vitamins1.jpg"],
-            "in_stock": True,
-            "stock_quantity": 100,
-            "bonus_points": 55,
-            "rating": 4.8,
-            "reviews_count": 45
-        },
-        {
-            "id": "prod_003",
-            "name": "Леденцы с медом",
-            "description": "Натуральные леденцы для горла",
-            "price": 1200,
-            "old_price": 1500,
-            "discount_percent": 20,
-            "currency": "KZT",
-            "category_id": 2,
-            "category_name": "Леденцы",
-            "images": ["/images/products/candy1.jpg"],
-            "in_stock": True,
-            "stock_quantity": 200,
-            "bonus_points": 12,
-            "rating": 4.3,
-            "reviews_count": 67
-        },
-        {
-            "id": "prod_004",
-            "name": "Протеиновый батончик",
-            "description": "Батончик с высоким содержанием белка",
-            "price": 800,
-            "old_price": None,
-            "discount_percent": 0,
-            "currency": "KZT",
-            "category_id": 4,
-            "category_name": "Батончики",
-            "images": ["/images/products/bar1.jpg"],
-            "in_stock": True,
-            "stock_quantity": 150,
-            "bonus_points": 8,
-            "rating": 4.6,
-            "reviews_count": 34
-        },
-        {
-            "id": "prod_005",
-            "name": "Сыворотка для лица",
-            "description": "Увлажняющая сыворотка",
-            "price": 12000,
-            "old_price": 15000,
-            "discount_percent": 20,
-            "currency": "KZT",
-            "category_id": 1,
-            "category_name": "Косметика",
-            "images": ["/images/products/serum1.jpg"],
-            "in_stock": True,
-            "stock_quantity": 30,
-            "bonus_points": 120,
-            "rating": 4.7,
-            "reviews_count": 18
-        },
-        {
-            "id": "prod_006",
-            "name": "Витамин C",
-            "description": "Для укрепления иммунитета",
-            "price": 3500,
-            "old_price": None,
-            "discount_percent": 0,
-            "currency": "KZT",
-            "category_id": 3,
-            "category_name": "Витамины",
-            "images": ["/images/products/vitamin_c.jpg"],
-            "in_stock": True,
-            "stock_quantity": 120,
-            "bonus_points": 35,
-            "rating": 4.9,
-            "reviews_count": 89
-        }
-    ]
-
-    # Фильтрация по категории
-    if category_id:
-        products = [p for p in all_products if p["category_id"] == category_id]
-    else:
-        products = all_products
+    """Получить список продуктов (keyset-пагинация через cursor)"""
+    log.info("🛍️ Запрос продуктов", extra={"category_id": category_id})
+
+    listing = await CatalogService.list_products_cached(
+        db,
+        category_id=category_id,
+        page=page,
+        limit=limit,
+        sort=sort,
+        search=search,
+        cursor=cursor,
+    )
 
     return {
         "success": True,
-        "data": products,
-        "pagination": {
-            "current_page": page,
-            "total_pages": 1,
-            "total_items": len(products),
-            "items_per_page": limit
-        }
+        **listing
     }
 
 
 @app.get("/api/v1/shop/products/{product_id}")
-async def get_product(product_id: str):
-    """Получить детали продукта"""
-    print(f"🔍 Запрос продукта: {product_id}")
+async def get_product(product_id: str, request: Request, db: AsyncSession = Depends(get_read_db)):
+    """Получить детали продукта (поддерживает If-None-Match)"""
+    log.info("🔍 Запрос продукта", extra={"product_id": product_id})
 
-    return {
-        "success": True,
-        "data": {
-            "id": product_id,
-            "name": "Крем для лица антивозрастной",
-            "full_description": "Натуральный крем с органическими компонентами для ежедневного ухода за кожей лица. Подходит для всех типов кожи. Содержит витамины A, E и натуральные масла.",
-            "price": 8500,
-            "old_price": 12000,
-            "discount_percent": 30,
-            "currency": "KZT",
-            "category": {"id": 1, "name": "Косметика"},
-            "images": [
-                "/images/products/cream1.jpg",
-                "/images/products/cream2.jpg"
-            ],
-            "in_stock": True,
-            "stock_quantity": 50,
-            "bonus_points": 85,
-            "specifications": {
-                "volume": "50ml",
-                "origin": "Казахстан",
-                "ingredients": "Натуральные компоненты",
-                "shelf_life": "24 месяца"
-            },
-            "reviews": [],
-            "rating": 4.5,
-            "reviews_count": 23
-        }
-    }
+    body, etag = await CatalogService.product_body(db, product_id)
+    await view_counter.hit(product_id)
+    return conditional_response(request, body, etag)
 
 
 # ========== КОРЗИНА ==========
 
 @app.post("/api/v1/shop/cart/add")
-async def add_to_cart(item: dict):
-    """Добавить в корзину"""
-    product_id = item.get("product_id")
-    quantity = item.get("quantity", 1)
+async def add_to_cart(
+        item: CartItemAdd,
+        user_id: str = Depends(get_current_user_id),
+        db: AsyncSession = Depends(get_db)
+):
+    """Добавить в корзину (атомарное увеличение количества)"""
+    log.info("🛒 Добавление в корзину", extra={"product_id": item.product_id, "quantity": item.quantity})
+
+    return {
+        "success": True,
+        "cart": await cart_service.add(db, user_id, item.product_id, item.quantity)
+    }
 
-    print(f"🛒 Добавление в корзину: {product_id} x{quantity}")
 
+@app.post("/api/v1/shop/cart/remove")
+async def remove_from_cart(
+        item: CartItemRemove,
+        user_id: str = Depends(get_current_user_id),
+        db: AsyncSession = Depends(get_db)
+):
+    """Уменьшить количество или убрать позицию"""
     return {
         "success": True,
-        "cart": {
-            "items": [
-                {
-                    "product_id": product_id,
-                    "name": "Крем для лица",
-                    "image": "/images/products/cream1.jpg",
-                    "quantity": quantity,
-                    "price": 8500,
-                    "subtotal": 8500 * quantity
-                }
-            ],
-            "total": 8500 * quantity,
-            "bonus_points_earned": 85 * quantity,
-            "min_order_amount": 10000,
-            "is_valid_for_checkout": (8500 * quantity) >= 10000
-        }
+        "cart": await cart_service.remove(db, user_id, item.product_id, item.quantity)
     }
 
 
+@app.delete("/api/v1/shop/cart")
+async def clear_cart(user_id: str = Depends(get_current_user_id)):
+    """Очистить корзину"""
+    await cart_service.clear(user_id)
+    return {"success": True}
+
+
 @app.get("/api/v1/shop/cart")
-async def get_cart():
+async def get_cart(user_id: str = Depends(get_current_user_id), db: AsyncSession = Depends(get_read_db)):
     """Получить корзину"""
     return {
         "success": True,
-        "cart": {
-            "items": [],
-            "total": 0,
-            "min_order_amount": 10000,
-            "is_valid_for_checkout": False
+        "cart": await cart_service.get(db, user_id)
+    }
+
+
+# ========== ЗАКАЗЫ ==========
+
+@app.post("/api/v1/shop/orders")
+async def create_order(
+        data: CheckoutRequest,
+        user_id: str = Depends(get_current_user_id),
+        db: AsyncSession = Depends(get_db)
+):
+    """Оформление заказа: остатки списываются атомарно одним запросом"""
+    if data.items is not None:
+        quantities: dict[str, int] = {}
+        for item in data.items:
+            quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+    else:
+        quantities = await cart_service.take(user_id)
+
+    log.info("🧾 Оформление заказа", extra={"user_id": user_id, "items": len(quantities)})
+
+    try:
+        order = await OrderService.place_order(
+            db,
+            user_id,
+            quantities,
+            payment_method=data.payment_method,
+            customer_info=data.customer_info,
+            delivery_address=data.delivery_address,
+            comment=data.comment
+        )
+        await db.commit()
+    except Exception:
+        # Заказ не оформлен (нет остатка, сумма ниже минимальной, ошибка БД) —
+        # забранные из корзины позиции возвращаются
+        if data.items is None:
+            await cart_service.restore(user_id, quantities)
+        raise
+
+    return {
+        "success": True,
+        "order": {
+            "id": order.id,
+            "order_number": order.order_number,
+            "status": order.status,
+            "payment_status": order.payment_status,
+            "items": order.items,
+            "total": order.total,
+            "bonus_earned": order.bonus_earned,
+            "reserved_until": order.reserved_until.isoformat()
         }
     }
 
@@ -404,46 +367,174 @@ async def get_cart():
 # ========== ЛИЧНЫЙ КАБИНЕТ ==========
 
 @app.get("/api/v1/cabinet/dashboard")
-async def get_dashboard():
-    """Дашборд личного кабинета"""
-    print("📊 Запрос дашборда")
+async def get_dashboard(user_id: str = Depends(get_current_user_id), db: AsyncSession = Depends(get_read_db)):
+    """Дашборд личного кабинета: статистика предрасчитана, один запрос по PK"""
+    log.info("📊 Запрос дашборда")
+
+    row = await StatsService.get_dashboard_row(db, user_id)
+    if row is None:
+        raise HTTPException(status_code=404, detail="Пользователь не найден")
+    user, stats = row
 
     return {
         "success": True,
         "data": {
             "user": {
-                "id": "TEST123",
-                "full_name": "Тестовый Пользователь",
-                "email": "test@example.com",
-                "partnership_type": "leader",
-                "status": "active"
+                "id": user.id,
+                "full_name": user.full_name,
+                "email": user.email,
+                "partnership_type": user.partnership_type,
+                "status": user.status
             },
             "balances": {
-                "main_balance": 50000,
-                "bonus_balance": 1500,
-                "frozen_balance": 5000,
+                "main_balance": user.main_balance,
+                "bonus_balance": user.bonus_balance,
+                "frozen_balance": user.frozen_balance,
                 "currency": "KZT"
             },
             "statistics": {
-                "total_orders": 25,
-                "total_purchases": 125000,
-                "total_earnings": 45000,
-                "active_referrals": 12,
-                "team_size": 35
+                "total_orders": stats.total_orders if stats else 0,
+                "total_purchases": stats.total_purchases if stats else 0,
+                "total_earnings": stats.total_earnings if stats else 0,
+                "active_referrals": stats.active_referrals if stats else 0,
+                "team_size": stats.team_size if stats else 0
             },
             "recent_activities": []
         }
     }
 
 
+def team_member_to_dict(user: User, level: int) -> dict:
+    return {
+        "id": user.id,
+        "full_name": user.full_name,
+        "partnership_type": user.partnership_type,
+        "status": user.status,
+        "sponsor_id": user.sponsor_id,
+        "level": level,
+    }
+
+
+@app.get("/api/v1/cabinet/team")
+async def get_team(
+        max_depth: Optional[int] = None,
+        user_id: str = Depends(get_current_user_id),
+        db: AsyncSession = Depends(get_read_db)
+):
+    """Структура: размер команды и количество партнёров по уровням"""
+    summary = await GenealogyService.team_summary(db, user_id)
+    if max_depth is not None:
+        summary["levels"] = [level for level in summary["levels"] if level["level"] <= max_depth]
+    return {"success": True, "data": summary}
+
+
+@app.get("/api/v1/cabinet/team/members")
+async def get_team_members(
+        max_depth: Optional[int] = None,
+        after: Optional[str] = None,
+        limit: int = Query(50, ge=1, le=200),
+        user_id: str = Depends(get_current_user_id),
+        db: AsyncSession = Depends(get_read_db)
+):
+    """Даунлайн постранично; after — sponsor_path последнего элемента прошлой страницы"""
+    members = await GenealogyService.downline(db, user_id, max_depth=max_depth, after=after, limit=limit)
+    return {
+        "success": True,
+        "data": [team_member_to_dict(member, relative_level(member.sponsor_path, user_id)) for member in members],
+        "next_after": members[-1].sponsor_path if len(members) == limit else None
+    }
+
+
+@app.get("/api/v1/cabinet/team/upline")
+async def get_upline(user_id: str = Depends(get_current_user_id), db: AsyncSession = Depends(get_read_db)):
+    """Цепочка спонсоров до корня"""
+    upline = await GenealogyService.upline(db, user_id)
+    return {"success": True, "data": [team_member_to_dict(user, -level) for level, user in enumerate(upline, 1)]}
+
+
+# ========== АДМИНКА - ТОВАРЫ ==========
+
+EXPORT_MEDIA_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+
+@app.post("/api/v1/admin/products/import")
+async def import_products(
+        request: Request,
+        format: str = "ndjson",
+        user_id: str = Depends(get_admin_user_id),
+        db: AsyncSession = Depends(get_db)
+):
+    """Потоковая загрузка товаров (тело запроса — CSV или NDJSON)"""
+    log.info("📥 Импорт товаров", extra={"user_id": user_id, "format": format})
+
+    summary = await ProductSyncService.import_products(db, request.stream(), format)
+    log.info("✅ Импорт товаров завершён", extra=summary)
+    return {"success": True, "data": summary}
+
+
+@app.get("/api/v1/admin/products/export")
+async def export_products(
+        format: str = "ndjson",
+        category_id: Optional[int] = None,
+        user_id: str = Depends(get_admin_user_id)
+):
+    """Потоковая выгрузка товаров в CSV или NDJSON"""
+    log.info("📤 Экспорт товаров", extra={"user_id": user_id, "format": format})
+
+    rows = ProductSyncService.export_products(format, category_id=category_id)
+    return StreamingResponse(
+        rows,
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="products.{format}"'}
+    )
+
+
+@app.post("/api/v1/admin/products/{product_id}/images")
+async def upload_product_image(
+        product_id: str,
+        request: Request,
+        user_id: str = Depends(get_admin_user_id),
+        db: AsyncSession = Depends(get_db)
+):
+    """Загрузка изображения товара (тело запроса — JPEG, PNG или WebP)"""
+    log.info("🖼️ Загрузка изображения", extra={"user_id": user_id, "product_id": product_id})
+
+    gallery = await ProductImageService.add_image(db, product_id, request.stream())
+    return {"success": True, "data": gallery}
+
+
+# ========== АДМИНКА - ЗАКАЗЫ ==========
+
+@app.post("/api/v1/admin/orders/{order_id}/paid")
+async def mark_order_paid(
+        order_id: str,
+        user_id: str = Depends(get_admin_user_id),
+        db: AsyncSession = Depends(get_db)
+):
+    """Подтверждение оплаты: резерв остатков снимается с таймера, покупка попадает в статистику"""
+    log.info("💳 Подтверждение оплаты", extra={"user_id": user_id, "order_id": order_id})
+
+    paid = await OrderService.mark_paid(db, order_id)
+    if paid is None:
+        if await db.get(Order, order_id) is None:
+            raise HTTPException(status_code=404, detail="Заказ не найден")
+        raise HTTPException(status_code=409, detail="Заказ уже оплачен или отменён")
+    return {"success": True, "data": {"id": paid.id, "status": OrderStatus.PROCESSING, "payment_status": "paid"}}
+
+
+# ========== МЕДИА ==========
+
+@app.get(settings.media_url + "/{path:path}", include_in_schema=False)
+async def get_media(path: str):
+    """Файлы по хэшу содержимого: бессрочный кэш, sendfile или X-Accel-Redirect"""
+    return media_response(path)
+
+
 # ========== ЗАПУСК ==========
+# Продакшен: python -m app.server (gunicorn, uvicorn-воркеры по числу ядер)
+# Разработка: uvicorn app.main:app --reload
 
 if __name__ == "__main__":
+    from app.server import main
 
-    uvicorn.run(
-        app,
-        host="0.0.0.0",
-        port=8000,
-        log_level="info",
-        access_log=True
-    )
\ No newline at end of file
+    main()
@@ -0,0 +1,39 @@
+from sqlalchemy import Column, String, Float, Integer, DateTime, Index, UniqueConstraint
+from sqlalchemy.sql import func
+from app.database import Base
+
+
+class PayoutRun(Base):
+    """Расчёт комиссий за период; по нему расчёт можно безопасно перезапустить"""
+    __tablename__ = "payout_runs"
+
+    period = Column(String(7), primary_key=True)  # YYYY-MM
+    status = Column(String(20), nullable=False, default="running")
+    # Номер расчёта периода: каждый force-пересчёт начисляет разницу отдельным событием
+    revision = Column(Integer, nullable=False, default=0, server_default="0")
+
+    orders_processed = Column(Integer, default=0)
+    total_amount = Column(Float, default=0.0)
+
+    started_at = Column(DateTime(timezone=True), server_default=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class Commission(Base):
+    """Комиссия партнёра за период с разбивкой по уровням структуры"""
+    __tablename__ = "commissions"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    period = Column(String(7), nullable=False)
+    user_id = Column(String, nullable=False)
+    level = Column(Integer, nullable=False)
+
+    amount = Column(Float, nullable=False)
+    orders_count = Column(Integer, nullable=False)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        UniqueConstraint("period", "user_id", "level", name="uq_commissions_period_user_level"),
+        Index("ix_commissions_user_period", "user_id", "period"),
+    )
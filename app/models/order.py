@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Float, Integer, ForeignKey, DateTime, Enum, JSON
+from sqlalchemy import Column, String, Float, Integer, ForeignKey, DateTime, Enum, JSON, Text, Index
 from sqlalchemy.sql import func
 from app.database import Base
 import enum
@@ -30,7 +30,7 @@ class Order(Base):
     payment_method = Column(Enum(PaymentMethod))
     payment_status = Column(String(50), default="pending")
 
-    items = Column(JSON)  # Список товаров
+    items = Column(JSON)  # Список товаров (снимок для ответа API; для аналитики — order_items)
     customer_info = Column(JSON)
     delivery_address = Column(JSON)
 
@@ -41,9 +41,38 @@ class Order(Base):
 
     bonus_earned = Column(Integer, default=0)
 
+    # Товар списан со склада при создании заказа; если оплата не пришла
+    # до reserved_until, заказ отменяется и остатки возвращаются
+    reserved_until = Column(DateTime(timezone=True), nullable=True)
+
     tracking_number = Column(String(100), nullable=True)
     comment = Column(Text, nullable=True)
 
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
-    delivered_at = Column(DateTime(timezone=True), nullable=True)
\ No newline at end of file
+    delivered_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index("ix_orders_reserved_until", "reserved_until", postgresql_where=reserved_until.isnot(None)),
+    )
+
+
+class OrderItem(Base):
+    """Позиции заказа в нормализованном виде — для аналитики продаж по товарам"""
+    __tablename__ = "order_items"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    order_id = Column(String, ForeignKey("orders.id", ondelete="CASCADE"), nullable=False)
+    product_id = Column(String, ForeignKey("products.id"), nullable=False)
+
+    quantity = Column(Integer, nullable=False)
+    price = Column(Float, nullable=False)
+    subtotal = Column(Float, nullable=False)
+
+    # Дата заказа продублирована, чтобы «продажи товара за период» шли по одному индексу
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_order_items_product_created", "product_id", "created_at"),
+        Index("ix_order_items_order", "order_id"),
+    )
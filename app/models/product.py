@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Float, Integer, Boolean, Text, ForeignKey, DateTime
+from sqlalchemy import Column, String, Float, Integer, Boolean, Text, ForeignKey, DateTime, JSON, Index, DDL, event
 from sqlalchemy.sql import func
 from app.database import Base
 
@@ -39,8 +39,54 @@ class Product(Base):
     is_featured = Column(Boolean, default=False)
     is_active = Column(Boolean, default=True)
 
+    images = Column(JSON, default=list)
+    specifications = Column(JSON, default=dict)
+
+    rating = Column(Float, nullable=False, default=0.0, server_default="0")
+    reviews_count = Column(Integer, default=0)
+
     views_count = Column(Integer, default=0)
-    sales_count = Column(Integer, default=0)
+    sales_count = Column(Integer, nullable=False, default=0, server_default="0")
 
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
\ No newline at end of file
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    # Составные индексы под keyset-пагинацию: (фильтр, ключ сортировки, id).
+    # Направление сортировки не важно — B-tree читается в обе стороны.
+    __table_args__ = (
+        Index("ix_products_active_sales", "is_active", "sales_count", "id"),
+        Index("ix_products_active_price", "is_active", "price", "id"),
+        Index("ix_products_active_created", "is_active", "created_at", "id"),
+        Index("ix_products_active_rating", "is_active", "rating", "id"),
+        Index("ix_products_active_category_sales", "is_active", "category_id", "sales_count", "id"),
+        Index("ix_products_active_category_price", "is_active", "category_id", "price", "id"),
+        Index("ix_products_active_category_created", "is_active", "category_id", "created_at", "id"),
+        Index("ix_products_active_category_rating", "is_active", "category_id", "rating", "id"),
+    )
+
+
+# Полнотекстовый поиск (только PostgreSQL): хранимая генерируемая колонка
+# tsvector с русским стеммингом + 'simple' для казахских словоформ,
+# GIN-индекс по ней и триграммный индекс по названию для поиска с опечатками.
+PRODUCT_SEARCH_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """
+    ALTER TABLE products ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('russian', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('russian', coalesce(description, '')), 'B') ||
+        setweight(to_tsvector('simple', coalesce(description, '')), 'B') ||
+        setweight(to_tsvector('russian', coalesce(full_description, '')), 'C')
+    ) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_products_search_vector ON products USING gin (search_vector)",
+    "CREATE INDEX IF NOT EXISTS ix_products_name_trgm ON products USING gin (lower(name) gin_trgm_ops)",
+]
+
+for _statement in PRODUCT_SEARCH_DDL:
+    event.listen(
+        Product.__table__,
+        "after_create",
+        DDL(_statement).execute_if(dialect="postgresql"),
+    )
@@ -0,0 +1,36 @@
+from sqlalchemy import Column, String, Float, Integer, ForeignKey, DateTime, JSON, Index
+from sqlalchemy.sql import func
+from app.database import Base
+
+
+class UserStats(Base):
+    """Предрасчитанная статистика дашборда, обновляется событиями"""
+    __tablename__ = "user_stats"
+
+    user_id = Column(String, ForeignKey("users.id"), primary_key=True)
+
+    total_orders = Column(Integer, nullable=False, default=0, server_default="0")
+    total_purchases = Column(Float, nullable=False, default=0.0, server_default="0")
+    total_earnings = Column(Float, nullable=False, default=0.0, server_default="0")
+    active_referrals = Column(Integer, nullable=False, default=0, server_default="0")
+    team_size = Column(Integer, nullable=False, default=0, server_default="0")
+
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    reconciled_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class StatsEvent(Base):
+    """Журнал применённых событий: повторная доставка того же event_id игнорируется"""
+    __tablename__ = "stats_events"
+
+    event_id = Column(String(100), primary_key=True)
+    event_type = Column(String(50), nullable=False)
+    user_id = Column(String, nullable=True)
+    payload = Column(JSON)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        # Для удаления старых записей (StatsService.prune_events)
+        Index("ix_stats_events_created_at", "created_at"),
+    )
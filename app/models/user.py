@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Float, Boolean, DateTime, Integer, Enum
+from sqlalchemy import Column, String, Float, Boolean, DateTime, Integer, Enum, Index, DDL, event
 from sqlalchemy.sql import func
 from app.database import Base
 import enum
@@ -29,6 +29,10 @@ class User(Base):
     status = Column(Enum(UserStatus), default=UserStatus.ACTIVE)
 
     sponsor_id = Column(String, nullable=True)
+    # Материализованный путь по спонсорской линии: ".ROOT.….SPONSOR.SELF."
+    # Даунлайн X — префиксный поиск по пути X, аплайн — сам путь.
+    sponsor_path = Column(String, nullable=True)
+    sponsor_depth = Column(Integer, nullable=False, default=0, server_default="0")
     referral_code = Column(String(50), unique=True)
 
     main_balance = Column(Float, default=0.0)
@@ -39,4 +43,27 @@ class User(Base):
     phone_verified = Column(Boolean, default=False)
 
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
\ No newline at end of file
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    __table_args__ = (
+        # На PostgreSQL вместо него — индекс с COLLATE "C" из USER_PATH_DDL
+        Index("ix_users_sponsor_path", "sponsor_path", "sponsor_depth").ddl_if(dialect="sqlite"),
+        Index("ix_users_sponsor_id", "sponsor_id"),
+    )
+
+
+# Пути сравниваются побайтово (COLLATE "C", см. genealogy.path_key): поддерево —
+# диапазон путей, и такой btree обслуживает и его, и keyset-пагинацию
+# sponsor_path > after с ORDER BY. text_pattern_ops при обычной collation
+# годится только для LIKE 'prefix%' и сортировку не даёт.
+USER_PATH_DDL = [
+    "DROP INDEX IF EXISTS ix_users_sponsor_path",
+    'CREATE INDEX IF NOT EXISTS ix_users_sponsor_path_c ON users (sponsor_path COLLATE "C", sponsor_depth)',
+]
+
+for _statement in USER_PATH_DDL:
+    event.listen(
+        User.__table__,
+        "after_create",
+        DDL(_statement).execute_if(dialect="postgresql"),
+    )
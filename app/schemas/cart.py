@@ -0,0 +1,13 @@
+from pydantic import BaseModel, Field
+from typing import Optional
+
+
+class CartItemAdd(BaseModel):
+    product_id: str
+    quantity: int = Field(1, ge=1, le=999)
+
+
+class CartItemRemove(BaseModel):
+    product_id: str
+    # Без quantity позиция удаляется целиком
+    quantity: Optional[int] = Field(None, ge=1, le=999)
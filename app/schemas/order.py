@@ -0,0 +1,13 @@
+from pydantic import BaseModel, Field
+from typing import Optional
+from app.models.order import PaymentMethod
+from app.schemas.cart import CartItemAdd
+
+
+class CheckoutRequest(BaseModel):
+    # Без items заказ оформляется из корзины пользователя
+    items: Optional[list[CartItemAdd]] = Field(None, max_length=100)
+    payment_method: PaymentMethod = PaymentMethod.CARD
+    customer_info: dict = {}
+    delivery_address: dict = {}
+    comment: Optional[str] = None
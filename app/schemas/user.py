@@ -12,8 +12,10 @@ class UserBase(BaseModel):
 
 class UserCreate(UserBase):
     password: str = Field(..., min_length=8)
+    password_confirmation: Optional[str] = None
     sponsor_id: str
     partnership_type: str
+    agree_terms: bool = True
 
 
 class UserLogin(BaseModel):
@@ -22,6 +24,10 @@ class UserLogin(BaseModel):
     remember_me: bool = False
 
 
+class VerifyEmailRequest(BaseModel):
+    token: str
+
+
 class UserResponse(UserBase):
     id: str
     partnership_type: str
@@ -0,0 +1,83 @@
+"""
+Миграция данных: заполнение order_items из JSON Order.items для старых заказов
+и пересчёт Product.sales_count по нормализованным позициям.
+
+    python -m app.scripts.backfill_order_items [--batch-size 1000]
+
+Заказы читаются пачками по первичному ключу (keyset), каждая пачка —
+отдельная транзакция; заказы, у которых позиции уже есть, пропускаются,
+поэтому прерванную миграцию можно просто запустить снова.
+"""
+import argparse
+import asyncio
+
+from sqlalchemy import select, insert, update, exists, func
+
+from app.database import AsyncSessionLocal, engine
+from app.models.order import Order, OrderItem, OrderStatus
+from app.models.product import Product
+
+
+async def backfill(batch_size: int) -> int:
+    total = 0
+    last_id = ""
+    while True:
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(Order.id, Order.items, Order.created_at)
+                .where(Order.id > last_id)
+                .where(~exists().where(OrderItem.order_id == Order.id))
+                .order_by(Order.id)
+                .limit(batch_size)
+            )
+            orders = result.all()
+            if not orders:
+                return total
+
+            rows = [
+                {
+                    "order_id": order_id,
+                    "product_id": item["product_id"],
+                    "quantity": item.get("quantity", 1),
+                    "price": item.get("price", 0),
+                    "subtotal": item.get("subtotal", item.get("price", 0) * item.get("quantity", 1)),
+                    "created_at": created_at,
+                }
+                for order_id, items, created_at in orders
+                for item in items or ()
+                if item.get("product_id")
+            ]
+            if rows:
+                await session.execute(insert(OrderItem), rows)
+            await session.commit()
+
+        total += len(orders)
+        last_id = orders[-1][0]
+        print(f"… {total} заказов")
+
+
+async def recount_sales():
+    sold = (
+        select(func.coalesce(func.sum(OrderItem.quantity), 0))
+        .join(Order, Order.id == OrderItem.order_id)
+        .where(OrderItem.product_id == Product.id, Order.status != OrderStatus.CANCELLED)
+        .scalar_subquery()
+    )
+    async with AsyncSessionLocal() as session:
+        await session.execute(update(Product).values(sales_count=sold))
+        await session.commit()
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    total = await backfill(args.batch_size)
+    await recount_sales()
+    await engine.dispose()
+    print(f"✅ Перенесено заказов: {total}, sales_count пересчитан")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
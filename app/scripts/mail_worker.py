@@ -0,0 +1,40 @@
+"""
+Отдельный воркер почтовой очереди — если рассылку не держат в процессах API
+(MAIL_WORKER_ENABLED=false):
+
+    python -m app.scripts.mail_worker
+    python -m app.scripts.mail_worker --stats    # размер очередей и выход
+
+По SIGTERM/SIGINT дожидается текущей пачки и закрывает SMTP-соединения.
+"""
+import argparse
+import asyncio
+import signal
+
+from app.services.mail import mail_queue
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--stats", action="store_true", help="показать размер очередей и выйти")
+    args = parser.parse_args()
+
+    if args.stats:
+        print(await mail_queue.queue_stats())
+        await mail_queue.stop()
+        return
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    await mail_queue.start()
+    print(f"📧 Почтовый воркер запущен: {await mail_queue.queue_stats()}")
+    await stop.wait()
+    await mail_queue.stop()
+    print(f"📧 Почтовый воркер остановлен: {mail_queue.stats}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
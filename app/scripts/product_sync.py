@@ -0,0 +1,77 @@
+"""
+Импорт и экспорт товаров из командной строки (тот же код, что и у
+/api/v1/admin/products/*).
+
+    python -m app.scripts.product_sync import warehouse.csv
+    python -m app.scripts.product_sync import prices.ndjson
+    python -m app.scripts.product_sync export catalog.ndjson
+    python -m app.scripts.product_sync export - --format csv > catalog.csv
+
+Формат определяется по расширению файла, --format — явно.
+"""
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+from fastapi import HTTPException
+
+from app.database import AsyncSessionLocal, engine, read_engine
+from app.services.cache import catalog_cache
+from app.services.product_sync import FORMATS, ProductSyncService
+
+CHUNK_SIZE = 1 << 16
+
+
+async def read_chunks(path: Path):
+    with path.open("rb") as file:
+        while chunk := await asyncio.to_thread(file.read, CHUNK_SIZE):
+            yield chunk
+
+
+async def import_file(path: Path, fmt: str):
+    async with AsyncSessionLocal() as session:
+        summary = await ProductSyncService.import_products(session, read_chunks(path), fmt)
+        await session.commit()
+    print(f"✅ Импортировано: {summary}")
+
+
+async def export_file(target: str, fmt: str, category_id):
+    output = sys.stdout.buffer if target == "-" else open(target, "wb")
+    try:
+        async for chunk in ProductSyncService.export_products(fmt, category_id=category_id):
+            output.write(chunk)
+    finally:
+        if output is not sys.stdout.buffer:
+            output.close()
+    if target != "-":
+        print(f"✅ Выгружено в {target}")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", choices=["import", "export"])
+    parser.add_argument("path", help="файл; для export '-' — stdout")
+    parser.add_argument("--format", choices=FORMATS, help="по умолчанию — по расширению файла")
+    parser.add_argument("--category-id", type=int, help="только для export")
+    args = parser.parse_args()
+
+    fmt = args.format or ("csv" if args.path.endswith(".csv") else "ndjson")
+    try:
+        if args.command == "import":
+            await import_file(Path(args.path), fmt)
+        else:
+            await export_file(args.path, fmt, args.category_id)
+    except HTTPException as exc:
+        print(f"❌ {exc.detail}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        # Дожидается инвалидации кэша, запущенной после commit
+        await catalog_cache.stop()
+        await engine.dispose()
+        if read_engine is not engine:
+            await read_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,28 @@
+"""
+Пересчёт материализованных путей спонсорского дерева для существующих пользователей.
+На PostgreSQL заодно пересоздаётся индекс путей (USER_PATH_DDL).
+
+    python -m app.scripts.rebuild_genealogy
+"""
+import asyncio
+
+from sqlalchemy import text
+
+from app.database import AsyncSessionLocal, engine
+from app.models.user import USER_PATH_DDL
+from app.services.genealogy import GenealogyService
+
+
+async def main():
+    async with AsyncSessionLocal() as session:
+        depth = await GenealogyService.rebuild(session)
+        if session.bind.dialect.name == "postgresql":
+            for statement in USER_PATH_DDL:
+                await session.execute(text(statement))
+        await session.commit()
+    await engine.dispose()
+    print(f"✅ Пути пересчитаны, глубина дерева: {depth}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,66 @@
+"""
+Сверка user_stats с первичными данными (заказы, структура) и удаление
+записей stats_events старше STATS_EVENTS_RETENTION_DAYS.
+
+    python -m app.scripts.reconcile_stats                # один проход
+    python -m app.scripts.reconcile_stats --interval 3600  # периодически
+"""
+import argparse
+import asyncio
+
+from sqlalchemy import select
+
+from app.config import settings
+from app.database import AsyncSessionLocal, engine
+from app.models.user import User
+from app.services.stats import StatsService
+
+BATCH_SIZE = 1000
+
+
+async def reconcile_all() -> int:
+    total = 0
+    last_id = ""
+    while True:
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(User.id).where(User.id > last_id).order_by(User.id).limit(BATCH_SIZE)
+            )
+            ids = list(result.scalars())
+            if not ids:
+                return total
+            total += await StatsService.reconcile(session, ids)
+            await session.commit()
+        last_id = ids[-1]
+
+
+async def prune_all() -> int:
+    total = 0
+    while True:
+        async with AsyncSessionLocal() as session:
+            deleted = await StatsService.prune_events(session, settings.stats_events_retention_days)
+            await session.commit()
+        total += deleted
+        if not deleted:
+            return total
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--interval", type=int, default=0, help="секунды между проходами, 0 — один проход")
+    args = parser.parse_args()
+
+    while True:
+        count = await reconcile_all()
+        print(f"✅ Статистика сверена для {count} пользователей")
+        pruned = await prune_all()
+        if pruned:
+            print(f"🧹 Удалено старых событий статистики: {pruned}")
+        if not args.interval:
+            break
+        await asyncio.sleep(args.interval)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,41 @@
+"""
+Возврат на склад товара из неоплаченных заказов с истёкшей резервацией.
+
+    python -m app.scripts.release_reservations               # один проход
+    python -m app.scripts.release_reservations --interval 60
+"""
+import argparse
+import asyncio
+
+from app.database import AsyncSessionLocal, engine
+from app.services.orders import OrderService
+
+
+async def release_all() -> int:
+    total = 0
+    while True:
+        async with AsyncSessionLocal() as session:
+            released = await OrderService.release_expired(session)
+            await session.commit()
+        total += released
+        if not released:
+            return total
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--interval", type=int, default=0, help="секунды между проходами, 0 — один проход")
+    args = parser.parse_args()
+
+    while True:
+        released = await release_all()
+        if released:
+            print(f"♻️ Отменено заказов с истёкшей резервацией: {released}")
+        if not args.interval:
+            break
+        await asyncio.sleep(args.interval)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
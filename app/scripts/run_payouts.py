@@ -0,0 +1,32 @@
+"""
+Расчёт партнёрских комиссий за месяц.
+
+    python -m app.scripts.run_payouts 2026-09
+    python -m app.scripts.run_payouts 2026-09 --force   # пересчитать завершённый период
+"""
+import argparse
+import asyncio
+
+from app.database import AsyncSessionLocal, engine
+from app.services.commissions import CommissionService
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("period", help="месяц в формате YYYY-MM")
+    parser.add_argument("--force", action="store_true")
+    args = parser.parse_args()
+
+    async with AsyncSessionLocal() as session:
+        run = await CommissionService.run_period(session, args.period, force=args.force)
+        await session.commit()
+    await engine.dispose()
+
+    if run is None:
+        print(f"⏭️ Период {args.period} уже рассчитан (используйте --force)")
+    else:
+        print(f"✅ {args.period}: заказов {run.orders_processed}, начислено {run.total_amount:.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,74 @@
+"""
+Продакшен-запуск: gunicorn-мастер с uvicorn-воркерами (uvloop + httptools).
+
+    python -m app.server
+
+Приложение загружается в мастере до fork (preload): ошибки импорта и
+настроек роняют запуск сразу, а воркеры делят память через copy-on-write.
+При импорте ничего не подключается к БД и Redis — соединения открывает
+lifespan уже в каждом воркере.
+
+SIGTERM: воркеры перестают принимать соединения, дожидаются текущих
+запросов (до web_graceful_timeout секунд), затем lifespan сбрасывает
+счётчики просмотров и закрывает пулы.
+"""
+import os
+
+from gunicorn.app.base import BaseApplication
+from uvicorn_worker import UvicornWorker
+
+from app.config import settings
+
+
+class FenixWorker(UvicornWorker):
+    CONFIG_KWARGS = {
+        "loop": "uvloop",
+        "http": "httptools",
+        "lifespan": "on",
+        # access-лог пишет RequestContextMiddleware
+        "access_log": False,
+        "timeout_graceful_shutdown": settings.web_graceful_timeout,
+    }
+
+
+def worker_count() -> int:
+    if settings.web_workers > 0:
+        return settings.web_workers
+    # Ядра, доступные процессу (в контейнере может быть меньше os.cpu_count())
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+class FenixServer(BaseApplication):
+    def __init__(self, options: dict):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        from app.main import app
+        return app
+
+
+def main():
+    FenixServer({
+        "bind": f"{settings.web_host}:{settings.web_port}",
+        "workers": worker_count(),
+        "worker_class": "app.server.FenixWorker",
+        "preload_app": True,
+        # gunicorn ждёт чуть дольше, чем uvicorn дренирует запросы
+        "graceful_timeout": settings.web_graceful_timeout + 5,
+        "timeout": 60,
+        "keepalive": settings.web_keepalive,
+        "max_requests": settings.web_max_requests,
+        "max_requests_jitter": settings.web_max_requests // 10,
+        "accesslog": None,
+    }).run()
+
+
+if __name__ == "__main__":
+    main()
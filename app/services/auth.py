@@ -1,10 +1,24 @@
 from datetime import datetime, timedelta
+from typing import Optional
+import hashlib
+import secrets
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import HTTPException, status
 from app.config import settings
+from app.services.hashing import password_hasher
+from app.services.tokens import verified_tokens, revocations
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+EMAIL_TOKEN_AUDIENCE = "verify-email"
+EMAIL_TOKEN_DAYS = 3
+
+# min_rounds = default_rounds: хэши с меньшей стоимостью помечаются на перехэширование
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.bcrypt_rounds,
+    bcrypt__min_rounds=settings.bcrypt_rounds,
+)
 
 
 class AuthService:
@@ -16,6 +30,16 @@ class AuthService:
     def get_password_hash(password: str) -> str:
         return pwd_context.hash(password)
 
+    @staticmethod
+    async def hash_password(password: str) -> str:
+        """bcrypt в пуле потоков, не блокирует event loop"""
+        return await password_hasher.run(pwd_context.hash, password)
+
+    @staticmethod
+    async def verify_and_update_password(plain_password: str, hashed_password: str) -> tuple[bool, Optional[str]]:
+        """Проверка пароля в пуле потоков; второй элемент — новый хэш, если стоимость устарела"""
+        return await password_hasher.run(pwd_context.verify_and_update, plain_password, hashed_password)
+
     @staticmethod
     def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
         to_encode = data.copy()
@@ -24,12 +48,32 @@ class AuthService:
         else:
             expire = datetime.utcnow() + timedelta(minutes=settings.access_token_expire_minutes)
 
-        to_encode.update({"exp": expire})
+        to_encode.update({"exp": expire, "jti": secrets.token_urlsafe(16)})
         encoded_jwt = jwt.encode(to_encode, settings.secret_key, algorithm=settings.algorithm)
         return encoded_jwt
 
+    @staticmethod
+    def create_email_token(user_id: str, email: str) -> str:
+        """Токен для ссылки подтверждения email; как access-токен не принимается (aud)"""
+        expire = datetime.utcnow() + timedelta(days=EMAIL_TOKEN_DAYS)
+        claims = {"sub": user_id, "email": email, "aud": EMAIL_TOKEN_AUDIENCE, "exp": expire}
+        return jwt.encode(claims, settings.secret_key, algorithm=settings.algorithm)
+
+    @staticmethod
+    def verify_email_token(token: str) -> dict:
+        try:
+            return jwt.decode(
+                token, settings.secret_key, algorithms=[settings.algorithm], audience=EMAIL_TOKEN_AUDIENCE
+            )
+        except JWTError:
+            raise HTTPException(status_code=400, detail="Invalid or expired link")
+
     @staticmethod
     def verify_token(token: str) -> dict:
+        cached = verified_tokens.get(token)
+        if cached is not None:
+            return cached
+
         try:
             payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
             user_id: str = payload.get("sub")
@@ -38,9 +82,34 @@ class AuthService:
                     status_code=status.HTTP_401_UNAUTHORIZED,
                     detail="Invalid token"
                 )
-            return {"user_id": user_id}
         except JWTError:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Could not validate credentials"
-            )
\ No newline at end of file
+            )
+
+        claims = {
+            "user_id": user_id,
+            # У токенов, выпущенных до появления jti, отзываем по хэшу самого токена
+            "jti": payload.get("jti") or hashlib.sha256(token.encode()).hexdigest(),
+            "exp": payload["exp"],
+        }
+        verified_tokens.set(token, claims)
+        return claims
+
+    @staticmethod
+    async def authenticate(token: str) -> dict:
+        """Проверка подписи (с кэшем) и отзыва токена"""
+        claims = AuthService.verify_token(token)
+        if await revocations.is_revoked(claims["jti"]):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Token revoked"
+            )
+        return claims
+
+    @staticmethod
+    async def revoke_token(token: str):
+        claims = AuthService.verify_token(token)
+        verified_tokens.discard_jti(claims["jti"])
+        await revocations.revoke(claims["jti"], claims["exp"])
\ No newline at end of file
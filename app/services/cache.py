@@ -0,0 +1,261 @@
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Iterable, Optional
+
+import redis.asyncio as aioredis
+from redis.exceptions import RedisError
+
+from app.config import settings
+
+INVALIDATION_CHANNEL = "cache:invalidate"
+
+
+class LRUCache:
+    """Кэш процесса: LRU-вытеснение по количеству записей + TTL на запись"""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data: OrderedDict[str, tuple[float, Any, tuple[str, ...]]] = OrderedDict()
+        self._tags: dict[str, set[str]] = {}
+
+    def get(self, key: str):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value, _ = entry
+        if expires_at < time.monotonic():
+            self._drop(key)
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value, tags: Iterable[str] = ()):
+        if key in self._data:
+            self._drop(key)
+        tags = tuple(tags)
+        self._data[key] = (time.monotonic() + self.ttl, value, tags)
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while len(self._data) > self.max_entries:
+            self._drop(next(iter(self._data)))
+
+    def invalidate_tags(self, tags: Iterable[str]) -> int:
+        dropped = 0
+        for tag in tags:
+            for key in self._tags.pop(tag, set()):
+                if key in self._data:
+                    self._drop(key)
+                    dropped += 1
+        return dropped
+
+    def clear(self):
+        self._data.clear()
+        self._tags.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def _drop(self, key: str):
+        _, _, tags = self._data.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+class ResponseCache:
+    """
+    Двухуровневый кэш ответов: LRU в воркере перед общим Redis.
+    Записи помечаются тегами (product:<id>, category:<id>, ...); инвалидация
+    по тегу удаляет ключи в Redis и через pub/sub чистит LRU всех воркеров.
+    Если Redis недоступен, кэш продолжает работать только локально.
+    """
+
+    def __init__(self, redis_url: str, namespace: str, local_ttl: float,
+                 local_max_entries: int, redis_ttl: int):
+        self.redis_url = redis_url
+        self.namespace = namespace
+        self.redis_ttl = redis_ttl
+        self.local = LRUCache(local_max_entries, local_ttl)
+        self.stats = {"local_hits": 0, "redis_hits": 0, "misses": 0, "invalidations": 0, "redis_errors": 0}
+        self._redis: Optional[aioredis.Redis] = None
+        self._listener: Optional[asyncio.Task] = None
+        self._invalidations: set[asyncio.Task] = set()
+        # Дополнительные локальные кэши, которые нужно чистить по тем же тегам
+        self.invalidation_callbacks: list[Callable[[list[str]], None]] = []
+
+    @property
+    def redis(self) -> aioredis.Redis:
+        if self._redis is None:
+            self._redis = aioredis.from_url(self.redis_url)
+        return self._redis
+
+    def _invalidate_local(self, tags: list[str]):
+        self.local.invalidate_tags(tags)
+        for callback in self.invalidation_callbacks:
+            callback(tags)
+
+    def _key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    def _tag_key(self, tag: str) -> str:
+        return f"{self.namespace}:tag:{tag}"
+
+    async def get(self, key: str):
+        value = self.local.get(key)
+        if value is not None:
+            self.stats["local_hits"] += 1
+            return value
+
+        try:
+            raw = await self.redis.get(self._key(key))
+        except (RedisError, OSError):
+            self.stats["redis_errors"] += 1
+            raw = None
+
+        if raw is None:
+            self.stats["misses"] += 1
+            return None
+
+        payload = json.loads(raw)
+        self.local.set(key, payload["value"], payload["tags"])
+        self.stats["redis_hits"] += 1
+        return payload["value"]
+
+    async def set(self, key: str, value, tags: Iterable[str] = ()):
+        tags = list(tags)
+        self.local.set(key, value, tags)
+        payload = json.dumps({"value": value, "tags": tags}, ensure_ascii=False, default=str)
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.set(self._key(key), payload, ex=self.redis_ttl)
+                for tag in tags:
+                    pipe.sadd(self._tag_key(tag), self._key(key))
+                    pipe.expire(self._tag_key(tag), self.redis_ttl)
+                await pipe.execute()
+        except (RedisError, OSError):
+            self.stats["redis_errors"] += 1
+
+    async def get_body(self, key: str) -> Optional[tuple[bytes, str]]:
+        """Готовое закодированное тело ответа и его ETag"""
+        entry = self.local.get(key)
+        if entry is not None:
+            self.stats["local_hits"] += 1
+            return entry
+
+        try:
+            stored = await self.redis.hgetall(self._key(key))
+        except (RedisError, OSError):
+            self.stats["redis_errors"] += 1
+            stored = None
+
+        if not stored:
+            self.stats["misses"] += 1
+            return None
+
+        entry = (stored[b"body"], stored[b"etag"].decode())
+        self.local.set(key, entry, json.loads(stored[b"tags"]))
+        self.stats["redis_hits"] += 1
+        return entry
+
+    async def set_body(self, key: str, body: bytes, etag: str, tags: Iterable[str] = ()):
+        tags = list(tags)
+        self.local.set(key, (body, etag), tags)
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.delete(self._key(key))
+                pipe.hset(self._key(key), mapping={"body": body, "etag": etag, "tags": json.dumps(tags)})
+                pipe.expire(self._key(key), self.redis_ttl)
+                for tag in tags:
+                    pipe.sadd(self._tag_key(tag), self._key(key))
+                    pipe.expire(self._tag_key(tag), self.redis_ttl)
+                await pipe.execute()
+        except (RedisError, OSError):
+            self.stats["redis_errors"] += 1
+
+    async def invalidate(self, tags: Iterable[str]):
+        tags = list(tags)
+        if not tags:
+            return
+        self.stats["invalidations"] += 1
+        self._invalidate_local(tags)
+        try:
+            tag_keys = [self._tag_key(tag) for tag in tags]
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for tag_key in tag_keys:
+                    pipe.smembers(tag_key)
+                members = await pipe.execute()
+            keys = set(tag_keys)
+            for group in members:
+                keys.update(group)
+            await self.redis.delete(*keys)
+            await self.redis.publish(f"{self.namespace}:{INVALIDATION_CHANNEL}", json.dumps(tags))
+        except (RedisError, OSError):
+            self.stats["redis_errors"] += 1
+
+    def invalidate_later(self, tags: Iterable[str]):
+        """invalidate в фоне (из синхронных хуков сессии); ссылка на задачу держится до её конца"""
+        task = asyncio.get_running_loop().create_task(self.invalidate(tags))
+        self._invalidations.add(task)
+        task.add_done_callback(self._invalidations.discard)
+
+    async def start(self):
+        """Подписка на инвалидации от других воркеров"""
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._invalidations:
+            await asyncio.gather(*self._invalidations)
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+    async def _listen(self):
+        channel = f"{self.namespace}:{INVALIDATION_CHANNEL}"
+        subscribed = False
+        missed = False
+        while True:
+            try:
+                async with self.redis.pubsub() as pubsub:
+                    await pubsub.subscribe(channel)
+                    if missed:
+                        # Записи, закэшированные без подписки, могли пропустить инвалидацию
+                        self.local.clear()
+                    subscribed, missed = True, False
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            self._invalidate_local(json.loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except (RedisError, OSError):
+                self.stats["redis_errors"] += 1
+                # Сбрасываем LRU один раз при потере подписки и один раз при
+                # восстановлении, а не на каждой попытке: пока Redis лежит, кэш
+                # работает локально, устаревание ограничено local_ttl
+                if subscribed:
+                    self.local.clear()
+                subscribed, missed = False, True
+                await asyncio.sleep(1)
+
+
+def cache_key(prefix: str, **params) -> str:
+    parts = [f"{name}={params[name]}" for name in sorted(params) if params[name] is not None]
+    return ":".join([prefix, *parts])
+
+
+catalog_cache = ResponseCache(
+    settings.redis_url,
+    namespace="catalog",
+    local_ttl=settings.cache_local_ttl,
+    local_max_entries=settings.cache_local_max_entries,
+    redis_ttl=settings.cache_redis_ttl,
+)
@@ -0,0 +1,250 @@
+from contextlib import asynccontextmanager
+from typing import Optional
+
+import redis.asyncio as aioredis
+from fastapi import HTTPException
+from redis.exceptions import RedisError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models.product import Product
+from app.services.cache import LRUCache, catalog_cache
+from app.services.logs import logger
+
+log = logger.getChild("cart")
+
+CART_TTL = 30 * 24 * 3600
+MAX_LINE_QUANTITY = 999
+
+# Атомарное изменение количества + чтение корзины за один round-trip.
+# ARGV: product_id, delta, max quantity, ttl
+CHANGE_QUANTITY_LUA = """
+local quantity = redis.call('HINCRBY', KEYS[1], ARGV[1], ARGV[2])
+if quantity <= 0 then
+    redis.call('HDEL', KEYS[1], ARGV[1])
+elseif quantity > tonumber(ARGV[3]) then
+    redis.call('HSET', KEYS[1], ARGV[1], ARGV[3])
+end
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+return redis.call('HGETALL', KEYS[1])
+"""
+
+# Возврат позиций после неудачного оформления: складывается с тем, что
+# успели добавить за это время. ARGV: max quantity, ttl, product_id, quantity, ...
+MERGE_LUA = """
+for i = 3, #ARGV, 2 do
+    local quantity = redis.call('HINCRBY', KEYS[1], ARGV[i], ARGV[i + 1])
+    if quantity > tonumber(ARGV[1]) then
+        redis.call('HSET', KEYS[1], ARGV[i], ARGV[1])
+    end
+end
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return 1
+"""
+
+
+class PriceTable:
+    """
+    Кэш цен для корзины: product_id -> данные для строки корзины.
+    Отсутствующие товары догружаются одним запросом; запись живёт ttl
+    секунд, окончательная цена всё равно берётся из БД при оформлении.
+    Размер ограничен LRU, а несуществующие id не кэшируются — иначе
+    запросы с произвольными product_id раздували бы память воркера.
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        self._cache = LRUCache(max_entries, ttl)
+
+    async def get_many(self, db: AsyncSession, product_ids: list[str]) -> dict[str, dict]:
+        found = {}
+        missing = []
+        for product_id in product_ids:
+            entry = self._cache.get(product_id)
+            if entry is None:
+                missing.append(product_id)
+            else:
+                found[product_id] = entry
+        if missing:
+            result = await db.execute(
+                select(Product.id, Product.name, Product.images, Product.price,
+                       Product.bonus_points, Product.in_stock, Product.stock_quantity)
+                .where(Product.id.in_(missing), Product.is_active.is_(True))
+            )
+            for row in result:
+                found[row.id] = {
+                    "name": row.name,
+                    "image": (row.images or [None])[0],
+                    "price": row.price,
+                    "bonus_points": row.bonus_points or 0,
+                    "in_stock": row.in_stock and (row.stock_quantity or 0) > 0,
+                }
+                self._cache.set(row.id, found[row.id], tags=(f"product:{row.id}",))
+
+        return {product_id: found[product_id] for product_id in product_ids if product_id in found}
+
+    def discard(self, product_id: str):
+        self._cache.invalidate_tags([f"product:{product_id}"])
+
+    def invalidate_tags(self, tags: list[str]):
+        """Подписка на теги кэша каталога: изменение товара сбрасывает его цену"""
+        self._cache.invalidate_tags(tags)
+
+    def __len__(self):
+        return len(self._cache)
+
+
+class CartService:
+    """Корзина пользователя — хэш Redis cart:<user_id> {product_id: quantity}"""
+
+    def __init__(self, redis_url: str):
+        self.redis_url = redis_url
+        self.prices = PriceTable(ttl=settings.cart_price_ttl, max_entries=settings.cart_price_max_entries)
+        self._redis: Optional[aioredis.Redis] = None
+        self._change_quantity = None
+        self._merge = None
+
+    @property
+    def redis(self) -> aioredis.Redis:
+        if self._redis is None:
+            self._redis = aioredis.from_url(self.redis_url)
+        return self._redis
+
+    @property
+    def change_quantity(self):
+        if self._change_quantity is None:
+            self._change_quantity = self.redis.register_script(CHANGE_QUANTITY_LUA)
+        return self._change_quantity
+
+    @property
+    def merge(self):
+        if self._merge is None:
+            self._merge = self.redis.register_script(MERGE_LUA)
+        return self._merge
+
+    async def close(self):
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+            self._change_quantity = None
+            self._merge = None
+
+    @staticmethod
+    def _key(user_id: str) -> str:
+        return f"cart:{user_id}"
+
+    @staticmethod
+    def _parse(raw) -> dict[str, int]:
+        if isinstance(raw, dict):
+            return {key.decode(): int(value) for key, value in raw.items()}
+        # HGETALL из Lua приходит плоским списком [field, value, ...]
+        return {raw[i].decode(): int(raw[i + 1]) for i in range(0, len(raw), 2)}
+
+    @staticmethod
+    @asynccontextmanager
+    async def _available():
+        """Корзины живут только в Redis: без него — 503, а не голый 500"""
+        try:
+            yield
+        except (RedisError, OSError):
+            log.warning("⚠️ Redis недоступен, корзина не обработана", exc_info=True)
+            raise HTTPException(status_code=503, detail="Корзина временно недоступна, повторите позже")
+
+    async def _change(self, user_id: str, product_id: str, delta: int) -> dict[str, int]:
+        async with self._available():
+            raw = await self.change_quantity(
+                keys=[self._key(user_id)],
+                args=[product_id, delta, MAX_LINE_QUANTITY, CART_TTL],
+            )
+        return self._parse(raw)
+
+    async def add(self, db: AsyncSession, user_id: str, product_id: str, quantity: int) -> dict:
+        products = await self.prices.get_many(db, [product_id])
+        if product_id not in products:
+            raise HTTPException(status_code=404, detail="Товар не найден")
+        if not products[product_id]["in_stock"]:
+            raise HTTPException(status_code=400, detail="Товара нет в наличии")
+        return await self.build(db, await self._change(user_id, product_id, quantity))
+
+    async def remove(self, db: AsyncSession, user_id: str, product_id: str, quantity: Optional[int]) -> dict:
+        if quantity is None:
+            async with self._available():
+                async with self.redis.pipeline(transaction=True) as pipe:
+                    pipe.hdel(self._key(user_id), product_id)
+                    pipe.hgetall(self._key(user_id))
+                    _, raw = await pipe.execute()
+            return await self.build(db, self._parse(raw))
+        return await self.build(db, await self._change(user_id, product_id, -quantity))
+
+    async def clear(self, user_id: str):
+        async with self._available():
+            await self.redis.delete(self._key(user_id))
+
+    async def get_quantities(self, user_id: str) -> dict[str, int]:
+        async with self._available():
+            return self._parse(await self.redis.hgetall(self._key(user_id)))
+
+    async def take(self, user_id: str) -> dict[str, int]:
+        """
+        Забирает корзину для оформления: HGETALL и DEL в одной транзакции,
+        поэтому позиция, добавленная во время оформления, остаётся в корзине,
+        а не пропадает вместе с оформленными
+        """
+        async with self._available():
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.hgetall(self._key(user_id))
+                pipe.delete(self._key(user_id))
+                raw, _ = await pipe.execute()
+        return self._parse(raw)
+
+    async def restore(self, user_id: str, quantities: dict[str, int]):
+        """Возвращает забранные позиции, если заказ не оформился"""
+        if not quantities:
+            return
+        args = [MAX_LINE_QUANTITY, CART_TTL]
+        for product_id, quantity in quantities.items():
+            args += [product_id, quantity]
+        try:
+            await self.merge(keys=[self._key(user_id)], args=args)
+        except (RedisError, OSError):
+            log.warning("⚠️ Корзина не восстановлена после неудачного оформления", exc_info=True,
+                        extra={"user_id": user_id, "items": len(quantities)})
+
+    async def get(self, db: AsyncSession, user_id: str) -> dict:
+        return await self.build(db, await self.get_quantities(user_id))
+
+    async def build(self, db: AsyncSession, quantities: dict[str, int]) -> dict:
+        """Итоги корзины считаются на сервере по кэшу цен"""
+        products = await self.prices.get_many(db, list(quantities))
+        items = []
+        total = 0.0
+        bonus_points = 0
+        for product_id, quantity in quantities.items():
+            product = products.get(product_id)
+            if product is None:
+                # Товар сняли с продажи — в итог не входит
+                continue
+            subtotal = product["price"] * quantity
+            total += subtotal
+            bonus_points += product["bonus_points"] * quantity
+            items.append({
+                "product_id": product_id,
+                "name": product["name"],
+                "image": product["image"],
+                "quantity": quantity,
+                "price": product["price"],
+                "subtotal": subtotal,
+                "in_stock": product["in_stock"],
+            })
+
+        return {
+            "items": items,
+            "total": total,
+            "bonus_points_earned": bonus_points,
+            "min_order_amount": settings.min_order_amount,
+            "is_valid_for_checkout": bool(items) and total >= settings.min_order_amount,
+        }
+
+
+cart_service = CartService(settings.redis_url)
+catalog_cache.invalidation_callbacks.append(cart_service.prices.invalidate_tags)
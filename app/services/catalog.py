@@ -0,0 +1,339 @@
+import base64
+import json
+from datetime import datetime
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import select, func, tuple_, event, inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.models.product import Product, Category
+from app.services.cache import catalog_cache, cache_key
+from app.services.http_cache import encode_body, make_etag
+from app.services.images import image_variants
+from app.services.search import apply_search
+
+# sort -> (колонка, по убыванию?)
+SORT_KEYS = {
+    "popular": (Product.sales_count, True),
+    "price": (Product.price, False),
+    "new": (Product.created_at, True),
+    "rating": (Product.rating, True),
+}
+
+
+def encode_cursor(value, product_id: str) -> str:
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([value, product_id], ensure_ascii=False).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        value, product_id = json.loads(base64.urlsafe_b64decode(padded))
+        if sort == "new":
+            value = datetime.fromisoformat(value)
+        return value, product_id
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def discount_percent(price: float, old_price: Optional[float]) -> int:
+    if not old_price or old_price <= price:
+        return 0
+    return round((old_price - price) / old_price * 100)
+
+
+def product_to_dict(product: Product, category_name: Optional[str]) -> dict:
+    return {
+        "id": product.id,
+        "name": product.name,
+        "description": product.description,
+        "price": product.price,
+        "old_price": product.old_price,
+        "discount_percent": discount_percent(product.price, product.old_price),
+        "currency": "KZT",
+        "category_id": product.category_id,
+        "category_name": category_name,
+        "images": product.images or [],
+        "image_variants": image_variants(product.images),
+        "in_stock": product.in_stock,
+        "stock_quantity": product.stock_quantity,
+        "bonus_points": product.bonus_points,
+        "rating": product.rating,
+        "reviews_count": product.reviews_count,
+    }
+
+
+def product_detail_to_dict(product: Product, category: Optional[Category]) -> dict:
+    return {
+        "id": product.id,
+        "name": product.name,
+        "description": product.description,
+        "full_description": product.full_description,
+        "price": product.price,
+        "old_price": product.old_price,
+        "discount_percent": discount_percent(product.price, product.old_price),
+        "currency": "KZT",
+        "category": {"id": category.id, "name": category.name} if category else None,
+        "images": product.images or [],
+        "image_variants": image_variants(product.images),
+        "in_stock": product.in_stock,
+        "stock_quantity": product.stock_quantity,
+        "bonus_points": product.bonus_points,
+        "specifications": product.specifications or {},
+        "reviews": [],
+        "rating": product.rating,
+        "reviews_count": product.reviews_count,
+    }
+
+
+# ========== ТЕГИ КЭША ==========
+# catalog            — листинги без фильтра по категории
+# category:<id>      — листинги категории
+# categories         — список категорий
+# product:<id>       — карточка товара
+# category-meta:<id> — карточки товаров категории (зависят от её названия)
+
+def listing_tags(category_id: Optional[int], product_ids: list[str]) -> list[str]:
+    tags = [f"category:{category_id}" if category_id else "catalog"]
+    tags.extend(f"product:{product_id}" for product_id in product_ids)
+    return tags
+
+
+def tags_for(obj) -> set[str]:
+    if isinstance(obj, Product):
+        tags = {"catalog", "categories", f"product:{obj.id}"}
+        category_ids = {obj.category_id, *inspect(obj).attrs.category_id.history.deleted}
+        tags.update(f"category:{category_id}" for category_id in category_ids if category_id)
+        return tags
+    if isinstance(obj, Category):
+        # Название категории входит и в листинги, и в карточки товаров
+        return {"catalog", "categories", f"category:{obj.id}", f"category-meta:{obj.id}"}
+    return set()
+
+
+def invalidate_after_commit(session, tags):
+    """Для изменений через Core UPDATE, которые ORM-хуки не видят"""
+    session.info.setdefault("catalog_cache_tags", set()).update(tags)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_catalog_tags(session, flush_context):
+    tags = session.info.setdefault("catalog_cache_tags", set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        tags.update(tags_for(obj))
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_catalog_cache(session):
+    tags = session.info.pop("catalog_cache_tags", None)
+    if not tags:
+        return
+    try:
+        catalog_cache.invalidate_later(tags)
+    except RuntimeError:
+        # Синхронные скрипты вне event loop — кэш истечёт по TTL
+        pass
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_catalog_tags(session):
+    session.info.pop("catalog_cache_tags", None)
+
+
+class CatalogService:
+    @staticmethod
+    async def estimate_count(db: AsyncSession, stmt) -> int:
+        """Оценка количества строк по плану запроса вместо полного COUNT(*)"""
+        count_stmt = stmt.with_only_columns(Product.id).order_by(None).limit(None).offset(None)
+        if db.bind.dialect.name != "postgresql":
+            result = await db.execute(select(func.count()).select_from(count_stmt.subquery()))
+            return result.scalar_one()
+
+        compiled = count_stmt.compile(
+            dialect=db.bind.dialect, compile_kwargs={"literal_binds": True}
+        )
+        # exec_driver_sql: литералы поискового запроса не должны разбираться как :bind-параметры
+        conn = await db.connection()
+        result = await conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}")
+        plan = result.scalar_one()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+
+    @staticmethod
+    async def list_products(
+            db: AsyncSession,
+            category_id: Optional[int] = None,
+            page: int = 1,
+            limit: int = 20,
+            sort: Optional[str] = None,
+            search: Optional[str] = None,
+            cursor: Optional[str] = None,
+    ) -> dict:
+        if sort is None:
+            sort = "relevance" if search else "popular"
+        if sort != "relevance" and sort not in SORT_KEYS:
+            raise HTTPException(status_code=400, detail=f"Unknown sort: {sort}")
+        limit = max(1, min(limit, 100))
+        page = max(1, page)
+
+        base = (
+            select(Product, Category.name)
+            .outerjoin(Category, Category.id == Product.category_id)
+            .where(Product.is_active.is_(True))
+        )
+        if category_id:
+            base = base.where(Product.category_id == category_id)
+        rank = None
+        if search:
+            base, rank = apply_search(base, search, db.bind.dialect.name)
+
+        if sort == "relevance":
+            if not search:
+                raise HTTPException(status_code=400, detail="Sort by relevance requires search")
+            return await CatalogService._list_by_relevance(db, base, rank, page, limit)
+
+        sort_column, descending = SORT_KEYS[sort]
+        stmt = base
+        if cursor:
+            value, last_id = decode_cursor(cursor, sort)
+            key = tuple_(sort_column, Product.id)
+            stmt = stmt.where(key < tuple_(value, last_id) if descending else key > tuple_(value, last_id))
+        elif page > 1:
+            # Совместимость со старыми клиентами, которые листают по номеру страницы
+            stmt = stmt.offset((page - 1) * limit)
+
+        if descending:
+            stmt = stmt.order_by(sort_column.desc(), Product.id.desc())
+        else:
+            stmt = stmt.order_by(sort_column.asc(), Product.id.asc())
+
+        # Берём на одну строку больше, чтобы узнать, есть ли следующая страница
+        result = await db.execute(stmt.limit(limit + 1))
+        rows = result.all()
+        has_next = len(rows) > limit
+        rows = rows[:limit]
+
+        next_cursor = None
+        if has_next:
+            last = rows[-1][0]
+            next_cursor = encode_cursor(getattr(last, sort_column.key), last.id)
+
+        total_items = await CatalogService.estimate_count(db, base)
+        return CatalogService._page(rows, page, limit, total_items, next_cursor, has_next)
+
+    @staticmethod
+    async def _list_by_relevance(db: AsyncSession, base, rank, page: int, limit: int) -> dict:
+        # Релевантность вычисляется на лету, поэтому здесь обычный offset:
+        # выдача поиска узкая, а стабильный курсор по float-рангу не построить.
+        stmt = (
+            base.order_by(rank.desc(), Product.id)
+            .offset((page - 1) * limit)
+            .limit(limit + 1)
+        )
+        result = await db.execute(stmt)
+        rows = result.all()
+        has_next = len(rows) > limit
+        rows = rows[:limit]
+
+        total_items = await CatalogService.estimate_count(db, base)
+        return CatalogService._page(rows, page, limit, total_items, None, has_next)
+
+    @staticmethod
+    def _page(rows, page: int, limit: int, total_items: int, next_cursor, has_next: bool) -> dict:
+        return {
+            "data": [product_to_dict(product, category_name) for product, category_name in rows],
+            "pagination": {
+                "current_page": page,
+                "total_pages": max(1, -(-total_items // limit)),
+                "total_items": total_items,
+                "items_per_page": limit,
+                "next_cursor": next_cursor,
+                "has_next": has_next,
+            },
+        }
+
+    @staticmethod
+    async def list_categories(db: AsyncSession) -> list[dict]:
+        product_count = (
+            select(Product.category_id, func.count().label("product_count"))
+            .where(Product.is_active.is_(True))
+            .group_by(Product.category_id)
+            .subquery()
+        )
+        result = await db.execute(
+            select(Category, func.coalesce(product_count.c.product_count, 0))
+            .outerjoin(product_count, product_count.c.category_id == Category.id)
+            .where(Category.is_active.is_(True))
+            .order_by(Category.sort_order, Category.id)
+        )
+        return [
+            {
+                "id": category.id,
+                "name": category.name,
+                "slug": category.slug,
+                "image_url": category.image_url,
+                "product_count": count,
+            }
+            for category, count in result.all()
+        ]
+
+    @staticmethod
+    async def categories_body(db: AsyncSession) -> tuple[bytes, str]:
+        """Закодированный ответ со списком категорий и его ETag"""
+        key = "body:categories"
+        cached = await catalog_cache.get_body(key)
+        if cached is not None:
+            return cached
+
+        body = encode_body({"success": True, "data": await CatalogService.list_categories(db)})
+        etag = make_etag(body)
+        await catalog_cache.set_body(key, body, etag, tags=["categories"])
+        return body, etag
+
+    @staticmethod
+    async def list_products_cached(db: AsyncSession, **params) -> dict:
+        key = cache_key("products", **params)
+        cached = await catalog_cache.get(key)
+        if cached is not None:
+            return cached
+
+        listing = await CatalogService.list_products(db, **params)
+        product_ids = [product["id"] for product in listing["data"]]
+        await catalog_cache.set(key, listing, tags=listing_tags(params.get("category_id"), product_ids))
+        return listing
+
+    @staticmethod
+    async def get_product(db: AsyncSession, product_id: str) -> dict:
+        result = await db.execute(
+            select(Product, Category)
+            .outerjoin(Category, Category.id == Product.category_id)
+            .where(Product.id == product_id, Product.is_active.is_(True))
+        )
+        row = result.first()
+        if row is None:
+            raise HTTPException(status_code=404, detail="Товар не найден")
+
+        return product_detail_to_dict(*row)
+
+    @staticmethod
+    async def product_body(db: AsyncSession, product_id: str) -> tuple[bytes, str]:
+        """Закодированная карточка товара и её ETag"""
+        key = f"body:product:{product_id}"
+        cached = await catalog_cache.get_body(key)
+        if cached is not None:
+            return cached
+
+        product = await CatalogService.get_product(db, product_id)
+        body = encode_body({"success": True, "data": product})
+        etag = make_etag(body)
+        tags = [f"product:{product_id}"]
+        if product["category"]:
+            tags.append(f"category-meta:{product['category']['id']}")
+        await catalog_cache.set_body(key, body, etag, tags=tags)
+        return body, etag
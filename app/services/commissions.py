@@ -0,0 +1,182 @@
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import select, delete, insert, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models.commission import Commission, PayoutRun
+from app.models.order import Order
+from app.models.product import Product
+from app.models.user import User, UserStatus, PartnershipType
+from app.services.stats import StatsService
+
+INSERT_BATCH_SIZE = 5000
+
+
+@dataclass
+class CommissionResult:
+    """Агрегированные начисления: по строке на (партнёр, уровень)"""
+    user_index: np.ndarray
+    level: np.ndarray
+    amount: np.ndarray
+    orders_count: np.ndarray
+
+
+def period_bounds(period: str) -> tuple[datetime, datetime]:
+    start = datetime.strptime(period, "%Y-%m").replace(tzinfo=timezone.utc)
+    end = start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1)
+    return start, end
+
+
+def compute_commissions(parent: np.ndarray, eligible: np.ndarray, buyer: np.ndarray,
+                        pool: np.ndarray, shares: list[float]) -> CommissionResult:
+    """
+    Векторный расчёт по всем заказам периода сразу.
+
+    parent   — индекс спонсора для каждого пользователя (-1 у корня)
+    eligible — может ли пользователь получать комиссию
+    buyer    — индекс покупателя для каждого заказа
+    pool     — комиссионный пул каждого заказа
+    shares   — доля пула на уровень 1, 2, ...
+
+    На каждом уровне аплайн всех заказов сдвигается на одного спонсора вверх
+    (parent[ancestor]), суммы сворачиваются по получателю через bincount.
+    """
+    n_users = len(parent)
+    user_parts, level_parts, amount_parts, count_parts = [], [], [], []
+
+    ancestor = buyer
+    for level, share in enumerate(shares, start=1):
+        alive = ancestor >= 0
+        if not alive.any():
+            break
+        ancestor = np.where(alive, parent[np.maximum(ancestor, 0)], -1)
+        paid = ancestor >= 0
+        paid[paid] = eligible[ancestor[paid]]
+        if not paid.any():
+            continue
+
+        recipients = ancestor[paid]
+        amounts = np.bincount(recipients, weights=pool[paid] * share, minlength=n_users)
+        counts = np.bincount(recipients, minlength=n_users)
+        users = np.flatnonzero(counts)
+
+        user_parts.append(users)
+        level_parts.append(np.full(len(users), level, dtype=np.int16))
+        amount_parts.append(np.round(amounts[users], 2))
+        count_parts.append(counts[users])
+
+    if not user_parts:
+        empty = np.empty(0, dtype=np.int64)
+        return CommissionResult(empty, empty.astype(np.int16), empty.astype(np.float64), empty)
+
+    return CommissionResult(
+        np.concatenate(user_parts),
+        np.concatenate(level_parts),
+        np.concatenate(amount_parts),
+        np.concatenate(count_parts),
+    )
+
+
+class CommissionService:
+    @staticmethod
+    async def load_tree(db: AsyncSession) -> tuple[list[str], np.ndarray, np.ndarray]:
+        """Спонсорское дерево в виде массивов: ids, parent, eligible"""
+        result = await db.stream(
+            select(User.id, User.sponsor_id, User.partnership_type, User.status)
+            .execution_options(yield_per=50000)
+        )
+        ids, sponsors, eligible = [], [], []
+        async for user_id, sponsor_id, partnership_type, user_status in result:
+            ids.append(user_id)
+            sponsors.append(sponsor_id)
+            eligible.append(partnership_type == PartnershipType.LEADER and user_status == UserStatus.ACTIVE)
+
+        index = {user_id: i for i, user_id in enumerate(ids)}
+        parent = np.fromiter((index.get(sponsor_id, -1) for sponsor_id in sponsors), dtype=np.int64, count=len(ids))
+        return ids, parent, np.array(eligible, dtype=bool)
+
+    @staticmethod
+    async def load_orders(db: AsyncSession, period: str, index: dict[str, int]) -> tuple[np.ndarray, np.ndarray]:
+        """Оплаченные заказы периода: индекс покупателя и комиссионный пул заказа"""
+        products = await db.execute(select(Product.id, Product.commission_percent))
+        percent = {product_id: (pct or 0.0) / 100 for product_id, pct in products}
+
+        start, end = period_bounds(period)
+        result = await db.stream(
+            select(Order.user_id, Order.items)
+            .where(Order.payment_status == "paid", Order.created_at >= start, Order.created_at < end)
+            .execution_options(yield_per=20000)
+        )
+        buyers, pools = [], []
+        async for user_id, items in result:
+            buyer = index.get(user_id)
+            if buyer is None:
+                continue
+            buyers.append(buyer)
+            pools.append(sum(
+                item.get("price", 0) * item.get("quantity", 1) * percent.get(item.get("product_id"), 0.0)
+                for item in items or ()
+            ))
+        return np.array(buyers, dtype=np.int64), np.array(pools, dtype=np.float64)
+
+    @staticmethod
+    async def run_period(db: AsyncSession, period: str, force: bool = False,
+                         shares: Optional[list[float]] = None) -> Optional[PayoutRun]:
+        """
+        Считает и записывает комиссии за период. Вся запись — одна транзакция:
+        при сбое ничего не остаётся, и повторный запуск начинает заново.
+        Завершённый период пропускается, если не задан force.
+        """
+        shares = shares or settings.commission_level_shares
+        run = await db.get(PayoutRun, period)
+        if run is not None and run.status == "completed" and not force:
+            return None
+        if run is None:
+            run = PayoutRun(period=period)
+            db.add(run)
+        run.status = "running"
+        run.revision = (run.revision or 0) + 1
+        run.finished_at = None
+
+        ids, parent, eligible = await CommissionService.load_tree(db)
+        index = {user_id: i for i, user_id in enumerate(ids)}
+        buyer, pool = await CommissionService.load_orders(db, period, index)
+        result = compute_commissions(parent, eligible, buyer, pool, shares)
+
+        previous = await db.execute(
+            select(Commission.user_id, func.sum(Commission.amount))
+            .where(Commission.period == period)
+            .group_by(Commission.user_id)
+        )
+        previous_earnings = dict(previous.all())
+        await db.execute(delete(Commission).where(Commission.period == period))
+        rows = [
+            {"period": period, "user_id": ids[user], "level": int(level), "amount": float(amount), "orders_count": int(count)}
+            for user, level, amount, count in zip(
+                result.user_index.tolist(), result.level.tolist(), result.amount.tolist(), result.orders_count.tolist()
+            )
+        ]
+        for start in range(0, len(rows), INSERT_BATCH_SIZE):
+            await db.execute(insert(Commission), rows[start:start + INSERT_BATCH_SIZE])
+
+        # В total_earnings идёт разница с прошлым расчётом периода (при первом —
+        # вся сумма); event_id с номером расчёта — повтор той же транзакции
+        # ничего не начислит, а force-пересчёт поправит суммы
+        earnings = np.bincount(result.user_index, weights=result.amount, minlength=len(ids))
+        deltas = {ids[i]: float(earnings[i]) for i in np.flatnonzero(earnings)}
+        for user_id, amount in previous_earnings.items():
+            deltas[user_id] = deltas.get(user_id, 0.0) - amount
+        await StatsService.on_earnings(
+            db, f"payout:{period}:{run.revision}",
+            {user_id: round(delta, 2) for user_id, delta in deltas.items() if abs(delta) >= 0.005},
+        )
+
+        run.status = "completed"
+        run.orders_processed = len(buyer)
+        run.total_amount = float(result.amount.sum())
+        run.finished_at = datetime.now(timezone.utc)
+        return run
@@ -0,0 +1,153 @@
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import select, update, func, case, literal
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.user import User, UserStatus
+
+SEPARATOR = "."
+
+
+def build_path(sponsor_path: Optional[str], user_id: str) -> str:
+    return f"{sponsor_path or SEPARATOR}{user_id}{SEPARATOR}"
+
+
+def path_ids(path: str) -> list[str]:
+    return [part for part in path.split(SEPARATOR) if part]
+
+
+def subtree_end(path: str) -> str:
+    """
+    Верхняя граница поддерева: пути с префиксом path (он всегда кончается
+    разделителем) при побайтовом сравнении лежат ровно в [path, subtree_end(path)).
+    """
+    return path[:-1] + chr(ord(SEPARATOR) + 1)
+
+
+def path_key(column, dialect_name: str):
+    """
+    Путь в побайтовом порядке: на PostgreSQL — с COLLATE "C", как в индексе
+    ix_users_sponsor_path_c, иначе планировщик его не возьмёт.
+    """
+    return column.collate("C") if dialect_name == "postgresql" else column
+
+
+def relative_level(path: str, ancestor_id: str) -> int:
+    """Уровень пользователя с путём path в структуре ancestor_id — без запроса к БД"""
+    ids = path_ids(path)
+    return len(ids) - 1 - ids.index(ancestor_id)
+
+
+class GenealogyService:
+    """Запросы по спонсорскому дереву через материализованный путь User.sponsor_path"""
+
+    @staticmethod
+    def attach(user: User, sponsor: Optional[User]):
+        """Заполняет путь нового пользователя; вызывается до flush при регистрации"""
+        user.sponsor_path = build_path(sponsor.sponsor_path if sponsor else None, user.id)
+        user.sponsor_depth = sponsor.sponsor_depth + 1 if sponsor else 0
+
+    @staticmethod
+    async def _get_user(db: AsyncSession, user_id: str) -> User:
+        result = await db.execute(select(User).where(User.id == user_id))
+        user = result.scalar_one_or_none()
+        if user is None:
+            raise HTTPException(status_code=404, detail="Пользователь не найден")
+        return user
+
+    @staticmethod
+    def _downline_filter(user: User, dialect_name: str):
+        path = path_key(User.sponsor_path, dialect_name)
+        return (path > user.sponsor_path) & (path < subtree_end(user.sponsor_path))
+
+    @staticmethod
+    async def level_counts(db: AsyncSession, user_id: str, max_depth: Optional[int] = None) -> list[dict]:
+        """Количество (и активных) партнёров на каждом уровне структуры"""
+        user = await GenealogyService._get_user(db, user_id)
+        level = User.sponsor_depth - user.sponsor_depth
+        stmt = (
+            select(
+                level.label("level"),
+                func.count().label("total"),
+                func.sum(case((User.status == UserStatus.ACTIVE, 1), else_=0)).label("active"),
+            )
+            .where(GenealogyService._downline_filter(user, db.bind.dialect.name))
+            .group_by(User.sponsor_depth)
+            .order_by(User.sponsor_depth)
+        )
+        if max_depth is not None:
+            stmt = stmt.where(User.sponsor_depth <= user.sponsor_depth + max_depth)
+        result = await db.execute(stmt)
+        return [{"level": row.level, "total": row.total, "active": row.active or 0} for row in result]
+
+    @staticmethod
+    async def team_summary(db: AsyncSession, user_id: str) -> dict:
+        levels = await GenealogyService.level_counts(db, user_id)
+        first_line = next((level for level in levels if level["level"] == 1), None)
+        return {
+            "team_size": sum(level["total"] for level in levels),
+            "active_referrals": first_line["active"] if first_line else 0,
+            "levels": levels,
+        }
+
+    @staticmethod
+    async def downline(db: AsyncSession, user_id: str, max_depth: Optional[int] = None,
+                       after: Optional[str] = None, limit: int = 50) -> list[User]:
+        """Страница даунлайна в порядке пути (обход дерева в глубину)"""
+        user = await GenealogyService._get_user(db, user_id)
+        path = path_key(User.sponsor_path, db.bind.dialect.name)
+        stmt = select(User).where(GenealogyService._downline_filter(user, db.bind.dialect.name))
+        if max_depth is not None:
+            stmt = stmt.where(User.sponsor_depth <= user.sponsor_depth + max_depth)
+        if after:
+            stmt = stmt.where(path > after)
+        result = await db.execute(stmt.order_by(path).limit(min(limit, 200)))
+        return list(result.scalars())
+
+    @staticmethod
+    async def upline(db: AsyncSession, user_id: str) -> list[User]:
+        """Цепочка спонсоров от прямого спонсора до корня"""
+        user = await GenealogyService._get_user(db, user_id)
+        ancestor_ids = path_ids(user.sponsor_path)[:-1]
+        if not ancestor_ids:
+            return []
+        result = await db.execute(
+            select(User).where(User.id.in_(ancestor_ids)).order_by(User.sponsor_depth.desc())
+        )
+        return list(result.scalars())
+
+    @staticmethod
+    async def rebuild(db: AsyncSession) -> int:
+        """
+        Пересчёт путей для всего дерева по уровням (для существующих данных).
+        Каждый уровень — один UPDATE, итого столько запросов, какова глубина дерева.
+        """
+        known = select(User.id).scalar_subquery()
+        await db.execute(
+            update(User).values(sponsor_path=None).execution_options(synchronize_session=False)
+        )
+        await db.execute(
+            update(User)
+            .where((User.sponsor_id.is_(None)) | (User.sponsor_id.not_in(known)))
+            .values(sponsor_path=literal(SEPARATOR) + User.id + SEPARATOR, sponsor_depth=0)
+            .execution_options(synchronize_session=False)
+        )
+
+        sponsor = User.__table__.alias("sponsor")
+        depth = 0
+        while True:
+            parent_path = (
+                select(sponsor.c.sponsor_path)
+                .where(sponsor.c.id == User.sponsor_id, sponsor.c.sponsor_depth == depth)
+                .scalar_subquery()
+            )
+            result = await db.execute(
+                update(User)
+                .where(User.sponsor_path.is_(None), parent_path.is_not(None))
+                .values(sponsor_path=parent_path + User.id + SEPARATOR, sponsor_depth=depth + 1)
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount == 0:
+                return depth
+            depth += 1
@@ -0,0 +1,70 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+from fastapi import HTTPException, status
+
+from app.config import settings
+
+
+class PasswordHasher:
+    """
+    Выполняет bcrypt в отдельном пуле потоков, чтобы не блокировать event loop.
+    bcrypt отпускает GIL, поэтому потоков достаточно. Одновременно считается
+    не больше `workers` хэшей, в очереди ждут не больше `max_queue` — лишние
+    запросы получают 503 вместо бесконечного ожидания.
+    """
+
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.stats = {"in_flight": 0, "queued": 0, "completed": 0, "rejected": 0}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.workers)
+        return self._semaphore
+
+    async def run(self, func: Callable, *args):
+        if self.stats["queued"] >= self.max_queue:
+            self.stats["rejected"] += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Сервер перегружен, повторите попытку позже",
+                headers={"Retry-After": "1"},
+            )
+
+        self.stats["queued"] += 1
+        try:
+            await self.semaphore.acquire()
+        finally:
+            self.stats["queued"] -= 1
+
+        self.stats["in_flight"] += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, func, *args)
+        finally:
+            self.stats["in_flight"] -= 1
+            self.stats["completed"] += 1
+            self.semaphore.release()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(
+    workers=settings.password_hash_workers,
+    max_queue=settings.password_hash_max_queue,
+)
@@ -0,0 +1,32 @@
+import hashlib
+from typing import Optional
+
+from fastapi import Request, Response
+
+from app.services.serialization import dumps, JSON_MEDIA_TYPE
+
+
+def encode_body(payload) -> bytes:
+    return dumps(payload)
+
+
+def make_etag(body: bytes) -> str:
+    """Сильный ETag — хэш закодированного тела, меняется с каждой версией ресурса"""
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Для If-None-Match используется слабое сравнение (RFC 9110, 13.1.2)
+    candidates = (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+    return etag in candidates
+
+
+def conditional_response(request: Request, body: bytes, etag: str) -> Response:
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type=JSON_MEDIA_TYPE, headers=headers)
@@ -0,0 +1,210 @@
+"""
+Генератор идентификаторов в духе snowflake: 42 бита — миллисекунды от
+эпохи, 14 — номер узла (процесса), 12 — счётчик внутри миллисекунды.
+Число кодируется Crockford base32 фиксированной длины, поэтому строки
+сортируются так же, как числа, то есть по времени создания: новые ключи
+users/orders дописываются в конец B-tree индекса, а не в случайные страницы.
+
+Без блокировок и повторов при unique violation: уникальность внутри процесса
+даёт счётчик, между процессами — номер узла. Узел арендуется в Redis
+(SET ids:node:<n> NX EX) при старте воркера и продлевается фоновой задачей,
+поэтому занятый живым процессом номер не выдаётся повторно. Общий счётчик
+ids:node (INCR) лишь задаёт, с какого слота начать поиск: его переполнение
+за MAX_NODE безопасно, свободу слота подтверждает SET NX. Без Redis узел
+случайный (с предупреждением в логе: между воркерами возможны совпадения
+по парадоксу дней рождения), после fork — тоже случайный до новой аренды.
+Генерация синхронная и вызывается из event loop, поэтому гонок между
+корутинами нет; потокам нужен собственный экземпляр с отдельным узлом.
+"""
+import asyncio
+import os
+import secrets
+import socket
+import time
+from typing import Optional
+
+import redis.asyncio as aioredis
+from redis.exceptions import RedisError
+
+from app.config import settings
+from app.services.logs import logger
+
+log = logger.getChild("ids")
+
+# 2024-01-01T00:00:00Z
+EPOCH_MS = 1704067200000
+
+NODE_BITS = 14
+SEQUENCE_BITS = 12
+MAX_NODE = (1 << NODE_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+
+ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+ENCODED_LENGTH = 14  # 70 бит >= 42 + 14 + 12
+
+NODE_COUNTER_KEY = "ids:node"
+NODE_LEASE_KEY = "ids:node:{}"
+
+# KEYS: ключ слота; ARGV: владелец, срок в секундах. Продлевает свою аренду
+# или занимает слот заново, если она истекла, пока Redis был недоступен.
+# 0 — слот уже у другого процесса.
+RENEW_LUA = """
+local owner = redis.call('GET', KEYS[1])
+if owner == ARGV[1] then
+    redis.call('EXPIRE', KEYS[1], ARGV[2])
+    return 1
+end
+if not owner then
+    redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+    return 1
+end
+return 0
+"""
+
+# Снимает аренду, только если слот всё ещё наш
+RELEASE_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def encode(value: int) -> str:
+    chars = []
+    for _ in range(ENCODED_LENGTH):
+        chars.append(ALPHABET[value & 31])
+        value >>= 5
+    return "".join(reversed(chars))
+
+
+def decode(encoded: str) -> int:
+    value = 0
+    for char in encoded:
+        value = (value << 5) | ALPHABET.index(char)
+    return value
+
+
+class IdGenerator:
+    def __init__(self, node: Optional[int] = None, lease_ttl: int = 60):
+        self.node = secrets.randbelow(MAX_NODE + 1) if node is None else node
+        self.lease_ttl = lease_ttl
+        self.stats = {"leases": 0, "renewals": 0, "renew_errors": 0, "lost_leases": 0}
+        self._last_ms = 0
+        self._sequence = 0
+        self._redis: Optional[aioredis.Redis] = None
+        self._owner = f"{socket.gethostname()}:{os.getpid()}:{secrets.token_hex(4)}"
+        self._lease_key: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def next_int(self) -> int:
+        now = time.time_ns() // 1_000_000 - EPOCH_MS
+        if now > self._last_ms:
+            self._last_ms = now
+            self._sequence = 0
+        else:
+            # Та же миллисекунда или часы ушли назад: продолжаем от последней
+            # выданной метки, монотонность важнее точного времени
+            self._sequence += 1
+            if self._sequence > MAX_SEQUENCE:
+                self._last_ms += 1
+                self._sequence = 0
+        return (self._last_ms << (NODE_BITS + SEQUENCE_BITS)) | (self.node << SEQUENCE_BITS) | self._sequence
+
+    def new_id(self, prefix: str = "") -> str:
+        return prefix + encode(self.next_int())
+
+    def reseed(self):
+        """Новый случайный узел — в дочернем процессе после fork"""
+        self.node = secrets.randbelow(MAX_NODE + 1)
+        self._last_ms = 0
+        self._sequence = 0
+        # Аренда и задача продления остались у родителя
+        self._owner = f"{socket.gethostname()}:{os.getpid()}:{secrets.token_hex(4)}"
+        self._lease_key = None
+        self._task = None
+
+    async def lease_node(self, redis: aioredis.Redis):
+        """
+        Занимает свободный слот узла: SET NX EX, начиная с номера из общего
+        счётчика и дальше по кругу. Бросает RedisError, если Redis недоступен
+        или все MAX_NODE + 1 слотов заняты живыми процессами.
+        """
+        start = await redis.incr(NODE_COUNTER_KEY)
+        for offset in range(MAX_NODE + 1):
+            node = (start + offset) & MAX_NODE
+            key = NODE_LEASE_KEY.format(node)
+            if await redis.set(key, self._owner, nx=True, ex=self.lease_ttl):
+                self.node = node
+                self._lease_key = key
+                self.stats["leases"] += 1
+                return
+        raise RedisError("все номера узлов генератора идентификаторов заняты")
+
+    async def start(self, redis: aioredis.Redis):
+        """Аренда узла и фоновое продление; без Redis — случайный узел"""
+        self._redis = redis
+        try:
+            await self.lease_node(redis)
+        except (RedisError, OSError):
+            log.warning("⚠️ Узел генератора ID не арендован, выбран случайный: возможны совпадения "
+                        "идентификаторов между воркерами", exc_info=True, extra={"node": self.node})
+        if self._task is None:
+            self._task = asyncio.create_task(self._renew_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._lease_key is not None:
+            try:
+                await self._redis.eval(RELEASE_LUA, 1, self._lease_key, self._owner)
+            except (RedisError, OSError):
+                pass  # аренда истечёт сама через lease_ttl
+            self._lease_key = None
+
+    async def renew(self):
+        """Продлевает аренду; если слот заняли, пока Redis был недоступен, — арендует новый"""
+        if self._lease_key is None:
+            await self.lease_node(self._redis)
+            log.info("🆔 Узел генератора ID арендован", extra={"node": self.node})
+            return
+        if await self._redis.eval(RENEW_LUA, 1, self._lease_key, self._owner, self.lease_ttl):
+            self.stats["renewals"] += 1
+            return
+        self.stats["lost_leases"] += 1
+        log.warning("⚠️ Аренда узла генератора ID потеряна, арендуем новый", extra={"node": self.node})
+        self._lease_key = None
+        await self.lease_node(self._redis)
+
+    async def _renew_loop(self):
+        # Продление втрое чаще срока: переживает пару неудачных попыток подряд
+        while True:
+            await asyncio.sleep(self.lease_ttl / 3)
+            try:
+                await self.renew()
+            except (RedisError, OSError):
+                self.stats["renew_errors"] += 1
+
+
+def created_at_ms(encoded: str) -> int:
+    """Unix-время (мс) создания по идентификатору без префикса"""
+    return (decode(encoded) >> (NODE_BITS + SEQUENCE_BITS)) + EPOCH_MS
+
+
+id_generator = IdGenerator(lease_ttl=settings.ids_node_lease_ttl)
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=id_generator.reseed)
+
+
+def new_user_id() -> str:
+    return id_generator.new_id("ID")
+
+
+def new_order_id() -> str:
+    return id_generator.new_id("OR")
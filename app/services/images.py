@@ -0,0 +1,252 @@
+"""
+Изображения товаров: при загрузке оригинал режется на варианты (thumb, card,
+detail) в WebP и JPEG в отдельном пуле процессов, чтобы Pillow не занимал
+event loop и GIL воркера.
+
+Файлы лежат по хэшу содержимого:
+    {media_root}/products/ab/<key>/original.jpg
+    {media_root}/products/ab/<key>/card.webp
+key — sha256 от версии конвейера и байтов оригинала, поэтому по одному URL
+всегда одни и те же байты: отдаём с Cache-Control immutable на год. При смене
+размеров или качества повышается PIPELINE_VERSION — и меняются пути.
+"""
+import asyncio
+import hashlib
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import AsyncIterable, Optional
+
+from fastapi import HTTPException, Response, status
+from fastapi.responses import FileResponse
+from PIL import Image, ImageOps, UnidentifiedImageError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models.product import Product
+
+PIPELINE_VERSION = "1"
+
+# Вариант -> максимальная сторона в пикселях
+VARIANTS = {"thumb": 240, "card": 600, "detail": 1200}
+# Формат -> (расширение, параметры Pillow)
+VARIANT_FORMATS = {
+    "webp": ("webp", {"format": "WEBP", "quality": 80, "method": 4}),
+    "jpeg": ("jpg", {"format": "JPEG", "quality": 82, "progressive": True, "optimize": True}),
+}
+SOURCE_FORMATS = {"JPEG": "jpg", "PNG": "png", "WEBP": "webp"}
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+PRODUCTS_DIR = "products"
+
+
+# ========== ОБРАБОТКА (в дочернем процессе) ==========
+
+def _write_atomic(path: Path, data: bytes):
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def render_variants(data: bytes, media_root: str) -> str:
+    """Сохраняет оригинал и варианты; возвращает путь оригинала относительно media_root"""
+    try:
+        with Image.open(io.BytesIO(data)) as probe:
+            source_format = probe.format
+            probe.verify()
+        if source_format not in SOURCE_FORMATS:
+            raise ValueError(f"Неподдерживаемый формат: {source_format}")
+
+        key = hashlib.sha256(PIPELINE_VERSION.encode() + data).hexdigest()[:32]
+        directory = Path(media_root) / PRODUCTS_DIR / key[:2] / key
+        original = directory / f"original.{SOURCE_FORMATS[source_format]}"
+        if original.exists():
+            # Такой файл уже загружали — варианты готовы
+            return original.relative_to(media_root).as_posix()
+        directory.mkdir(parents=True, exist_ok=True)
+
+        image = Image.open(io.BytesIO(data))
+        # JPEG сразу декодируется в уменьшенном масштабе (DCT), если оригинал огромный
+        image.draft("RGB", (max(VARIANTS.values()),) * 2)
+        image = ImageOps.exif_transpose(image)
+        has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+        image = image.convert("RGBA" if has_alpha else "RGB")
+
+        # От большего к меньшему: каждый следующий вариант уменьшается из предыдущего
+        for variant, size in sorted(VARIANTS.items(), key=lambda item: -item[1]):
+            image = image.copy()
+            image.thumbnail((size, size), Image.Resampling.LANCZOS)
+            flat = image
+            if has_alpha:
+                flat = Image.new("RGB", image.size, "white")
+                flat.paste(image, mask=image.getchannel("A"))
+            for extension, options in VARIANT_FORMATS.values():
+                buffer = io.BytesIO()
+                (image if options["format"] == "WEBP" else flat).save(buffer, **options)
+                _write_atomic(directory / f"{variant}.{extension}", buffer.getvalue())
+
+        # Оригинал последним: его наличие означает, что варианты готовы
+        _write_atomic(original, data)
+        return original.relative_to(media_root).as_posix()
+    except UnidentifiedImageError:
+        raise ValueError("Файл не является изображением") from None
+    except (OSError, Image.DecompressionBombError, SyntaxError) as exc:
+        raise ValueError(f"Не удалось обработать изображение: {exc}") from None
+
+
+# ========== URL ВАРИАНТОВ ==========
+
+def variant_urls(url: str) -> dict:
+    """
+    URL вариантов для URL оригинала. У старых путей (/images/products/*.jpg)
+    вариантов нет — во всех размерах отдаётся сам оригинал в jpeg.
+    """
+    prefix = f"{settings.media_url}/{PRODUCTS_DIR}/"
+    base, _, name = url.rpartition("/")
+    if not url.startswith(prefix) or not name.startswith("original."):
+        return {variant: {"jpeg": url} for variant in VARIANTS}
+    return {
+        variant: {fmt: f"{base}/{variant}.{extension}" for fmt, (extension, _) in VARIANT_FORMATS.items()}
+        for variant in VARIANTS
+    }
+
+
+def image_variants(images: Optional[list]) -> list[dict]:
+    return [variant_urls(url) for url in images or []]
+
+
+# ========== ПУЛ ПРОЦЕССОВ ==========
+
+class ImageProcessor:
+    """
+    Пул процессов для Pillow. Как и PasswordHasher: одновременно не больше
+    `workers` задач, в очереди — не больше `max_queue`, остальным 503.
+    Процессы запускаются через spawn: воркер уже держит потоки и event loop,
+    fork от такого процесса небезопасен.
+    """
+
+    def __init__(self, workers: int, max_queue: int, media_root: str):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.media_root = media_root
+        self.stats = {"in_flight": 0, "queued": 0, "completed": 0, "failed": 0, "rejected": 0}
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.workers)
+        return self._semaphore
+
+    async def process(self, data: bytes) -> str:
+        if self.stats["queued"] >= self.max_queue:
+            self.stats["rejected"] += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Сервер перегружен, повторите попытку позже",
+                headers={"Retry-After": "5"},
+            )
+
+        self.stats["queued"] += 1
+        try:
+            await self.semaphore.acquire()
+        finally:
+            self.stats["queued"] -= 1
+
+        self.stats["in_flight"] += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, render_variants, data, self.media_root)
+        except ValueError as exc:
+            self.stats["failed"] += 1
+            raise HTTPException(status_code=422, detail=str(exc))
+        finally:
+            self.stats["in_flight"] -= 1
+            self.stats["completed"] += 1
+            self.semaphore.release()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+image_processor = ImageProcessor(
+    workers=settings.image_workers,
+    max_queue=settings.image_max_queue,
+    media_root=settings.media_root,
+)
+
+
+# ========== ОТДАЧА ФАЙЛОВ ==========
+
+class SendfileResponse(FileResponse):
+    """
+    FileResponse, который отдаёт файл через sendfile, если ASGI-сервер
+    поддерживает расширение http.response.zerocopysend; иначе — чтением по частям.
+    """
+
+    async def __call__(self, scope, receive, send):
+        if "http.response.zerocopysend" not in scope.get("extensions", {}) or scope["method"] == "HEAD":
+            return await super().__call__(scope, receive, send)
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        with open(self.path, "rb") as file:
+            await send({"type": "http.response.zerocopysend", "file": file})
+
+
+def media_response(path: str) -> Response:
+    """Файл из media_root с бессрочным кэшированием"""
+    root = Path(settings.media_root).resolve()
+    file_path = (root / path).resolve()
+    if not file_path.is_relative_to(root) or not file_path.is_file():
+        raise HTTPException(status_code=404, detail="Файл не найден")
+
+    headers = {"Cache-Control": IMMUTABLE_CACHE_CONTROL}
+    if settings.media_accel_redirect:
+        # За nginx: файл отдаёт он сам (sendfile), приложение только проверяет путь
+        headers["X-Accel-Redirect"] = f"{settings.media_accel_redirect.rstrip('/')}/{file_path.relative_to(root).as_posix()}"
+        return Response(headers=headers)
+    return SendfileResponse(file_path, stat_result=file_path.stat(), headers=headers)
+
+
+# ========== ЗАГРУЗКА ==========
+
+async def read_limited(chunks: AsyncIterable[bytes], limit: int) -> bytes:
+    parts = []
+    size = 0
+    async for chunk in chunks:
+        size += len(chunk)
+        if size > limit:
+            raise HTTPException(status_code=413, detail=f"Файл больше {limit} байт")
+        parts.append(chunk)
+    if not size:
+        raise HTTPException(status_code=400, detail="Пустое тело запроса")
+    return b"".join(parts)
+
+
+class ProductImageService:
+    @staticmethod
+    async def add_image(db: AsyncSession, product_id: str, chunks: AsyncIterable[bytes]) -> dict:
+        """Добавляет изображение в конец галереи товара"""
+        product = await db.get(Product, product_id)
+        if product is None:
+            raise HTTPException(status_code=404, detail="Товар не найден")
+
+        data = await read_limited(chunks, settings.image_max_bytes)
+        path = await image_processor.process(data)
+        url = f"{settings.media_url}/{path}"
+        if url not in (product.images or []):
+            # Новый список, чтобы ORM заметил изменение JSON-колонки (и сбросил кэш по тегам)
+            product.images = [*(product.images or []), url]
+        return {"images": product.images, "image_variants": image_variants(product.images)}
@@ -0,0 +1,171 @@
+import logging
+import os
+import queue
+import random
+import sys
+import time
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+import orjson
+from starlette.routing import compile_path
+
+from app.config import settings
+
+REQUEST_ID_HEADER = b"x-request-id"
+
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+# Попал ли запрос в выборку: INFO и ниже пишутся только для выбранных запросов
+sampled_var: ContextVar[bool] = ContextVar("log_sampled", default=True)
+
+# Служебные поля LogRecord: всё остальное, что пришло через extra=, уходит в JSON
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "request_id"}
+
+logger = logging.getLogger("fenix")
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            entry["request_id"] = request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return orjson.dumps(entry, default=str).decode()
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    Кладёт запись в ограниченную очередь и сразу возвращается: форматирование
+    и запись в stdout — в отдельном потоке. Если очередь полна (коллектор не
+    успевает), запись теряется и считается в stats["dropped"], запрос не ждёт.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.stats = {"dropped": 0, "sampled_out": 0}
+
+    def handle(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.WARNING and not sampled_var.get():
+            self.stats["sampled_out"] += 1
+            return False
+        return super().handle(record)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Контекст запроса есть только в этом потоке — забираем его до очереди
+        record.request_id = request_id_var.get()
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.stats["dropped"] += 1
+
+
+class DrainingQueueListener(QueueListener):
+    def enqueue_sentinel(self):
+        # При остановке дожидаемся места в очереди, чтобы дописать хвост логов
+        self.queue.put(self._sentinel)
+
+
+class LogPipeline:
+    def __init__(self, max_queue: int, level: str):
+        self.queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self.handler = DroppingQueueHandler(self.queue)
+        output = logging.StreamHandler(sys.stdout)
+        output.setFormatter(JSONFormatter())
+        self.listener = DrainingQueueListener(self.queue, output, respect_handler_level=True)
+        self._started = False
+
+        logger.setLevel(level.upper())
+        logger.addHandler(self.handler)
+        logger.propagate = False
+
+    @property
+    def stats(self) -> dict:
+        return {**self.handler.stats, "queued": self.queue.qsize()}
+
+    def start(self):
+        if not self._started:
+            self.listener.start()
+            self._started = True
+
+    def stop(self):
+        if self._started:
+            self.listener.stop()
+            self._started = False
+
+
+class RequestContextMiddleware:
+    """
+    ASGI-middleware: request id (из X-Request-ID или новый) в контексте и в
+    заголовке ответа, решение о выборке логов для запроса и access-лог.
+    Доли выборки задаются по шаблону пути роута, остальные пишутся целиком;
+    ответы 5xx пишутся всегда.
+    """
+
+    def __init__(self, app, sample_rates: Optional[dict[str, float]] = None):
+        self.app = app
+        self.sample_rates = [
+            (compile_path(path)[0], rate) for path, rate in (sample_rates or {}).items()
+        ]
+        self.access = logger.getChild("access")
+
+    def _sample_rate(self, path: str) -> float:
+        for pattern, rate in self.sample_rates:
+            if pattern.match(path):
+                return rate
+        return 1.0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == REQUEST_ID_HEADER:
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or os.urandom(8).hex()
+        request_id_var.set(request_id)
+        rate = self._sample_rate(scope["path"])
+        sampled_var.set(rate >= 1.0 or random.random() < rate)
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = [*message.get("headers", ()), (REQUEST_ID_HEADER, request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            self.access.log(
+                logging.ERROR if status >= 500 else logging.INFO,
+                "request",
+                extra={
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "status": status,
+                    "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+                },
+            )
+
+
+log_pipeline = LogPipeline(max_queue=settings.log_queue_size, level=settings.log_level)
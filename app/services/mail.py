@@ -0,0 +1,507 @@
+"""
+Исходящая почта через очередь в Redis: хендлеры только кладут сообщение
+(шаблон + контекст), а SMTP-сессии ведёт фоновый воркер.
+
+Ключи Redis:
+- mail:queue    — список готовых к отправке;
+- mail:inflight — ZSET взятых в работу, score — срок аренды. Если воркер
+  упал, не подтвердив отправку, по истечении срока письмо возвращается
+  в очередь (доставка «хотя бы один раз»);
+- mail:retry    — ZSET отложенных повторов, score — время следующей попытки;
+- mail:dead     — письма, которые не удалось отправить (последние DEAD_MAX).
+
+Воркер забирает до batch_size писем одним Lua-скриптом и рассылает их через
+пул постоянных SMTP-соединений. Временные ошибки (4xx, обрыв связи) —
+повтор с экспоненциальной задержкой, постоянные (5xx) — сразу в mail:dead.
+Если Redis недоступен в момент постановки, письма ждут в памяти процесса
+(до OUTBOX_MAX) и досылаются, как только он вернётся.
+"""
+import asyncio
+import html
+import random
+import time
+from contextlib import asynccontextmanager
+from email.message import EmailMessage
+from functools import lru_cache
+from string import Template
+from typing import NamedTuple, Optional
+
+import aiosmtplib
+import orjson
+import redis.asyncio as aioredis
+from redis.exceptions import RedisError
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.services.ids import id_generator
+from app.services.logs import logger
+
+log = logger.getChild("mail")
+
+QUEUE_KEY = "mail:queue"
+INFLIGHT_KEY = "mail:inflight"
+RETRY_KEY = "mail:retry"
+DEAD_KEY = "mail:dead"
+DEAD_MAX = 10000
+MAX_RETRY_DELAY = 3600
+# Письма, которые не удалось положить в Redis, ждут в памяти воркера
+OUTBOX_MAX = 10000
+OUTBOX_MAX_DELAY = 60
+
+# KEYS: queue, inflight, retry; ARGV: срок аренды в мс, размер пачки.
+# Сначала в очередь возвращаются наступившие повторы и просроченные аренды.
+CLAIM_LUA = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+for _, source in ipairs({KEYS[3], KEYS[2]}) do
+    local due = redis.call('ZRANGEBYSCORE', source, '-inf', now, 'LIMIT', 0, 1000)
+    for _, message in ipairs(due) do
+        redis.call('ZREM', source, message)
+        redis.call('LPUSH', KEYS[1], message)
+    end
+end
+local batch = {}
+for i = 1, tonumber(ARGV[2]) do
+    local message = redis.call('RPOP', KEYS[1])
+    if not message then
+        break
+    end
+    redis.call('ZADD', KEYS[2], now + tonumber(ARGV[1]), message)
+    batch[i] = message
+end
+return batch
+"""
+
+# KEYS: inflight, retry; ARGV: старое сообщение, новое, задержка в мс
+RETRY_LUA = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+redis.call('ZREM', KEYS[1], ARGV[1])
+redis.call('ZADD', KEYS[2], now + tonumber(ARGV[3]), ARGV[2])
+"""
+
+
+# ========== ШАБЛОНЫ ==========
+
+class EmailTemplate(NamedTuple):
+    version: int
+    subject: str
+    text: str
+    html: str
+
+
+# При правке шаблона повышается version — разобранный шаблон кэшируется по версии
+TEMPLATES = {
+    "verify_email": EmailTemplate(
+        version=1,
+        subject="Подтвердите email — Fenix International",
+        text=(
+            "Здравствуйте, ${full_name}!\n\n"
+            "Ваш ID партнёра: ${user_id}.\n"
+            "Чтобы подтвердить email, перейдите по ссылке:\n${verify_url}\n"
+        ),
+        html=(
+            "<p>Здравствуйте, ${full_name}!</p>"
+            "<p>Ваш ID партнёра: <b>${user_id}</b>.</p>"
+            '<p><a href="${verify_url}">Подтвердить email</a></p>'
+        ),
+    ),
+    "order_confirmation": EmailTemplate(
+        version=1,
+        subject="Заказ ${order_number} оформлен",
+        text=(
+            "Спасибо за заказ!\n\n"
+            "Номер заказа: ${order_number}\n"
+            "${items}\n"
+            "Итого: ${total} KZT, бонусов: ${bonus_earned}\n"
+        ),
+        html=(
+            "<p>Спасибо за заказ!</p>"
+            "<p>Номер заказа: <b>${order_number}</b></p>"
+            "<pre>${items}</pre>"
+            "<p>Итого: <b>${total} KZT</b>, бонусов: ${bonus_earned}</p>"
+        ),
+    ),
+}
+
+
+@lru_cache(maxsize=None)
+def compiled(name: str, version: int) -> tuple[Template, Template, Template]:
+    template = TEMPLATES[name]
+    parts = (Template(template.subject), Template(template.text), Template(template.html))
+    for part in parts:
+        if not part.is_valid():
+            raise ValueError(f"Некорректный шаблон письма {name} v{version}")
+    return parts
+
+
+def render(name: str, context: dict) -> tuple[str, str, str]:
+    """Тема, текст и HTML письма; в HTML значения экранируются"""
+    subject, text, body = compiled(name, TEMPLATES[name].version)
+    escaped = {key: html.escape(str(value)) for key, value in context.items()}
+    return subject.substitute(context), text.substitute(context), body.substitute(escaped)
+
+
+def build_message(to: str, template: str, context: dict) -> EmailMessage:
+    subject, text, body = render(template, context)
+    message = EmailMessage()
+    message["From"] = settings.mail_from
+    message["To"] = to
+    message["Subject"] = subject
+    message.set_content(text)
+    message.add_alternative(body, subtype="html")
+    return message
+
+
+# ========== SMTP ==========
+
+class SMTPPool:
+    """
+    Постоянные SMTP-соединения: одновременно не больше size сессий, после
+    письма соединение возвращается в пул. Соединения, простоявшие дольше
+    idle_timeout (сервер мог их уже закрыть), открываются заново.
+    """
+
+    def __init__(self, host: str, port: int, username: str, password: str, size: int,
+                 use_tls: bool = False, start_tls: Optional[bool] = None,
+                 timeout: float = 10.0, idle_timeout: float = 60.0):
+        self.options = {
+            "hostname": host,
+            "port": port,
+            "username": username or None,
+            "password": password or None,
+            "use_tls": use_tls,
+            "start_tls": start_tls,
+            "timeout": timeout,
+        }
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.stats = {"connects": 0, "reused": 0, "connection_errors": 0}
+        self._idle: list[tuple[float, aiosmtplib.SMTP]] = []
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.size)
+        return self._semaphore
+
+    async def _take(self) -> aiosmtplib.SMTP:
+        while self._idle:
+            last_used, smtp = self._idle.pop()
+            if smtp.is_connected and time.monotonic() - last_used < self.idle_timeout:
+                self.stats["reused"] += 1
+                return smtp
+            await self._quit(smtp)
+        smtp = aiosmtplib.SMTP(**self.options)
+        try:
+            await smtp.connect()
+        except (aiosmtplib.SMTPException, OSError):
+            self.stats["connection_errors"] += 1
+            raise
+        self.stats["connects"] += 1
+        return smtp
+
+    @asynccontextmanager
+    async def connection(self):
+        async with self.semaphore:
+            smtp = await self._take()
+            try:
+                yield smtp
+            finally:
+                # Отказ по конкретному письму соединение не портит
+                if smtp.is_connected:
+                    self._idle.append((time.monotonic(), smtp))
+
+    @staticmethod
+    async def _quit(smtp: aiosmtplib.SMTP):
+        try:
+            if smtp.is_connected:
+                await smtp.quit()
+        except (aiosmtplib.SMTPException, OSError):
+            smtp.close()
+
+    async def close(self):
+        idle, self._idle = self._idle, []
+        for _, smtp in idle:
+            await self._quit(smtp)
+
+
+# ========== ОЧЕРЕДЬ ==========
+
+class MailQueue:
+    def __init__(self, redis_url: str, smtp: SMTPPool, batch_size: int, max_attempts: int,
+                 retry_base: float, visibility_timeout: float, poll_interval: float):
+        self.redis_url = redis_url
+        self.smtp = smtp
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.visibility_timeout = visibility_timeout
+        self.poll_interval = poll_interval
+        self.stats = {
+            "enqueued": 0, "enqueue_errors": 0, "outbox": 0, "outbox_dropped": 0,
+            "batches": 0, "sent": 0, "retried": 0, "dead": 0, "redis_errors": 0,
+        }
+        self._redis: Optional[aioredis.Redis] = None
+        self._claim = None
+        self._retry = None
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+        # Не положенные в Redis письма и задача, которая повторяет попытку
+        self._outbox: list[dict] = []
+        self._outbox_task: Optional[asyncio.Task] = None
+        self._enqueue_tasks: set[asyncio.Task] = set()
+
+    @property
+    def redis(self) -> aioredis.Redis:
+        if self._redis is None:
+            self._redis = aioredis.from_url(self.redis_url)
+        return self._redis
+
+    @property
+    def claim(self):
+        if self._claim is None:
+            self._claim = self.redis.register_script(CLAIM_LUA)
+        return self._claim
+
+    @property
+    def retry(self):
+        if self._retry is None:
+            self._retry = self.redis.register_script(RETRY_LUA)
+        return self._retry
+
+    async def enqueue(self, to: str, template: str, context: dict) -> Optional[str]:
+        ids = await self.enqueue_many([(to, template, context)])
+        return ids[0] if ids else None
+
+    async def enqueue_many(self, messages: list[tuple[str, str, dict]]) -> list[str]:
+        """
+        Кладёт письма в очередь. Если Redis недоступен, письма остаются в памяти
+        воркера и досылаются с нарастающей паузой — запрос из-за почты не падает.
+        """
+        payloads = []
+        for to, template, context in messages:
+            if template not in TEMPLATES:
+                raise ValueError(f"Неизвестный шаблон письма: {template}")
+            payloads.append({
+                "id": id_generator.new_id("EM"), "to": to, "template": template,
+                "context": context, "attempts": 0,
+            })
+        if not payloads:
+            return []
+        if not await self._push(payloads):
+            self._hold(payloads)
+        return [payload["id"] for payload in payloads]
+
+    def enqueue_later(self, messages: list[tuple[str, str, dict]]):
+        """enqueue_many в фоне (из синхронных хуков); ссылка на задачу держится до её конца"""
+        task = asyncio.get_running_loop().create_task(self.enqueue_many(messages))
+        self._enqueue_tasks.add(task)
+        task.add_done_callback(self._enqueue_tasks.discard)
+
+    async def _push(self, payloads: list[dict]) -> bool:
+        try:
+            await self.redis.lpush(QUEUE_KEY, *(orjson.dumps(payload) for payload in payloads))
+        except (RedisError, OSError):
+            self.stats["enqueue_errors"] += len(payloads)
+            log.warning("⚠️ Redis недоступен, письма отложены", exc_info=True,
+                        extra={"templates": [payload["template"] for payload in payloads]})
+            return False
+        self.stats["enqueued"] += len(payloads)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return True
+
+    def _hold(self, payloads: list[dict]):
+        free = OUTBOX_MAX - len(self._outbox)
+        if len(payloads) > free:
+            dropped = payloads[max(free, 0):]
+            self.stats["outbox_dropped"] += len(dropped)
+            log.error("❌ Очередь неотправленных писем переполнена", extra={"mail_ids": [p["id"] for p in dropped]})
+            payloads = payloads[:max(free, 0)]
+        self._outbox.extend(payloads)
+        self.stats["outbox"] = len(self._outbox)
+        if self._outbox and self._outbox_task is None:
+            self._outbox_task = asyncio.create_task(self._drain_outbox())
+
+    async def _drain_outbox(self):
+        delay = 1.0
+        try:
+            while self._outbox:
+                await asyncio.sleep(delay)
+                batch = self._outbox[:self.batch_size]
+                if await self._push(batch):
+                    del self._outbox[:len(batch)]
+                    self.stats["outbox"] = len(self._outbox)
+                    delay = 1.0
+                else:
+                    delay = min(OUTBOX_MAX_DELAY, delay * 2)
+        finally:
+            self._outbox_task = None
+
+    async def process_batch(self) -> int:
+        """Забирает и отправляет одну пачку; возвращает её размер"""
+        batch = await self.claim(
+            keys=[QUEUE_KEY, INFLIGHT_KEY, RETRY_KEY],
+            args=[int(self.visibility_timeout * 1000), self.batch_size],
+        )
+        if not batch:
+            return 0
+        self.stats["batches"] += 1
+
+        messages = [orjson.loads(raw) for raw in batch]
+        # Параллельно не больше smtp.size сессий, каждая шлёт письма подряд
+        outcomes = await asyncio.gather(*(self._deliver(message) for message in messages))
+        sent = [raw for raw, (outcome, _) in zip(batch, outcomes) if outcome == "sent"]
+        async with self.redis.pipeline(transaction=False) as pipe:
+            if sent:
+                pipe.zrem(INFLIGHT_KEY, *sent)
+            for raw, message, (outcome, error) in zip(batch, messages, outcomes):
+                if outcome == "sent":
+                    continue
+                message = {**message, "attempts": message["attempts"] + 1, "error": error}
+                if outcome == "retry" and message["attempts"] < self.max_attempts:
+                    delay = min(MAX_RETRY_DELAY, self.retry_base * 2 ** (message["attempts"] - 1))
+                    delay *= random.uniform(0.5, 1.5)
+                    await self.retry(
+                        keys=[INFLIGHT_KEY, RETRY_KEY],
+                        args=[raw, orjson.dumps(message), int(delay * 1000)],
+                        client=pipe,
+                    )
+                    self.stats["retried"] += 1
+                else:
+                    pipe.zrem(INFLIGHT_KEY, raw)
+                    pipe.lpush(DEAD_KEY, orjson.dumps(message))
+                    pipe.ltrim(DEAD_KEY, 0, DEAD_MAX - 1)
+                    self.stats["dead"] += 1
+                    log.error("❌ Письмо не доставлено", extra={
+                        "mail_id": message["id"], "template": message["template"], "error": error,
+                    })
+            await pipe.execute()
+        self.stats["sent"] += len(sent)
+        return len(batch)
+
+    async def _deliver(self, message: dict) -> tuple[str, Optional[str]]:
+        """sent / retry / dead и текст ошибки"""
+        try:
+            email = build_message(message["to"], message["template"], message["context"])
+        except (KeyError, ValueError) as exc:
+            return "dead", f"шаблон: {exc!r}"
+        for attempt in range(2):
+            try:
+                async with self.smtp.connection() as smtp:
+                    await smtp.send_message(email)
+                return "sent", None
+            except aiosmtplib.SMTPServerDisconnected as exc:
+                # Сервер мог закрыть соединение из пула — одна попытка на новом
+                if attempt:
+                    return "retry", str(exc)
+            except aiosmtplib.SMTPRecipientsRefused as exc:
+                codes = [error.code for error in exc.recipients]
+                return ("dead" if all(code >= 500 for code in codes) else "retry"), str(exc)
+            except aiosmtplib.SMTPResponseException as exc:
+                return ("dead" if exc.code >= 500 else "retry"), str(exc)
+            except (aiosmtplib.SMTPException, OSError, asyncio.TimeoutError) as exc:
+                return "retry", str(exc) or type(exc).__name__
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                processed = await self.process_batch()
+            except (RedisError, OSError):
+                self.stats["redis_errors"] += 1
+                processed = 0
+            if processed:
+                continue
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def start(self):
+        if self._task is None:
+            self._stopping = False
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Дожидается текущей пачки; невзятые письма остаются в Redis"""
+        if self._enqueue_tasks:
+            await asyncio.gather(*self._enqueue_tasks)
+        if self._outbox_task is not None:
+            self._outbox_task.cancel()
+            self._outbox_task = None
+        if self._outbox and not await self._push(self._outbox):
+            log.error("❌ Письма не попали в очередь до остановки", extra={
+                "mail_ids": [payload["id"] for payload in self._outbox],
+            })
+        self._outbox.clear()
+        self.stats["outbox"] = 0
+        if self._task is not None:
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.smtp.close()
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+            self._claim = None
+            self._retry = None
+
+    async def queue_stats(self) -> dict:
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.llen(QUEUE_KEY)
+            pipe.zcard(INFLIGHT_KEY)
+            pipe.zcard(RETRY_KEY)
+            pipe.llen(DEAD_KEY)
+            queued, inflight, retry, dead = await pipe.execute()
+        return {"queued": queued, "inflight": inflight, "retry": retry, "dead": dead}
+
+
+mail_queue = MailQueue(
+    settings.redis_url,
+    SMTPPool(
+        settings.smtp_host,
+        settings.smtp_port,
+        settings.smtp_user,
+        settings.smtp_password,
+        size=settings.smtp_pool_size,
+        use_tls=settings.smtp_use_tls,
+        start_tls=settings.smtp_start_tls,
+        timeout=settings.smtp_timeout,
+        idle_timeout=settings.smtp_idle_timeout,
+    ),
+    batch_size=settings.mail_batch_size,
+    max_attempts=settings.mail_max_attempts,
+    retry_base=settings.mail_retry_base_seconds,
+    visibility_timeout=settings.mail_visibility_timeout,
+    poll_interval=settings.mail_poll_interval,
+)
+
+
+# ========== ОТПРАВКА ПОСЛЕ COMMIT ==========
+
+def send_after_commit(session: Session, to: str, template: str, context: dict):
+    """Письмо уходит в очередь только после успешного commit транзакции"""
+    session.info.setdefault("mail_outbox", []).append((to, template, context))
+
+
+@event.listens_for(Session, "after_commit")
+def _flush_outbox(session):
+    messages = session.info.pop("mail_outbox", None)
+    if not messages:
+        return
+    try:
+        mail_queue.enqueue_later(messages)
+    except RuntimeError:
+        log.warning("⚠️ Письма вне event loop не отправлены", extra={"count": len(messages)})
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_outbox(session):
+    session.info.pop("mail_outbox", None)
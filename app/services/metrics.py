@@ -0,0 +1,188 @@
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+
+# Границы бакетов, секунды / байты / штуки
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50)
+
+UNMATCHED_ROUTE = "unmatched"
+
+
+class Histogram:
+    """
+    Гистограмма в формате Prometheus: на запись — bisect и два сложения,
+    кумулятивные бакеты считаются только при выгрузке.
+    """
+
+    def __init__(self, name: str, documentation: str, buckets: tuple, labels: tuple[str, ...]):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        self.labels = labels
+        self._series: dict[tuple, list] = {}
+
+    def observe(self, label_values: tuple, value: float):
+        series = self._series.get(label_values)
+        if series is None:
+            # [счётчики по бакетам + +Inf, сумма]
+            series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for label_values, (counts, total) in self._series.items():
+            labels = _labels(self.labels, label_values)
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{labels}{"," if labels else ""}le="{bound}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{labels}}} {total}")
+            lines.append(f"{self.name}_count{{{labels}}} {cumulative}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...]):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, label_values: tuple, amount: float = 1):
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for label_values, value in self._values.items():
+            lines.append(f"{self.name}{{{_labels(self.labels, label_values)}}} {value}")
+        return lines
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple[str, ...], values: tuple) -> str:
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+
+def render_stats(groups: dict[str, dict], prefix: str = "fenix") -> list[str]:
+    """Числовые поля stats-словарей сервисов (то же, что в /health) как gauge"""
+    lines = []
+    for group, stats in groups.items():
+        for key, value in stats.items():
+            if isinstance(value, dict):
+                lines.extend(render_stats({f"{group}_{key}": value}, prefix))
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                lines.append(f"# TYPE {prefix}_{group}_{key} gauge")
+                lines.append(f"{prefix}_{group}_{key} {value}")
+    return lines
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.in_flight = 0
+        self.latency = Histogram(
+            "fenix_http_request_duration_seconds", "Время обработки запроса", LATENCY_BUCKETS, ("method", "route")
+        )
+        self.response_size = Histogram(
+            "fenix_http_response_size_bytes", "Размер тела ответа", SIZE_BUCKETS, ("method", "route")
+        )
+        self.responses = Counter(
+            "fenix_http_responses_total", "Ответы по классу статуса", ("method", "route", "status")
+        )
+        self.queries_per_request = Histogram(
+            "fenix_db_queries_per_request", "Запросов к БД за HTTP-запрос", QUERY_COUNT_BUCKETS, ("method", "route")
+        )
+        self.db_statement = Histogram(
+            "fenix_db_statement_duration_seconds", "Время выполнения SQL-запроса", DB_BUCKETS, ("operation",)
+        )
+
+    def render(self) -> str:
+        lines = [
+            "# HELP fenix_http_requests_in_flight Запросы в обработке",
+            "# TYPE fenix_http_requests_in_flight gauge",
+            f"fenix_http_requests_in_flight {self.in_flight}",
+        ]
+        for metric in (self.latency, self.response_size, self.responses, self.queries_per_request, self.db_statement):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+request_metrics = RequestMetrics()
+
+# Счётчик запросов к БД текущего HTTP-запроса (список из одного элемента,
+# чтобы его видели и задачи, скопировавшие контекст)
+_query_counter: ContextVar[Optional[list]] = ContextVar("query_counter", default=None)
+
+
+class MetricsMiddleware:
+    """
+    ASGI-middleware: латентность, размер ответа и число SQL-запросов по шаблону
+    роута, плюс запросы в обработке. Метрики у каждого воркера свои — Prometheus
+    должен опрашивать воркеры по отдельности (или суммировать по instance).
+    """
+
+    def __init__(self, app, metrics: RequestMetrics = request_metrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        metrics = self.metrics
+        queries = [0]
+        _query_counter.set(queries)
+        status = 500
+        size = 0
+
+        async def send_wrapper(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        metrics.in_flight += 1
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            metrics.in_flight -= 1
+            # FastAPI кладёт сработавший роут в scope: метка — шаблон пути, а не сам путь
+            route = scope.get("route")
+            labels = (scope["method"], route.path if route is not None else UNMATCHED_ROUTE)
+            metrics.latency.observe(labels, elapsed)
+            metrics.response_size.observe(labels, size)
+            metrics.queries_per_request.observe(labels, queries[0])
+            metrics.responses.inc((*labels, f"{status // 100}xx"))
+
+
+def instrument_engine(engine, metrics: RequestMetrics = request_metrics):
+    """Время каждого SQL-запроса и счётчик запросов текущего HTTP-запроса"""
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        context._metrics_started = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_metrics_started", None)
+        if started is None:
+            return
+        operation = statement.lstrip()[:10].split(None, 1)[0].upper()
+        metrics.db_statement.observe((operation,), time.perf_counter() - started)
+        queries = _query_counter.get()
+        if queries is not None:
+            queries[0] += 1
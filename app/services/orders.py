@@ -0,0 +1,224 @@
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import update, select, insert, case, literal, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models.order import Order, OrderItem, OrderStatus, PaymentMethod
+from app.models.product import Product
+from app.models.user import User
+from app.services.catalog import invalidate_after_commit
+from app.services.ids import new_order_id
+from app.services.mail import send_after_commit
+from app.services.stats import StatsService
+
+
+def _quantity_case(quantities: dict[str, int]):
+    return case(quantities, value=Product.id)
+
+
+class OrderService:
+    @staticmethod
+    async def reserve_stock(db: AsyncSession, quantities: dict[str, int]) -> dict[str, dict]:
+        """
+        Атомарно списывает остатки по всем позициям одним UPDATE:
+        строка обновляется, только если stock_quantity >= нужного количества.
+        Тем же запросом увеличивается sales_count.
+        Если хоть одной позиции не хватило, бросает 409 — вызывающая
+        транзакция откатывается вместе с уже списанными позициями.
+        """
+        needed = _quantity_case(quantities)
+        remaining = Product.stock_quantity - needed
+        result = await db.execute(
+            update(Product)
+            .where(
+                Product.id.in_(sorted(quantities)),
+                Product.is_active.is_(True),
+                Product.stock_quantity >= needed,
+            )
+            .values(
+                stock_quantity=remaining,
+                in_stock=remaining > 0,
+                sales_count=Product.sales_count + needed,
+            )
+            .returning(Product.id, Product.name, Product.price, Product.bonus_points)
+            .execution_options(synchronize_session=False)
+        )
+        reserved = {row.id: row._asdict() for row in result}
+        invalidate_after_commit(db.sync_session, {f"product:{product_id}" for product_id in reserved})
+
+        missing = sorted(set(quantities) - set(reserved))
+        if missing:
+            raise HTTPException(
+                status_code=409,
+                detail={"message": "Недостаточно товара на складе", "product_ids": missing},
+            )
+        return reserved
+
+    @staticmethod
+    async def release_stock(db: AsyncSession, quantities: dict[str, int]):
+        """Возврат остатков отменённых заказов; продажа тоже откатывается"""
+        if not quantities:
+            return
+        returned = _quantity_case(quantities)
+        await db.execute(
+            update(Product)
+            .where(Product.id.in_(sorted(quantities)))
+            .values(
+                stock_quantity=Product.stock_quantity + returned,
+                in_stock=literal(True),
+                sales_count=case((Product.sales_count > returned, Product.sales_count - returned), else_=0),
+            )
+            .execution_options(synchronize_session=False)
+        )
+        invalidate_after_commit(db.sync_session, {f"product:{product_id}" for product_id in quantities})
+
+    @staticmethod
+    async def place_order(db: AsyncSession, user_id: str, quantities: dict[str, int],
+                          payment_method: PaymentMethod = PaymentMethod.CARD,
+                          customer_info: Optional[dict] = None,
+                          delivery_address: Optional[dict] = None,
+                          comment: Optional[str] = None) -> Order:
+        if not quantities:
+            raise HTTPException(status_code=400, detail="Корзина пуста")
+
+        products = await OrderService.reserve_stock(db, quantities)
+
+        items = []
+        subtotal = 0.0
+        bonus_earned = 0
+        for product_id, quantity in quantities.items():
+            product = products[product_id]
+            subtotal += product["price"] * quantity
+            bonus_earned += (product["bonus_points"] or 0) * quantity
+            items.append({
+                "product_id": product_id,
+                "name": product["name"],
+                "quantity": quantity,
+                "price": product["price"],
+                "subtotal": product["price"] * quantity,
+            })
+
+        if subtotal < settings.min_order_amount:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Минимальная сумма заказа {settings.min_order_amount:.0f} KZT"
+            )
+
+        now = datetime.now(timezone.utc)
+        order_id = new_order_id()
+        order = Order(
+            id=order_id,
+            # Номер для клиента — тот же идентификатор, уникален без повторов
+            order_number="F" + order_id.removeprefix("OR"),
+            user_id=user_id,
+            status=OrderStatus.PENDING,
+            payment_method=payment_method,
+            payment_status="pending",
+            items=items,
+            customer_info=customer_info or {},
+            delivery_address=delivery_address or {},
+            subtotal=subtotal,
+            total=subtotal,
+            bonus_earned=bonus_earned,
+            comment=comment,
+            reserved_until=now + timedelta(minutes=settings.stock_reservation_minutes),
+        )
+        db.add(order)
+        await db.flush()
+        await db.execute(insert(OrderItem), [
+            {
+                "order_id": order.id,
+                "product_id": item["product_id"],
+                "quantity": item["quantity"],
+                "price": item["price"],
+                "subtotal": item["subtotal"],
+                "created_at": now,
+            }
+            for item in items
+        ])
+        await StatsService.on_order_created(db, order)
+
+        recipient = (customer_info or {}).get("email") or await db.scalar(
+            select(User.email).where(User.id == user_id)
+        )
+        if recipient:
+            send_after_commit(db.sync_session, recipient, "order_confirmation", {
+                "order_number": order.order_number,
+                "items": "\n".join(f"{item['name']} × {item['quantity']} — {item['subtotal']:.0f} KZT" for item in items),
+                "total": f"{order.total:.0f}",
+                "bonus_earned": bonus_earned,
+            })
+        return order
+
+    @staticmethod
+    async def release_expired(db: AsyncSession, limit: int = 1000) -> int:
+        """
+        Отменяет неоплаченные заказы с истёкшей резервацией и возвращает
+        остатки: один SELECT (SKIP LOCKED — задачу можно запускать в
+        нескольких воркерах), агрегат по order_items и по одному UPDATE
+        на товары и заказы.
+        """
+        stmt = (
+            select(Order.id)
+            .where(
+                Order.reserved_until < datetime.now(timezone.utc),
+                Order.status == OrderStatus.PENDING,
+                Order.payment_status == "pending",
+            )
+            .limit(limit)
+        )
+        if db.bind.dialect.name == "postgresql":
+            stmt = stmt.with_for_update(skip_locked=True)
+        expired = list((await db.execute(stmt)).scalars())
+        if not expired:
+            return 0
+
+        result = await db.execute(
+            select(OrderItem.product_id, func.sum(OrderItem.quantity))
+            .where(OrderItem.order_id.in_(expired))
+            .group_by(OrderItem.product_id)
+        )
+        await OrderService.release_stock(db, {product_id: int(quantity) for product_id, quantity in result})
+        await db.execute(
+            update(Order)
+            .where(Order.id.in_(expired))
+            .values(status=OrderStatus.CANCELLED, payment_status="expired", reserved_until=None)
+            .execution_options(synchronize_session=False)
+        )
+        return len(expired)
+
+    @staticmethod
+    async def units_sold(db: AsyncSession, since: datetime, product_ids: Optional[list[str]] = None) -> dict[str, int]:
+        """Продано штук по товарам с даты since (отменённые заказы не считаются)"""
+        stmt = (
+            select(OrderItem.product_id, func.sum(OrderItem.quantity))
+            .join(Order, Order.id == OrderItem.order_id)
+            .where(OrderItem.created_at >= since, Order.status != OrderStatus.CANCELLED)
+            .group_by(OrderItem.product_id)
+        )
+        if product_ids is not None:
+            stmt = stmt.where(OrderItem.product_id.in_(product_ids))
+        result = await db.execute(stmt)
+        return {product_id: int(quantity) for product_id, quantity in result}
+
+    @staticmethod
+    async def mark_paid(db: AsyncSession, order_id: str):
+        """
+        Оплата подтверждена: заказ из PENDING переходит в PROCESSING, резервация
+        больше не истекает. Условный UPDATE ... RETURNING: повторное подтверждение
+        и заказ, уже отменённый release_expired, ничего не меняют — тогда None.
+        """
+        result = await db.execute(
+            update(Order)
+            .where(Order.id == order_id, Order.status == OrderStatus.PENDING, Order.payment_status == "pending")
+            .values(status=OrderStatus.PROCESSING, payment_status="paid", reserved_until=None)
+            .returning(Order.id, Order.user_id, Order.total)
+            .execution_options(synchronize_session=False)
+        )
+        paid = result.first()
+        if paid is not None:
+            await StatsService.on_order_paid(db, paid)
+        return paid
@@ -0,0 +1,340 @@
+"""
+Массовый импорт и экспорт товаров (выгрузки со склада, почасовая синхронизация
+цен и остатков).
+
+Импорт читает CSV/NDJSON потоком: строки сразу уходят во временную таблицу
+(в PostgreSQL — через COPY asyncpg, без промежуточного списка в памяти),
+затем products обновляется одним INSERT ... ON CONFLICT или UPDATE ... FROM.
+Если в файле нет name и price, новые товары не создаются — только обновляются
+существующие (например, файл из id, price, stock_quantity).
+
+Экспорт идёт серверным курсором пачками по EXPORT_BATCH строк, поэтому память
+не зависит от размера каталога. Формат экспорта совпадает с форматом импорта.
+"""
+import codecs
+import csv
+import io
+from typing import AsyncIterable, AsyncIterator, Optional
+
+import orjson
+from fastapi import HTTPException
+from sqlalchemy import Column, Integer, MetaData, Table, distinct, func, select, text, update
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.schema import CreateTable
+
+from app.database import dialect_insert, read_engine
+from app.models.product import Product
+from app.services.catalog import invalidate_after_commit
+from app.services.serialization import dumps
+
+JSON = "json"
+
+# Колонки, которые можно загружать и выгружать, и их типы
+IMPORT_COLUMNS = {
+    "id": str,
+    "name": str,
+    "slug": str,
+    "description": str,
+    "full_description": str,
+    "category_id": int,
+    "price": float,
+    "old_price": float,
+    "partner_price": float,
+    "stock_quantity": int,
+    "in_stock": bool,
+    "bonus_points": int,
+    "commission_percent": float,
+    "is_featured": bool,
+    "is_active": bool,
+    "images": JSON,
+    "specifications": JSON,
+}
+# Без этих колонок новый товар не создать (NOT NULL)
+INSERT_COLUMNS = {"name", "price"}
+FORMATS = ("csv", "ndjson")
+
+TRUE_VALUES = {"1", "true", "t", "yes", "y", "да"}
+FALSE_VALUES = {"0", "false", "f", "no", "n", "нет"}
+
+INSERT_BATCH = 1000
+EXPORT_BATCH = 2000
+
+# Временная таблица со всеми колонками импорта; заполняются только те, что есть
+# в файле. line_no — номер строки: при повторе id побеждает последняя.
+_staging_metadata = MetaData()
+products_staging = Table(
+    "products_staging",
+    _staging_metadata,
+    Column("line_no", Integer),
+    *(Column(name, Product.__table__.c[name].type) for name in IMPORT_COLUMNS),
+    prefixes=["TEMPORARY"],
+)
+
+
+def row_error(line_no: int, message: str) -> HTTPException:
+    return HTTPException(status_code=422, detail=f"Строка {line_no}: {message}")
+
+
+async def iter_lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[str]:
+    """Строки из потока байтов (UTF-8, BOM допускается)"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buffer = ""
+    try:
+        async for chunk in chunks:
+            buffer += decoder.decode(chunk)
+            *lines, buffer = buffer.split("\n")
+            for line in lines:
+                yield line.removesuffix("\r")
+        buffer += decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=422, detail="Файл должен быть в кодировке UTF-8")
+    if buffer:
+        yield buffer.removesuffix("\r")
+
+
+async def parse_ndjson(chunks: AsyncIterable[bytes]) -> AsyncIterator[tuple[int, dict]]:
+    line_no = 0
+    async for line in iter_lines(chunks):
+        line_no += 1
+        if not line.strip():
+            continue
+        try:
+            row = orjson.loads(line)
+        except orjson.JSONDecodeError:
+            raise row_error(line_no, "некорректный JSON")
+        if not isinstance(row, dict):
+            raise row_error(line_no, "ожидается JSON-объект")
+        yield line_no, row
+
+
+async def parse_csv(chunks: AsyncIterable[bytes]) -> AsyncIterator[tuple[int, dict]]:
+    header = None
+    record: list[str] = []
+    line_no = start = 0
+    async for line in iter_lines(chunks):
+        line_no += 1
+        if not record:
+            start = line_no
+        record.append(line)
+        # Нечётное число кавычек — поле в кавычках продолжается на следующей строке
+        joined = "\n".join(record)
+        if joined.count('"') % 2:
+            continue
+        record = []
+        if not joined.strip():
+            continue
+
+        values = next(csv.reader([joined]))
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        if len(values) != len(header):
+            raise row_error(start, f"ожидалось {len(header)} полей, получено {len(values)}")
+        yield start, dict(zip(header, values))
+    if record:
+        raise row_error(start, "незакрытая кавычка")
+
+
+def parse_value(column: str, value, line_no: int):
+    kind = IMPORT_COLUMNS[column]
+    if value is None or value == "":
+        return None
+    try:
+        if kind is bool:
+            if isinstance(value, bool):
+                return value
+            lowered = str(value).strip().lower()
+            if lowered in TRUE_VALUES:
+                return True
+            if lowered in FALSE_VALUES:
+                return False
+            raise ValueError(value)
+        if kind is JSON:
+            return orjson.loads(value) if isinstance(value, str) else value
+        if kind is str:
+            return value if isinstance(value, str) else str(value)
+        return kind(value)
+    except (ValueError, TypeError):
+        raise row_error(line_no, f"некорректное значение {column}: {value!r}")
+
+
+class ProductSyncService:
+    @staticmethod
+    async def import_products(db: AsyncSession, chunks: AsyncIterable[bytes], fmt: str) -> dict:
+        """Загружает поток CSV/NDJSON в products; возвращает сводку"""
+        if fmt not in FORMATS:
+            raise HTTPException(status_code=400, detail=f"Unknown format: {fmt}")
+        rows = parse_csv(chunks) if fmt == "csv" else parse_ndjson(chunks)
+
+        first = await anext(rows, None)
+        if first is None:
+            raise HTTPException(status_code=422, detail="Файл не содержит строк")
+        columns = list(first[1])
+        unknown = [column for column in columns if column not in IMPORT_COLUMNS]
+        if unknown:
+            raise HTTPException(status_code=422, detail=f"Неизвестные колонки: {', '.join(unknown)}")
+        if "id" not in columns:
+            raise HTTPException(status_code=422, detail="Нет колонки id")
+        upsert = INSERT_COLUMNS.issubset(columns)
+        required = {"id", *INSERT_COLUMNS} & set(columns)
+
+        conn = await db.connection()
+        postgres = conn.dialect.name == "postgresql"
+        stats = {"rows": 0}
+
+        async def records():
+            async for line_no, row in _chain(first, rows):
+                if row.keys() != first[1].keys():
+                    raise row_error(line_no, "набор полей отличается от первой строки")
+                values = [line_no]
+                for column in columns:
+                    value = parse_value(column, row[column], line_no)
+                    if value is None and column in required:
+                        raise row_error(line_no, f"пустое значение {column}")
+                    # asyncpg принимает json-колонки только строкой
+                    if postgres and value is not None and IMPORT_COLUMNS[column] is JSON:
+                        value = orjson.dumps(value).decode()
+                    values.append(value)
+                stats["rows"] += 1
+                yield tuple(values)
+
+        staging = products_staging
+        await conn.execute(text(f"DROP TABLE IF EXISTS {staging.name}"))
+        await conn.execute(CreateTable(staging))
+        try:
+            if postgres:
+                await ProductSyncService._copy(conn, ["line_no", *columns], records())
+            else:
+                await ProductSyncService._insert_batches(conn, ["line_no", *columns], records())
+
+            # Последняя строка по каждому id
+            latest = select(func.max(staging.c.line_no)).group_by(staging.c.id)
+            source = select(*(staging.c[column] for column in columns)).where(staging.c.line_no.in_(latest))
+            staged_ids = select(staging.c.id)
+
+            products = (await conn.execute(select(func.count(distinct(staging.c.id))))).scalar_one()
+            existing = (await conn.execute(
+                select(func.count()).select_from(Product).where(Product.id.in_(staged_ids))
+            )).scalar_one()
+            tags = await ProductSyncService._affected_tags(conn, columns)
+
+            updated_columns = [column for column in columns if column != "id"]
+            if upsert:
+                insert = dialect_insert(conn.dialect.name)
+                stmt = insert(Product).from_select(columns, source)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[Product.id],
+                    set_={**{column: stmt.excluded[column] for column in updated_columns},
+                          "updated_at": func.now()},
+                )
+            else:
+                subquery = source.subquery()
+                stmt = (
+                    update(Product)
+                    .where(Product.id == subquery.c.id)
+                    .values({column: subquery.c[column] for column in updated_columns})
+                )
+            if updated_columns:
+                await conn.execute(stmt)
+        except DBAPIError as exc:
+            raise HTTPException(status_code=422, detail=f"Ошибка загрузки: {exc.orig}")
+        # При ошибке таблицу убирает откат транзакции
+        await conn.execute(text(f"DROP TABLE {staging.name}"))
+
+        invalidate_after_commit(db.sync_session, tags)
+        inserted = products - existing if upsert else 0
+        return {
+            "rows": stats["rows"],
+            "products": products,
+            "inserted": inserted,
+            "updated": existing if updated_columns else 0,
+            "skipped": products - inserted - existing,
+        }
+
+    @staticmethod
+    async def _copy(conn, columns: list[str], records: AsyncIterator[tuple]):
+        import asyncpg
+
+        raw = (await conn.get_raw_connection()).driver_connection
+        try:
+            await raw.copy_records_to_table(products_staging.name, records=records, columns=columns)
+        except (asyncpg.PostgresError, asyncpg.DataError) as exc:
+            raise HTTPException(status_code=422, detail=f"Ошибка загрузки: {exc}")
+
+    @staticmethod
+    async def _insert_batches(conn, columns: list[str], records: AsyncIterator[tuple]):
+        """Запасной путь без COPY (SQLite в разработке)"""
+        batch = []
+        async for record in records:
+            batch.append(dict(zip(columns, record)))
+            if len(batch) >= INSERT_BATCH:
+                await conn.execute(products_staging.insert(), batch)
+                batch = []
+        if batch:
+            await conn.execute(products_staging.insert(), batch)
+
+    @staticmethod
+    async def _affected_tags(conn, columns: list[str]) -> set[str]:
+        """Теги кэша затронутых товаров и их старых и новых категорий"""
+        staging = products_staging
+        product_ids = (await conn.execute(select(staging.c.id).distinct())).scalars().all()
+        category_ids = set((await conn.execute(
+            select(Product.category_id).distinct().where(Product.id.in_(select(staging.c.id)))
+        )).scalars())
+        if "category_id" in columns:
+            category_ids.update((await conn.execute(select(staging.c.category_id).distinct())).scalars())
+
+        tags = {"catalog", "categories"}
+        tags.update(f"category:{category_id}" for category_id in category_ids if category_id)
+        tags.update(f"product:{product_id}" for product_id in product_ids)
+        return tags
+
+    @staticmethod
+    def export_products(fmt: str, category_id: Optional[int] = None) -> AsyncIterator[bytes]:
+        """
+        Поток CSV/NDJSON со всеми товарами. Открывает собственное соединение:
+        ответ отдаётся уже после выхода из зависимостей роута.
+        """
+        if fmt not in FORMATS:
+            raise HTTPException(status_code=400, detail=f"Unknown format: {fmt}")
+        columns = list(IMPORT_COLUMNS)
+        stmt = select(*(Product.__table__.c[column] for column in columns)).order_by(Product.id)
+        if category_id:
+            stmt = stmt.where(Product.category_id == category_id)
+        return ProductSyncService._export_rows(stmt.execution_options(yield_per=EXPORT_BATCH), columns, fmt)
+
+    @staticmethod
+    async def _export_rows(stmt, columns: list[str], fmt: str) -> AsyncIterator[bytes]:
+        async with read_engine.connect() as conn:
+            if conn.dialect.name == "postgresql":
+                # Серверному курсору нужна транзакция; заодно единый снимок на всю выгрузку
+                conn = await conn.execution_options(isolation_level="REPEATABLE READ")
+            result = await conn.stream(stmt)
+            if fmt == "csv":
+                yield _csv_lines([columns])
+            async for partition in result.partitions():
+                if fmt == "csv":
+                    yield _csv_lines(
+                        [_csv_value(value) for value in row] for row in partition
+                    )
+                else:
+                    yield b"".join(dumps(dict(zip(columns, row))) + b"\n" for row in partition)
+
+
+async def _chain(first, rows):
+    yield first
+    async for row in rows:
+        yield row
+
+
+def _csv_value(value):
+    if isinstance(value, (list, dict)):
+        return orjson.dumps(value).decode()
+    return value
+
+
+def _csv_lines(rows) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="\n").writerows(rows)
+    return buffer.getvalue().encode()
@@ -0,0 +1,157 @@
+"""
+Ограничение частоты запросов (token bucket) для входа и регистрации: лишние
+попытки отклоняются с 429 до проверки пароля, поэтому перебор паролей не
+выедает CPU на bcrypt.
+
+Два уровня:
+- бакеты в памяти воркера — явный флуд отсекается без похода в Redis;
+- общие бакеты в Redis, которые атомарно проверяет и списывает Lua-скрипт
+  (время берётся из Redis, часы воркеров не важны).
+Лимиты локального уровня те же, что и общие: один воркер не может законно
+увидеть больше, чем весь кластер. Если Redis недоступен, работает только
+локальный уровень.
+"""
+import math
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+import redis.asyncio as aioredis
+from fastapi import HTTPException, status
+from redis.exceptions import RedisError
+
+from app.config import settings
+from app.services.metrics import Counter
+
+KEY_PREFIX = "ratelimit:"
+
+# KEYS — бакеты; ARGV: ttl_ms, затем пары (токенов в мс, ёмкость) на каждый ключ.
+# Токен списывается со всех бакетов, только если есть в каждом.
+# Ответ: {0, 0} — пропущен; {ожидание в мс, номер исчерпанного бакета}.
+TOKEN_BUCKET_LUA = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local tokens = {}
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[i * 2])
+    local burst = tonumber(ARGV[i * 2 + 1])
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local available = burst
+    if state[1] then
+        available = math.min(burst, tonumber(state[1]) + math.max(0, now - tonumber(state[2])) * rate)
+    end
+    if available < 1 then
+        return {math.ceil((1 - available) / rate), i}
+    end
+    tokens[i] = available
+end
+for i, key in ipairs(KEYS) do
+    redis.call('HSET', key, 'tokens', tokens[i] - 1, 'ts', now)
+    redis.call('PEXPIRE', key, ARGV[1])
+end
+return {0, 0}
+"""
+
+
+class Rule(NamedTuple):
+    kind: str  # ip / user — метка в метриках
+    value: str
+    per_minute: float
+    burst: int
+
+    @property
+    def rate(self) -> float:
+        """Токенов в секунду"""
+        return self.per_minute / 60
+
+
+class TokenBuckets:
+    """Бакеты в памяти воркера; самые старые ключи вытесняются по LRU"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    def acquire(self, keys: list[str], rules: list[Rule]) -> tuple[float, Optional[Rule]]:
+        """(0, None) — токены списаны; иначе (сколько секунд ждать, исчерпанное правило)"""
+        now = time.monotonic()
+        available = []
+        for key, rule in zip(keys, rules):
+            tokens, updated_at = self._buckets.get(key, (rule.burst, now))
+            tokens = min(rule.burst, tokens + (now - updated_at) * rule.rate)
+            if tokens < 1:
+                return (1 - tokens) / rule.rate, rule
+            available.append(tokens)
+
+        for key, tokens in zip(keys, available):
+            self._buckets[key] = (tokens - 1, now)
+            self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_entries:
+            self._buckets.popitem(last=False)
+        return 0, None
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class RateLimiter:
+    def __init__(self, redis_url: str, local_max_entries: int):
+        self.redis_url = redis_url
+        self.local = TokenBuckets(local_max_entries)
+        self.stats = {"allowed": 0, "rejected_local": 0, "rejected_redis": 0, "redis_errors": 0}
+        self.rejected = Counter(
+            "fenix_rate_limit_rejected_total", "Запросы, отклонённые лимитом частоты", ("scope", "key", "tier")
+        )
+        self._redis: Optional[aioredis.Redis] = None
+        self._script = None
+
+    @property
+    def redis(self) -> aioredis.Redis:
+        if self._redis is None:
+            self._redis = aioredis.from_url(self.redis_url)
+        return self._redis
+
+    @property
+    def script(self):
+        if self._script is None:
+            self._script = self.redis.register_script(TOKEN_BUCKET_LUA)
+        return self._script
+
+    async def hit(self, scope: str, rules: list[Rule]):
+        """Списывает по токену с каждого бакета или отвечает 429"""
+        keys = [f"{KEY_PREFIX}{scope}:{rule.kind}:{rule.value}" for rule in rules]
+
+        wait, rule = self.local.acquire(keys, rules)
+        if rule is not None:
+            self._reject(scope, rule, "local", wait)
+
+        ttl_ms = math.ceil(max(rule.burst / rule.rate for rule in rules) * 1000)
+        args = [ttl_ms]
+        for rule in rules:
+            args.extend((rule.rate / 1000, rule.burst))
+        try:
+            wait_ms, index = await self.script(keys=keys, args=args)
+        except (RedisError, OSError):
+            self.stats["redis_errors"] += 1
+        else:
+            if index:
+                self._reject(scope, rules[index - 1], "redis", wait_ms / 1000)
+        self.stats["allowed"] += 1
+
+    def _reject(self, scope: str, rule: Rule, tier: str, wait: float):
+        self.stats[f"rejected_{tier}"] += 1
+        self.rejected.inc((scope, rule.kind, tier))
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Слишком много попыток, повторите позже",
+            headers={"Retry-After": str(max(1, math.ceil(wait)))},
+        )
+
+    async def close(self):
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+            self._script = None
+
+
+auth_limiter = RateLimiter(settings.redis_url, local_max_entries=settings.rate_limit_local_max_entries)
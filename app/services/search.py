@@ -0,0 +1,54 @@
+from sqlalchemy import func, or_, literal, literal_column
+
+from app.models.product import Product
+
+# Генерируемая колонка из PRODUCT_SEARCH_DDL, в модели её нет намеренно —
+# на SQLite (локальная разработка, бенчмарки) она не создаётся.
+search_vector = literal_column("products.search_vector")
+
+MIN_QUERY_LENGTH = 2
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+def ilike_condition(query: str, dialect_name: str = "postgresql"):
+    """Наивный поиск подстрокой — запасной вариант вне PostgreSQL и точка сравнения в бенчмарке"""
+    columns = (Product.name, Product.description, Product.full_description)
+    if dialect_name == "sqlite":
+        # ILIKE в SQLite — это LIKE, нечувствительный к регистру только для ASCII;
+        # обе стороны приводятся функцией casefold() из app.database
+        pattern = f"%{query.casefold()}%"
+        return or_(*(func.casefold(column).like(pattern) for column in columns))
+    pattern = f"%{query}%"
+    return or_(*(column.ilike(pattern) for column in columns))
+
+
+def apply_search(stmt, query: str, dialect_name: str):
+    """Добавляет к запросу фильтр поиска и возвращает (stmt, выражение релевантности)"""
+    query = normalize_query(query)
+    if len(query) < MIN_QUERY_LENGTH:
+        return stmt, literal(0.0)
+
+    if dialect_name != "postgresql":
+        return stmt.where(ilike_condition(query, dialect_name)), literal(0.0)
+
+    ts_ru = func.websearch_to_tsquery(literal_column("'russian'"), query)
+    ts_simple = func.websearch_to_tsquery(literal_column("'simple'"), query)
+    name = func.lower(Product.name)
+
+    stmt = stmt.where(
+        or_(
+            search_vector.op("@@")(ts_ru),
+            search_vector.op("@@")(ts_simple),
+            # Опечатки: триграммное сходство со словом в названии
+            literal(query).op("<%")(name),
+        )
+    )
+    rank = (
+        func.ts_rank_cd(search_vector, ts_ru)
+        + func.ts_rank_cd(search_vector, ts_simple)
+        + func.word_similarity(query, name)
+    )
+    return stmt, rank
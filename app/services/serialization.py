@@ -0,0 +1,66 @@
+import asyncio
+import functools
+from decimal import Decimal
+
+import orjson
+from fastapi.responses import JSONResponse, Response
+from fastapi.routing import APIRoute
+from pydantic import BaseModel
+
+JSON_MEDIA_TYPE = "application/json"
+JSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _default(value):
+    if isinstance(value, BaseModel):
+        return value.__pydantic_serializer__.to_python(value, mode="json")
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(payload) -> bytes:
+    """JSON без пробелов в UTF-8; datetime, Enum, UUID и numpy кодирует сам orjson"""
+    return orjson.dumps(payload, default=_default, option=JSON_OPTIONS)
+
+
+class FastJSONResponse(JSONResponse):
+    media_type = JSON_MEDIA_TYPE
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def model_response(model: BaseModel, status_code: int = 200) -> Response:
+    """
+    Ответ из модели, которую мы только что собрали (и тем самым провалидировали):
+    кодируется готовым сериализатором класса, без повторной валидации
+    по response_model в FastAPI.
+    """
+    return Response(model.__pydantic_serializer__.to_json(model), status_code=status_code, media_type=JSON_MEDIA_TYPE)
+
+
+class FastJSONRoute(APIRoute):
+    """
+    Роут, у которого dict/list из async-хендлера без response_model сразу
+    уходят в orjson, минуя jsonable_encoder. Хендлеры с response_model и
+    вернувшие Response обрабатываются как обычно.
+    """
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        super().__init__(path, endpoint, **kwargs)
+        call = self.dependant.call
+        if self.response_field is not None or not asyncio.iscoroutinefunction(call):
+            return
+        status_code = self.status_code or 200
+
+        @functools.wraps(call)
+        async def encoded(*args, **kwargs):
+            content = await call(*args, **kwargs)
+            if isinstance(content, Response):
+                return content
+            return FastJSONResponse(content, status_code=status_code)
+
+        self.dependant.call = encoded
@@ -0,0 +1,208 @@
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Optional
+
+from sqlalchemy import select, func, case, delete, literal
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from app.database import dialect_insert
+from app.models.order import Order
+from app.models.stats import UserStats, StatsEvent
+from app.models.user import User, UserStatus
+from app.services.genealogy import SEPARATOR, path_ids, path_key
+
+COUNTERS = ("total_orders", "total_purchases", "total_earnings", "active_referrals", "team_size")
+UPSERT_BATCH_SIZE = 1000
+PRUNE_BATCH_SIZE = 10000
+# Начисления не удаляются: их event_id — ключ идемпотентности выплаты за период
+KEEP_EVENT_TYPES = ("earnings",)
+
+
+class StatsService:
+    """
+    Инкрементальная статистика дашборда. Каждое событие применяется в той же
+    транзакции, что и бизнес-операция, и записывается в stats_events —
+    повторное событие с тем же event_id ничего не меняет. Расхождения
+    (ручные правки, сбои) исправляет reconcile().
+    """
+
+    @staticmethod
+    async def _record_event(db: AsyncSession, event_id: str, event_type: str,
+                            user_id: Optional[str], payload: dict) -> bool:
+        insert = dialect_insert(db.bind.dialect.name)
+        result = await db.execute(
+            insert(StatsEvent)
+            .values(event_id=event_id, event_type=event_type, user_id=user_id, payload=payload)
+            .on_conflict_do_nothing(index_elements=[StatsEvent.event_id])
+            .returning(StatsEvent.event_id)
+        )
+        return result.scalar_one_or_none() is not None
+
+    @staticmethod
+    async def _increment(db: AsyncSession, rows: Iterable[dict]):
+        """Пакетный upsert: counter = counter + delta для каждой строки"""
+        rows = [{name: row.get(name, 0) for name in ("user_id", *COUNTERS)} for row in rows]
+        insert = dialect_insert(db.bind.dialect.name)
+        # Пачками — лимит параметров запроса у драйверов конечен
+        for start in range(0, len(rows), UPSERT_BATCH_SIZE):
+            stmt = insert(UserStats).values(rows[start:start + UPSERT_BATCH_SIZE])
+            await db.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=[UserStats.user_id],
+                    set_={
+                        **{name: getattr(UserStats, name) + getattr(stmt.excluded, name) for name in COUNTERS},
+                        "updated_at": func.now(),
+                    },
+                )
+            )
+
+    @staticmethod
+    async def apply(db: AsyncSession, event_id: str, event_type: str, user_id: Optional[str],
+                    rows: list[dict], payload: Optional[dict] = None) -> bool:
+        if not await StatsService._record_event(db, event_id, event_type, user_id, payload or {}):
+            return False
+        await StatsService._increment(db, rows)
+        return True
+
+    # ========== СОБЫТИЯ ==========
+
+    @staticmethod
+    async def on_user_registered(db: AsyncSession, user: User) -> bool:
+        """+1 к команде всех спонсоров вверх по линии, +1 активный реферал прямому спонсору"""
+        ancestors = path_ids(user.sponsor_path or "")[:-1]
+        rows = [{"user_id": user.id}]
+        rows += [{"user_id": ancestor_id, "team_size": 1} for ancestor_id in ancestors]
+        if ancestors and user.status in (None, UserStatus.ACTIVE):
+            rows[-1]["active_referrals"] = 1
+        return await StatsService.apply(db, f"user_registered:{user.id}", "user_registered", user.id, rows)
+
+    @staticmethod
+    async def on_order_created(db: AsyncSession, order: Order) -> bool:
+        return await StatsService.apply(
+            db, f"order_created:{order.id}", "order_created", order.user_id,
+            [{"user_id": order.user_id, "total_orders": 1}],
+        )
+
+    @staticmethod
+    async def on_order_paid(db: AsyncSession, order: Order) -> bool:
+        return await StatsService.apply(
+            db, f"order_paid:{order.id}", "order_paid", order.user_id,
+            [{"user_id": order.user_id, "total_purchases": order.total}],
+            payload={"total": order.total},
+        )
+
+    @staticmethod
+    async def on_earnings(db: AsyncSession, event_id: str, amounts: dict[str, float]) -> bool:
+        """Начисления партнёрам (комиссии): {user_id: сумма}"""
+        rows = [{"user_id": user_id, "total_earnings": amount} for user_id, amount in amounts.items()]
+        return await StatsService.apply(db, event_id, "earnings", None, rows)
+
+    # ========== ЧТЕНИЕ ==========
+
+    @staticmethod
+    async def get_dashboard_row(db: AsyncSession, user_id: str):
+        """Пользователь и его статистика одним запросом по первичному ключу"""
+        result = await db.execute(
+            select(User, UserStats)
+            .outerjoin(UserStats, UserStats.user_id == User.id)
+            .where(User.id == user_id)
+        )
+        return result.first()
+
+    # ========== СВЕРКА ==========
+
+    @staticmethod
+    async def reconcile(db: AsyncSession, user_ids: Optional[list[str]] = None) -> int:
+        """
+        Пересчитывает счётчики из первичных данных и перезаписывает user_stats.
+        total_earnings здесь не трогается — его источник живёт в модуле выплат.
+        """
+        users = select(User.id)
+        if user_ids is not None:
+            users = users.where(User.id.in_(user_ids))
+        users = (await db.execute(users)).all()
+        if not users:
+            return 0
+        ids = [user.id for user in users]
+
+        orders = await db.execute(
+            select(
+                Order.user_id,
+                func.count(),
+                func.coalesce(func.sum(case((Order.payment_status == "paid", Order.total), else_=0)), 0),
+            )
+            .where(Order.user_id.in_(ids))
+            .group_by(Order.user_id)
+        )
+        order_stats = {user_id: (count, total) for user_id, count, total in orders}
+
+        referrals = await db.execute(
+            select(User.sponsor_id, func.count())
+            .where(User.sponsor_id.in_(ids), User.status == UserStatus.ACTIVE)
+            .group_by(User.sponsor_id)
+        )
+        active_referrals = dict(referrals.all())
+
+        # Размер команды всех пользователей пачки — одним запросом: потомки
+        # предка лежат в диапазоне путей [path, subtree_end(path)) (см. genealogy)
+        ancestor, descendant = aliased(User), aliased(User)
+        dialect_name = db.bind.dialect.name
+        ancestor_path = path_key(ancestor.sponsor_path, dialect_name)
+        descendant_path = path_key(descendant.sponsor_path, dialect_name)
+        subtree_end = path_key(
+            func.substr(ancestor.sponsor_path, 1, func.length(ancestor.sponsor_path) - 1)
+            + literal(chr(ord(SEPARATOR) + 1)),
+            dialect_name,
+        )
+        teams = await db.execute(
+            select(ancestor.id, func.count(descendant.id))
+            .join(descendant, (descendant_path > ancestor_path) & (descendant_path < subtree_end))
+            .where(ancestor.id.in_(ids))
+            .group_by(ancestor.id)
+        )
+        team_sizes = dict(teams.all())
+
+        now = datetime.now(timezone.utc)
+        rows = []
+        for user in users:
+            total_orders, total_purchases = order_stats.get(user.id, (0, 0.0))
+            rows.append({
+                "user_id": user.id,
+                "total_orders": total_orders,
+                "total_purchases": float(total_purchases),
+                "active_referrals": active_referrals.get(user.id, 0),
+                "team_size": team_sizes.get(user.id, 0),
+                "reconciled_at": now,
+            })
+
+        insert = dialect_insert(db.bind.dialect.name)
+        stmt = insert(UserStats).values(rows)
+        await db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[UserStats.user_id],
+                set_={
+                    name: getattr(stmt.excluded, name)
+                    for name in ("total_orders", "total_purchases", "active_referrals", "team_size", "reconciled_at")
+                },
+            )
+        )
+        return len(rows)
+
+    @staticmethod
+    async def prune_events(db: AsyncSession, retention_days: int) -> int:
+        """
+        Удаляет пачку записей stats_events старше retention_days (кроме начислений);
+        возвращает, сколько удалено. Повтор такого старого события применился бы
+        заново — срок хранения должен быть больше окна повторной доставки,
+        счётчики всё равно поправит reconcile().
+        """
+        cutoff = datetime.now(timezone.utc) - timedelta(days=retention_days)
+        batch = (
+            select(StatsEvent.event_id)
+            .where(StatsEvent.created_at < cutoff, StatsEvent.event_type.not_in(KEEP_EVENT_TYPES))
+            .limit(PRUNE_BATCH_SIZE)
+        )
+        result = await db.execute(
+            delete(StatsEvent).where(StatsEvent.event_id.in_(batch)).execution_options(synchronize_session=False)
+        )
+        return result.rowcount
@@ -0,0 +1,218 @@
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import redis.asyncio as aioredis
+from redis.exceptions import RedisError
+
+from app.config import settings
+
+REVOKED_PREFIX = "auth:revoked:"
+REVOCATION_CHANNEL = "auth:revocations"
+
+
+class VerifiedTokenCache:
+    """
+    LRU уже проверенных JWT: токен -> claims, запись живёт до exp токена.
+    Индекс jti -> токены нужен, чтобы отзыв убирал записи за O(1), а не
+    перебором всего кэша.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.stats = {"hits": 0, "misses": 0}
+        self._data: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._by_jti: dict[str, set[str]] = {}
+
+    def get(self, token: str) -> Optional[dict]:
+        entry = self._data.get(token)
+        if entry is None or entry[0] <= time.time():
+            if entry is not None:
+                self._remove(token)
+            self.stats["misses"] += 1
+            return None
+        self._data.move_to_end(token)
+        self.stats["hits"] += 1
+        return entry[1]
+
+    def set(self, token: str, claims: dict):
+        exp = claims.get("exp")
+        if exp is None:
+            return
+        if token in self._data:
+            self._remove(token)
+        self._data[token] = (float(exp), claims)
+        jti = claims.get("jti")
+        if jti is not None:
+            self._by_jti.setdefault(jti, set()).add(token)
+        while len(self._data) > self.max_entries:
+            self._remove(next(iter(self._data)))
+
+    def discard_jti(self, jti: str):
+        for token in self._by_jti.pop(jti, ()):
+            self._data.pop(token, None)
+
+    def _remove(self, token: str):
+        _, claims = self._data.pop(token)
+        jti = claims.get("jti")
+        tokens = self._by_jti.get(jti)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._by_jti[jti]
+
+
+class BloomFilter:
+    def __init__(self, size_bits: int, hashes: int):
+        self.size_bits = size_bits
+        self.hashes = hashes
+        self._bits = bytearray((size_bits + 7) // 8)
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=self.hashes * 4).digest()
+        for i in range(self.hashes):
+            yield int.from_bytes(digest[i * 4:(i + 1) * 4], "little") % self.size_bits
+
+    def add(self, item: str):
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    def clear(self):
+        self._bits = bytearray(len(self._bits))
+
+
+class RevocationList:
+    """
+    Отозванные токены (по jti). Источник истины — ключи Redis с TTL до exp
+    токена; перед ними в каждом воркере стоит фильтр Блума. Если jti нет в
+    фильтре, токен точно не отозван и в Redis мы не ходим. Новые отзывы
+    разлетаются по воркерам через pub/sub; фильтр заполняется из Redis при
+    старте, при каждой переподписке и раз в rebuild_interval секунд, чтобы
+    истёкшие jti не копили ложные срабатывания.
+
+    Отрицательному ответу фильтра верим, только пока он синхронизирован:
+    загружен и подписка на канал жива. До первой загрузки и пока Redis
+    недоступен отзыв проверяется в Redis, а ошибка Redis означает «отозван».
+    """
+
+    def __init__(self, redis_url: str, bloom_size_bits: int, bloom_hashes: int, rebuild_interval: float):
+        self.redis_url = redis_url
+        self.bloom = BloomFilter(bloom_size_bits, bloom_hashes)
+        self.rebuild_interval = rebuild_interval
+        self.stats = {"bloom_negative": 0, "redis_checks": 0, "revoked": 0, "redis_errors": 0, "rebuilds": 0}
+        self._redis: Optional[aioredis.Redis] = None
+        self._listener: Optional[asyncio.Task] = None
+        self._rebuilder: Optional[asyncio.Task] = None
+        self._loading: list[BloomFilter] = []
+        self._synced = False
+
+    @property
+    def redis(self) -> aioredis.Redis:
+        if self._redis is None:
+            self._redis = aioredis.from_url(self.redis_url)
+        return self._redis
+
+    def _add(self, jti: str):
+        self.bloom.add(jti)
+        # Пока идёт перестройка, отзыв попадает и в новый фильтр — иначе пропал бы при замене
+        for bloom in self._loading:
+            bloom.add(jti)
+
+    async def revoke(self, jti: str, exp: float):
+        self._add(jti)
+        ttl = max(1, int(exp - time.time()))
+        try:
+            await self.redis.set(f"{REVOKED_PREFIX}{jti}", 1, ex=ttl)
+            await self.redis.publish(REVOCATION_CHANNEL, jti)
+        except (RedisError, OSError):
+            self.stats["redis_errors"] += 1
+        self.stats["revoked"] += 1
+
+    async def is_revoked(self, jti: str) -> bool:
+        if self._synced and jti not in self.bloom:
+            self.stats["bloom_negative"] += 1
+            return False
+
+        self.stats["redis_checks"] += 1
+        try:
+            return bool(await self.redis.exists(f"{REVOKED_PREFIX}{jti}"))
+        except (RedisError, OSError):
+            self.stats["redis_errors"] += 1
+            # Фильтр не может поручиться за токен, а Redis не ответил — считаем отозванным
+            return True
+
+    async def load(self):
+        """Перестраивает фильтр по актуальным ключам Redis (истёкшие выпадают)"""
+        bloom = BloomFilter(self.bloom.size_bits, self.bloom.hashes)
+        self._loading.append(bloom)
+        try:
+            async for key in self.redis.scan_iter(match=f"{REVOKED_PREFIX}*", count=1000):
+                bloom.add(key.decode().removeprefix(REVOKED_PREFIX))
+            self.bloom = bloom
+        finally:
+            self._loading.remove(bloom)
+        self.stats["rebuilds"] += 1
+
+    async def start(self):
+        try:
+            await self.load()
+        except (RedisError, OSError):
+            self.stats["redis_errors"] += 1
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+        if self._rebuilder is None:
+            self._rebuilder = asyncio.create_task(self._rebuild())
+
+    async def stop(self):
+        for task in (self._listener, self._rebuilder):
+            if task is not None:
+                task.cancel()
+        self._listener = self._rebuilder = None
+        self._synced = False
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+    async def _listen(self):
+        while True:
+            try:
+                async with self.redis.pubsub() as pubsub:
+                    await pubsub.subscribe(REVOCATION_CHANNEL)
+                    # Отзывы, сделанные пока подписки не было, подтягиваем из Redis
+                    await self.load()
+                    self._synced = True
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            jti = message["data"].decode()
+                            self._add(jti)
+                            verified_tokens.discard_jti(jti)
+            except asyncio.CancelledError:
+                raise
+            except (RedisError, OSError):
+                # Без подписки чужие отзывы не доходят — до переподписки спрашиваем Redis
+                self._synced = False
+                self.stats["redis_errors"] += 1
+                await asyncio.sleep(1)
+
+    async def _rebuild(self):
+        while True:
+            await asyncio.sleep(self.rebuild_interval)
+            try:
+                await self.load()
+            except (RedisError, OSError):
+                self.stats["redis_errors"] += 1
+
+
+verified_tokens = VerifiedTokenCache(max_entries=settings.token_cache_max_entries)
+
+revocations = RevocationList(
+    settings.redis_url,
+    bloom_size_bits=settings.revocation_bloom_bits,
+    bloom_hashes=settings.revocation_bloom_hashes,
+    rebuild_interval=settings.revocation_rebuild_interval,
+)
@@ -0,0 +1,221 @@
+import asyncio
+import secrets
+import time
+from typing import Optional
+
+import redis.asyncio as aioredis
+from redis.exceptions import RedisError
+from sqlalchemy import update, case, func
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.models.product import Product
+
+# Товаров на один UPDATE: по 3 параметра на товар (IN и CASE), а у asyncpg
+# и PostgreSQL предел — 32767 параметров на запрос
+FLUSH_CHUNK = 5000
+
+PENDING_KEY = "views:pending"
+FLUSHING_KEY = "views:flushing"
+FLUSH_LOCK_KEY = "views:flush_lock"
+FLUSH_LOCK_TTL = 60
+
+# Забирает накопленное в работу. Если прошлая запись не дошла до конца
+# (ошибка БД, падение воркера), сначала дописывается остаток в views:flushing.
+TAKE_LUA = """
+if redis.call('EXISTS', KEYS[2]) == 0 then
+    if redis.call('EXISTS', KEYS[1]) == 0 then
+        return {}
+    end
+    redis.call('RENAME', KEYS[1], KEYS[2])
+end
+return redis.call('HGETALL', KEYS[2])
+"""
+
+# Снимает блокировку, только если она всё ещё наша
+RELEASE_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class ViewCounter:
+    """
+    Write-behind счётчик просмотров товаров. Просмотр — HINCRBY в общий хэш
+    Redis views:pending, поэтому падение воркера ничего не теряет. Раз в
+    flush_interval секунд один из воркеров (под блокировкой views:flush_lock)
+    переименовывает хэш в views:flushing и пишет его в БД запросами
+    UPDATE ... SET views_count = views_count + CASE по FLUSH_CHUNK товаров;
+    записанные товары сразу убираются из хэша. Если запись не удалась,
+    остаток ждёт в views:flushing следующей попытки. Доставка «хотя бы
+    один раз»: при падении между commit и HDEL пачка одного UPDATE
+    засчитается повторно.
+
+    Пока Redis недоступен, просмотры копятся в памяти воркера (не больше
+    max_buffered товаров, остальное отбрасывается) и пишутся в БД напрямую —
+    в этом режиме при падении процесса теряется до одного интервала.
+    """
+
+    def __init__(self, redis_url: str, flush_interval: float, max_pending: int, max_buffered: int):
+        self.redis_url = redis_url
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_buffered = max_buffered
+        self.stats = {
+            "flushes": 0, "flushed_views": 0, "flush_errors": 0, "dropped_views": 0, "redis_errors": 0,
+            "last_flush_ms": 0.0, "max_flush_ms": 0.0,
+        }
+        self._redis: Optional[aioredis.Redis] = None
+        self._take = None
+        self._release = None
+        self._owner = secrets.token_hex(8)
+        self._pending: dict[str, int] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+
+    @property
+    def redis(self) -> aioredis.Redis:
+        if self._redis is None:
+            self._redis = aioredis.from_url(self.redis_url)
+        return self._redis
+
+    @property
+    def take(self):
+        if self._take is None:
+            self._take = self.redis.register_script(TAKE_LUA)
+        return self._take
+
+    @property
+    def release(self):
+        if self._release is None:
+            self._release = self.redis.register_script(RELEASE_LUA)
+        return self._release
+
+    async def hit(self, product_id: str):
+        try:
+            await self.redis.hincrby(PENDING_KEY, product_id, 1)
+            return
+        except (RedisError, OSError):
+            self.stats["redis_errors"] += 1
+        if product_id in self._pending or len(self._pending) < self.max_buffered:
+            self._pending[product_id] = self._pending.get(product_id, 0) + 1
+        else:
+            self.stats["dropped_views"] += 1
+        if len(self._pending) >= self.max_pending and self._wakeup is not None:
+            self._wakeup.set()
+
+    @property
+    def pending(self) -> int:
+        """Просмотры в памяти воркера (только пока Redis недоступен)"""
+        return sum(self._pending.values())
+
+    async def flush(self):
+        started = time.perf_counter()
+        flushed = await self._flush_local()
+        try:
+            flushed = await self._flush_redis() or flushed
+        except (RedisError, OSError):
+            self.stats["redis_errors"] += 1
+        if not flushed:
+            return
+
+        elapsed = (time.perf_counter() - started) * 1000
+        self.stats["flushes"] += 1
+        self.stats["last_flush_ms"] = round(elapsed, 2)
+        self.stats["max_flush_ms"] = round(max(self.stats["max_flush_ms"], elapsed), 2)
+
+    async def _flush_local(self) -> bool:
+        if not self._pending:
+            return False
+        batch, self._pending = list(self._pending.items()), {}
+        for start in range(0, len(batch), FLUSH_CHUNK):
+            chunk = dict(batch[start:start + FLUSH_CHUNK])
+            if not await self._write(chunk):
+                self._restore(batch[start:])
+                return False
+        return True
+
+    async def _flush_redis(self) -> bool:
+        # Один воркер за раз: иначе два flusher'а записали бы views:flushing дважды
+        if not await self.redis.set(FLUSH_LOCK_KEY, self._owner, nx=True, ex=FLUSH_LOCK_TTL):
+            return False
+        try:
+            raw = await self.take(keys=[PENDING_KEY, FLUSHING_KEY])
+            batch = [(raw[i].decode(), int(raw[i + 1])) for i in range(0, len(raw), 2)]
+            for start in range(0, len(batch), FLUSH_CHUNK):
+                chunk = dict(batch[start:start + FLUSH_CHUNK])
+                if not await self._write(chunk):
+                    return False
+                async with self.redis.pipeline(transaction=True) as pipe:
+                    pipe.hdel(FLUSHING_KEY, *chunk)
+                    # Большая пачка пишется дольше FLUSH_LOCK_TTL — продлеваем блокировку
+                    pipe.expire(FLUSH_LOCK_KEY, FLUSH_LOCK_TTL)
+                    await pipe.execute()
+            return bool(batch)
+        finally:
+            await self.release(keys=[FLUSH_LOCK_KEY], args=[self._owner])
+
+    async def _write(self, chunk: dict[str, int]) -> bool:
+        try:
+            async with AsyncSessionLocal() as session:
+                await session.execute(
+                    update(Product)
+                    .where(Product.id.in_(list(chunk)))
+                    .values(views_count=func.coalesce(Product.views_count, 0) + case(chunk, value=Product.id))
+                    .execution_options(synchronize_session=False)
+                )
+                await session.commit()
+        except (SQLAlchemyError, OSError):
+            self.stats["flush_errors"] += 1
+            return False
+        self.stats["flushed_views"] += sum(chunk.values())
+        return True
+
+    def _restore(self, items: list[tuple[str, int]]):
+        """Возвращает незаписанное в буфер, не раздувая его сверх max_buffered"""
+        for product_id, count in items:
+            if product_id in self._pending or len(self._pending) < self.max_buffered:
+                self._pending[product_id] = self._pending.get(product_id, 0) + count
+            else:
+                self.stats["dropped_views"] += count
+
+    async def start(self):
+        if self._task is None:
+            self._stopping = False
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Дожидается текущей записи (отмена посреди UPDATE потеряла бы пачку) и сбрасывает остаток"""
+        if self._task is not None:
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+            self._take = self._release = None
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if not self._stopping:
+                await self.flush()
+
+
+view_counter = ViewCounter(
+    settings.redis_url,
+    flush_interval=settings.views_flush_interval,
+    max_pending=settings.views_max_pending,
+    max_buffered=settings.views_max_buffered,
+)
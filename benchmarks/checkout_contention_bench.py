@@ -0,0 +1,93 @@
+"""
+Конкурентное оформление заказов на один SKU: проверка отсутствия оверселла.
+
+    python -m benchmarks.checkout_contention_bench --buyers 500 --stock 100
+
+Таблицы в DATABASE_URL пересоздаются. Для честной картины нужен PostgreSQL:
+SQLite сериализует запись и покажет корректность, но не пропускную способность.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from fastapi import HTTPException
+from sqlalchemy import insert, select, func
+
+from app.database import engine, Base, AsyncSessionLocal
+from app.models.order import Order
+from app.models.product import Product
+from app.models.user import User
+from app.services.orders import OrderService
+
+import app.models.stats  # noqa: F401  — таблицы для StatsService
+
+SKU = "flash_sku"
+
+
+async def seed(buyers: int, stock: int, price: float):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    async with AsyncSessionLocal() as session:
+        await session.execute(insert(Product), [{
+            "id": SKU, "name": "Flash sale", "slug": SKU, "price": price,
+            "stock_quantity": stock, "in_stock": True,
+        }])
+        await session.execute(insert(User), [{
+            "id": f"buyer{i}", "full_name": f"Buyer {i}", "email": f"b{i}@bench.local",
+            "phone": f"+7700{i:07d}", "city": "Алматы", "hashed_password": "x",
+            "referral_code": f"REF{i}",
+        } for i in range(buyers)])
+        await session.commit()
+
+
+async def buy(user_id: str, quantity: int, timings: list) -> str:
+    started = time.perf_counter()
+    try:
+        async with AsyncSessionLocal() as session:
+            try:
+                await OrderService.place_order(session, user_id, {SKU: quantity})
+                await session.commit()
+                return "ok"
+            except HTTPException as exc:
+                await session.rollback()
+                return "sold_out" if exc.status_code == 409 else "rejected"
+    finally:
+        timings.append((time.perf_counter() - started) * 1000)
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--buyers", type=int, default=500)
+    parser.add_argument("--stock", type=int, default=100)
+    parser.add_argument("--quantity", type=int, default=1)
+    args = parser.parse_args()
+
+    await seed(args.buyers, args.stock, price=20000)
+
+    timings: list[float] = []
+    started = time.perf_counter()
+    outcomes = await asyncio.gather(*(buy(f"buyer{i}", args.quantity, timings) for i in range(args.buyers)))
+    elapsed = time.perf_counter() - started
+
+    async with AsyncSessionLocal() as session:
+        stock = await session.scalar(select(Product.stock_quantity).where(Product.id == SKU))
+        orders = await session.scalar(select(func.count()).select_from(Order))
+
+    timings.sort()
+    sold = outcomes.count("ok") * args.quantity
+    print(f"buyers={args.buyers} stock={args.stock} ok={outcomes.count('ok')} "
+          f"sold_out={outcomes.count('sold_out')} rejected={outcomes.count('rejected')}")
+    print(f"throughput={args.buyers / elapsed:.1f} req/s  p50={statistics.median(timings):.1f} ms  "
+          f"p99={timings[int(len(timings) * 0.99) - 1]:.1f} ms")
+    print(f"final stock={stock} orders={orders}")
+
+    assert stock >= 0, "оверселл: остаток ушёл в минус"
+    assert sold + stock == args.stock, "проданное + остаток не сходится с исходным складом"
+    assert orders == outcomes.count("ok")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
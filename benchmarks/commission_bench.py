@@ -0,0 +1,71 @@
+"""
+Бенчмарк ядра расчёта комиссий на синтетических данных (без БД).
+
+    python -m benchmarks.commission_bench --users 500000 --orders 1000000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.services.commissions import compute_commissions
+
+SHARES = [0.5, 0.2, 0.1, 0.1, 0.1]
+
+
+def synthetic_tree(users: int, rng: np.random.Generator) -> np.ndarray:
+    # Спонсор всегда зарегистрирован раньше: глубокие и широкие ветки вперемешку
+    parent = np.empty(users, dtype=np.int64)
+    parent[0] = -1
+    offsets = rng.integers(1, 50, size=users - 1)
+    parent[1:] = np.maximum(np.arange(1, users) - offsets, 0)
+    return parent
+
+
+def naive(parent, eligible, buyer, pool, shares) -> dict:
+    totals = {}
+    for order_buyer, order_pool in zip(buyer.tolist(), pool.tolist()):
+        ancestor = order_buyer
+        for level, share in enumerate(shares, start=1):
+            ancestor = parent[ancestor]
+            if ancestor < 0:
+                break
+            if eligible[ancestor]:
+                key = (ancestor, level)
+                totals[key] = totals.get(key, 0.0) + order_pool * share
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=500_000)
+    parser.add_argument("--orders", type=int, default=1_000_000)
+    parser.add_argument("--naive-sample", type=int, default=100_000,
+                        help="сколько заказов прогнать построчным Python-циклом для сравнения")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    parent = synthetic_tree(args.users, rng)
+    eligible = rng.random(args.users) < 0.6
+    buyer = rng.integers(0, args.users, size=args.orders)
+    pool = rng.uniform(100, 5000, size=args.orders)
+
+    started = time.perf_counter()
+    result = compute_commissions(parent, eligible, buyer, pool, SHARES)
+    vectorized = time.perf_counter() - started
+    print(f"vectorized: {args.orders} заказов за {vectorized:.3f} s, строк начислений {len(result.amount)}")
+
+    sample = min(args.naive_sample, args.orders)
+    started = time.perf_counter()
+    naive(parent.tolist(), eligible.tolist(), buyer[:sample], pool[:sample], SHARES)
+    elapsed = time.perf_counter() - started
+    print(f"naive:      {sample} заказов за {elapsed:.3f} s (≈{elapsed * args.orders / sample:.1f} s на все)")
+
+    check = compute_commissions(parent, eligible, buyer[:sample], pool[:sample], SHARES)
+    expected = naive(parent.tolist(), eligible.tolist(), buyer[:sample], pool[:sample], SHARES)
+    assert len(check.amount) == len(expected)
+    assert abs(check.amount.sum() - round(sum(expected.values()), 2)) < len(expected) * 0.01
+
+
+if __name__ == "__main__":
+    main()
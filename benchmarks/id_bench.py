@@ -0,0 +1,78 @@
+"""
+Генерация ID в нескольких процессах: целевой темп, отсутствие коллизий
+и монотонность внутри процесса.
+
+    python -m benchmarks.id_bench --processes 8 --rate 50000 --seconds 5
+    python -m benchmarks.id_bench --processes 8 --rate 0        # без ограничения темпа
+
+Номера узлов раздаются общим счётчиком — так же, как INCR в Redis при
+старте воркера.
+"""
+import argparse
+import multiprocessing as mp
+import time
+
+from app.services.ids import IdGenerator, MAX_NODE, decode
+
+
+def worker(node_counter, rate: float, seconds: float, results):
+    with node_counter.get_lock():
+        node_counter.value += 1
+        node = node_counter.value & MAX_NODE
+    generator = IdGenerator(node)
+
+    ids = []
+    started = time.perf_counter()
+    deadline = started + seconds
+    if rate <= 0:
+        while time.perf_counter() < deadline:
+            for _ in range(1000):
+                ids.append(generator.new_id("ID"))
+    else:
+        # Пачками раз в миллисекунду, чтобы держать заданный темп
+        produced = 0
+        while (now := time.perf_counter()) < deadline:
+            target = int((now - started) * rate)
+            for _ in range(target - produced):
+                ids.append(generator.new_id("ID"))
+            produced = target
+            time.sleep(0.001)
+    elapsed = time.perf_counter() - started
+    monotonic = all(a < b for a, b in zip(ids, ids[1:]))
+    results.put((node, [decode(i[2:]) for i in ids], elapsed, monotonic))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--processes", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=50000, help="Суммарно ID/с, 0 — без ограничения")
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    node_counter = mp.Value("i", 0)
+    results = mp.Queue()
+    per_process = args.rate / args.processes
+    processes = [
+        mp.Process(target=worker, args=(node_counter, per_process, args.seconds, results))
+        for _ in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    collected = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    all_ids = [value for _, ids, _, _ in collected for value in ids]
+    elapsed = max(elapsed for _, _, elapsed, _ in collected)
+    unique = len(set(all_ids))
+    print(f"processes={args.processes} nodes={sorted(node for node, *_ in collected)}")
+    print(f"generated={len(all_ids)} rate={len(all_ids) / elapsed:,.0f} ID/s unique={unique} "
+          f"collisions={len(all_ids) - unique}")
+    print(f"monotonic per process: {all(monotonic for *_, monotonic in collected)}")
+
+    assert unique == len(all_ids), "коллизии ID"
+    assert all(monotonic for *_, monotonic in collected), "ID внутри процесса не монотонны"
+
+
+if __name__ == "__main__":
+    main()
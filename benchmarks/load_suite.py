@@ -0,0 +1,384 @@
+"""
+Нагрузочный прогон API по сценариям с отчётом p50/p95/p99 и сравнением
+с сохранённым baseline.
+
+    python -m benchmarks.load_suite                       # все сценарии, сравнение с baseline
+    python -m benchmarks.load_suite browse checkout       # выбранные сценарии
+    python -m benchmarks.load_suite --save-baseline       # перезаписать baseline
+    python -m benchmarks.load_suite --url http://127.0.0.1:8000 --no-seed
+
+По умолчанию приложение гоняется в процессе через ASGI (с lifespan), таблицы
+в DATABASE_URL пересоздаются и заполняются синтетикой (SQLite/aiosqlite или
+одноразовый PostgreSQL). С --url запросы идут в уже запущенный uvicorn,
+смотрящий в ту же базу. SQLite сериализует запись: для checkout стоит поднять
+таймаут блокировки (sqlite+aiosqlite:///bench.sqlite?timeout=30), иначе
+конкурентные заказы упираются в «database is locked». Сценарии с токеном
+(cart_churn, checkout, dashboard) требуют Redis из REDIS_URL — без него отзыв
+токенов не проверить и запросы отклоняются — и пропускаются, если он недоступен.
+
+login_storm идёт в настоящий вход приложения: лимитер попыток, затем bcrypt
+в пуле потоков. Весь прогон идёт с одного IP, поэтому в процессе пороги
+лимитера подняты: проверка выполняется на каждом запросе, но сценарий меряет
+bcrypt, а не отказы 429. С --url действуют лимиты сервера.
+
+Выход с кодом 1, если p95 или пропускная способность хуже baseline больше
+чем на --tolerance.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import random
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import httpx
+from redis.exceptions import RedisError
+from sqlalchemy import insert
+
+from app.database import engine, Base, AsyncSessionLocal
+from app.main import app as api
+from app.config import settings
+from app.models.commission import PayoutRun  # noqa: F401  — все таблицы для create_all
+from app.models.order import Order, OrderItem, OrderStatus, PaymentMethod
+from app.models.product import Category, Product
+from app.models.user import User, PartnershipType
+from app.services.auth import AuthService
+from app.services.cart import cart_service
+from app.services.genealogy import build_path
+
+BASELINE_PATH = Path(__file__).with_name("baseline.json")
+PASSWORD = "bench-password"
+HOT_SKUS = [f"hot{i}" for i in range(3)]
+SORTS = ["popular", "price", "new", "rating"]
+SEARCH_TERMS = ["витамин", "омега", "коллаген", "чай", "крем", "Товар 1"]
+WORDS = ["Витамин", "Омега-3", "Коллаген", "Чай", "Крем", "Сыворотка", "Магний", "Цинк"]
+
+
+# ========== ДАННЫЕ ==========
+
+async def seed(users: int, products: int, orders: int):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+    rng = random.Random(42)
+    now = datetime.now(timezone.utc)
+    hashed = AuthService.get_password_hash(PASSWORD)
+
+    user_rows, paths = [], {}
+    for i in range(users):
+        user_id = f"U{i:06d}"
+        sponsor_id = f"U{(i - 1) // 5:06d}" if i else None
+        paths[user_id] = build_path(paths.get(sponsor_id), user_id)
+        user_rows.append({
+            "id": user_id, "full_name": f"Партнёр {i}", "email": f"u{i}@bench.fenix.kz",
+            "phone": f"+7701{i:07d}", "city": "Алматы", "hashed_password": hashed,
+            "partnership_type": PartnershipType.LEADER if i % 3 == 0 else PartnershipType.CLIENT,
+            "sponsor_id": sponsor_id, "sponsor_path": paths[user_id],
+            "sponsor_depth": paths[user_id].count(".") - 2, "referral_code": f"REF{i:06d}",
+        })
+
+    product_rows = [{
+        "id": f"p{i}", "name": f"{WORDS[i % len(WORDS)]} Товар {i}", "slug": f"p-{i}",
+        "description": f"{WORDS[(i * 7) % len(WORDS)]} для ежедневного применения",
+        "price": float(rng.randrange(2000, 40000, 10)), "category_id": i % 20 + 1,
+        "stock_quantity": 1_000_000, "in_stock": True, "is_active": True,
+        "bonus_points": 50, "commission_percent": 10.0,
+        "rating": round(rng.uniform(3, 5), 1), "created_at": now - timedelta(minutes=i),
+    } for i in range(products)]
+    product_rows += [{
+        "id": sku, "name": f"Флеш-распродажа {sku}", "slug": sku, "price": 15000.0, "category_id": 1,
+        "stock_quantity": 200, "in_stock": True, "is_active": True, "created_at": now,
+    } for sku in HOT_SKUS]
+
+    order_rows, item_rows = [], []
+    for i in range(orders):
+        product = product_rows[rng.randrange(products)]
+        quantity = rng.randint(1, 3)
+        created = now - timedelta(hours=rng.randrange(24 * 60))
+        order_rows.append({
+            "id": f"O{i:07d}", "order_number": f"B{i:08d}", "user_id": f"U{rng.randrange(users):06d}",
+            "status": OrderStatus.DELIVERED, "payment_method": PaymentMethod.CARD, "payment_status": "paid",
+            "items": [{"product_id": product["id"], "name": product["name"], "quantity": quantity,
+                       "price": product["price"], "subtotal": product["price"] * quantity}],
+            "subtotal": product["price"] * quantity, "total": product["price"] * quantity, "created_at": created,
+        })
+        item_rows.append({
+            "order_id": f"O{i:07d}", "product_id": product["id"], "quantity": quantity,
+            "price": product["price"], "subtotal": product["price"] * quantity, "created_at": created,
+        })
+
+    async with AsyncSessionLocal() as session:
+        await session.execute(insert(Category), [
+            {"id": i + 1, "name": f"Категория {i + 1}", "slug": f"cat-{i + 1}", "sort_order": i, "is_active": True}
+            for i in range(20)
+        ])
+        for table, rows in ((User, user_rows), (Product, product_rows), (Order, order_rows), (OrderItem, item_rows)):
+            for start in range(0, len(rows), 5000):
+                await session.execute(insert(table), rows[start:start + 5000])
+        await session.commit()
+
+
+# ========== СЦЕНАРИИ ==========
+# Каждый шаг — одна «операция» пользователя; возвращает список (эндпоинт, статус)
+
+class Scenarios:
+    def __init__(self, users: int, products: int):
+        self.users = users
+        self.products = products
+        # Выписываются напрямую, чтобы не тратить bcrypt на каждого; что вход
+        # API выдаёт такие же рабочие токены, проверяет check_auth перед прогоном
+        self.tokens = [AuthService.create_access_token({"sub": f"U{i:06d}"}) for i in range(users)]
+
+    def auth(self, i: int) -> dict:
+        return {"Authorization": f"Bearer {self.tokens[i % self.users]}"}
+
+    async def browse(self, client: httpx.AsyncClient, i: int):
+        results = []
+        response = await client.get("/api/v1/shop/categories")
+        results.append(("categories", response.status_code))
+        params = {"category_id": i % 20 + 1, "limit": 20, "sort": SORTS[i % len(SORTS)]}
+        cursor = None
+        # Первая страница и следующая по курсору
+        for _ in range(2):
+            if cursor:
+                params["cursor"] = cursor
+            response = await client.get("/api/v1/shop/products", params=params)
+            results.append(("products", response.status_code))
+            cursor = response.json().get("pagination", {}).get("next_cursor") if response.status_code == 200 else None
+            if not cursor:
+                break
+        response = await client.get(f"/api/v1/shop/products/p{(i * 31) % self.products}")
+        results.append(("product", response.status_code))
+        return results
+
+    async def search(self, client: httpx.AsyncClient, i: int):
+        term = SEARCH_TERMS[i % len(SEARCH_TERMS)]
+        response = await client.get("/api/v1/shop/products", params={"search": term, "limit": 20})
+        # Каждый термин есть в засеянных названиях: пустая выдача — сломанный поиск,
+        # а не быстрый, и такой прогон нельзя сравнивать с baseline
+        if response.status_code == 200 and not response.json()["data"]:
+            raise AssertionError(f"поиск «{term}» ничего не нашёл")
+        return [("search", response.status_code)]
+
+    async def login_storm(self, client: httpx.AsyncClient, i: int):
+        response = await client.post("/api/v1/auth/login", json={
+            "user_id": f"U{i % self.users:06d}", "password": PASSWORD,
+        })
+        return [("login", response.status_code)]
+
+    async def cart_churn(self, client: httpx.AsyncClient, i: int):
+        headers = self.auth(i)
+        results = []
+        for step in range(3):
+            product_id = f"p{(i * 7 + step) % self.products}"
+            response = await client.post("/api/v1/shop/cart/add", headers=headers,
+                                         json={"product_id": product_id, "quantity": 1 + step})
+            results.append(("cart_add", response.status_code))
+        response = await client.post("/api/v1/shop/cart/remove", headers=headers,
+                                     json={"product_id": f"p{(i * 7) % self.products}"})
+        results.append(("cart_remove", response.status_code))
+        response = await client.get("/api/v1/shop/cart", headers=headers)
+        results.append(("cart", response.status_code))
+        return results
+
+    async def checkout(self, client: httpx.AsyncClient, i: int):
+        # Половина покупателей ломится в три «горячих» SKU с малым остатком
+        items = [{"product_id": HOT_SKUS[i % len(HOT_SKUS)], "quantity": 1}] if i % 2 else [
+            {"product_id": f"p{(i * 13) % self.products}", "quantity": 2},
+            {"product_id": f"p{(i * 17) % self.products}", "quantity": 1},
+        ]
+        response = await client.post("/api/v1/shop/orders", headers=self.auth(i), json={
+            "items": items, "payment_method": "card",
+        })
+        return [("checkout", response.status_code)]
+
+    async def dashboard(self, client: httpx.AsyncClient, i: int):
+        response = await client.get("/api/v1/cabinet/dashboard", headers=self.auth(i))
+        return [("dashboard", response.status_code)]
+
+
+async def check_auth(client: httpx.AsyncClient):
+    """Вход через API выдаёт JWT, который принимают эндпоинты кабинета"""
+    response = await client.post("/api/v1/auth/login", json={"user_id": "U000000", "password": PASSWORD})
+    if response.status_code != 200:
+        raise SystemExit(f"вход не работает: {response.status_code} {response.text[:200]}")
+    headers = {"Authorization": f"Bearer {response.json()['token']}"}
+    response = await client.get("/api/v1/cabinet/dashboard", headers=headers)
+    if response.status_code != 200:
+        raise SystemExit(f"токен со входа не принят: {response.status_code} {response.text[:200]}")
+
+
+SCENARIOS = ["browse", "search", "login_storm", "cart_churn", "checkout", "dashboard"]
+REDIS_SCENARIOS = {"cart_churn", "checkout", "dashboard"}
+# Ожидаемые отказы, не ошибки: 409 — товар кончился, 400 — сумма ниже минимальной
+EXPECTED_STATUSES = {"checkout": {409, 400}}
+DEFAULT_OPERATIONS = {"login_storm": 200}
+
+
+# ========== ПРОГОН ==========
+
+async def run_scenario(name: str, step, client_factory, operations: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    timings: list[float] = []
+    statuses: Counter = Counter()
+
+    async with client_factory() as client:
+        async def one(i: int):
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    results = await step(client, i)
+                except httpx.HTTPError:
+                    results = [("transport", 0)]
+                timings.append((time.perf_counter() - started) * 1000)
+                statuses.update(f"{endpoint}:{status}" for endpoint, status in results)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(operations)))
+        elapsed = time.perf_counter() - started
+
+    timings.sort()
+    expected = EXPECTED_STATUSES.get(name, set())
+    errors = 0
+    for key, count in statuses.items():
+        status = int(key.rsplit(":", 1)[1])
+        if status == 0 or (status >= 400 and status not in expected):
+            errors += count
+    return {
+        "operations": operations,
+        "ops_per_sec": round(operations / elapsed, 1),
+        "p50_ms": round(percentile(timings, 50), 2),
+        "p95_ms": round(percentile(timings, 95), 2),
+        "p99_ms": round(percentile(timings, 99), 2),
+        "errors": errors,
+        "statuses": dict(sorted(statuses.items())),
+    }
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * pct / 100))]
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if result["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {result['p95_ms']} ms > baseline {base['p95_ms']} ms")
+        if result["ops_per_sec"] < base["ops_per_sec"] * (1 - tolerance):
+            regressions.append(f"{name}: {result['ops_per_sec']} ops/s < baseline {base['ops_per_sec']} ops/s")
+    return regressions
+
+
+async def redis_available() -> bool:
+    try:
+        await cart_service.redis.ping()
+        return True
+    except (RedisError, OSError):
+        return False
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("scenarios", nargs="*", help=f"Сценарии из {', '.join(SCENARIOS)} (по умолчанию все)")
+    parser.add_argument("--url", help="Гонять запросы в запущенный сервер вместо ASGI в процессе")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--orders", type=int, default=20000)
+    parser.add_argument("--operations", type=int, default=1000, help="Операций на сценарий")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--no-seed", action="store_true", help="Не пересоздавать данные")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--with-logs", action="store_true", help="Не глушить INFO-логи приложения")
+    args = parser.parse_args()
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"неизвестные сценарии: {', '.join(sorted(unknown))}")
+
+    if not args.with_logs:
+        logging.getLogger("fenix").setLevel(logging.WARNING)
+    if not args.no_seed:
+        started = time.perf_counter()
+        await seed(args.users, args.products, args.orders)
+        print(f"seed: {args.users} users, {args.products} products, {args.orders} orders "
+              f"за {time.perf_counter() - started:.1f} s")
+
+    scenarios = Scenarios(args.users, args.products)
+    if not args.url:
+        settings.auth_rate_ip_per_minute = settings.auth_rate_ip_burst = 10 ** 9
+        settings.auth_rate_user_per_minute = settings.auth_rate_user_burst = 10 ** 9
+
+    def client_factory():
+        if args.url:
+            return httpx.AsyncClient(base_url=args.url, timeout=60)
+        # Исключение в хендлере — это ответ 500 и ошибка в отчёте, а не обрыв всего прогона
+        transport = httpx.ASGITransport(app=api, raise_app_exceptions=False)
+        return httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60)
+
+    lifespan = contextlib.nullcontext() if args.url else api.router.lifespan_context(api)
+    results = {}
+    async with lifespan:
+        has_redis = await redis_available()
+        if has_redis:
+            async with client_factory() as client:
+                await check_auth(client)
+        for name in args.scenarios or SCENARIOS:
+            if name in REDIS_SCENARIOS and not has_redis:
+                print(f"{name}: Redis недоступен, пропущен")
+                continue
+            operations = min(args.operations, DEFAULT_OPERATIONS.get(name, args.operations))
+            result = await run_scenario(name, getattr(scenarios, name), client_factory, operations, args.concurrency)
+            results[name] = result
+            print(f"{name:<12} {result['ops_per_sec']:8.1f} ops/s  p50={result['p50_ms']:8.2f}  "
+                  f"p95={result['p95_ms']:8.2f}  p99={result['p99_ms']:8.2f} ms  errors={result['errors']}")
+            if result["errors"]:
+                print(f"{'':<12} {result['statuses']}")
+
+    await engine.dispose()
+
+    # Цифры сравнимы только при тех же объёмах, нагрузке и СУБД
+    params = {
+        "target": args.url or engine.dialect.name, "users": args.users, "products": args.products,
+        "orders": args.orders, "operations": args.operations, "concurrency": args.concurrency,
+    }
+    if args.save_baseline:
+        baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+        if baseline.get("params") != params:
+            baseline = {}
+        baseline["params"] = params
+        baseline.setdefault("scenarios", {}).update({
+            name: {key: result[key] for key in ("ops_per_sec", "p50_ms", "p95_ms", "p99_ms")}
+            for name, result in results.items()
+        })
+        args.baseline.write_text(json.dumps(baseline, indent=2, ensure_ascii=False) + "\n")
+        print(f"baseline сохранён: {args.baseline}")
+        return
+
+    if not args.baseline.exists():
+        print("baseline нет — запустите с --save-baseline")
+        return
+    baseline = json.loads(args.baseline.read_text())
+    if baseline.get("params") != params:
+        print(f"baseline снят с другими параметрами ({baseline.get('params')}) — сравнение пропущено")
+        return
+    regressions = compare(results, baseline["scenarios"], args.tolerance)
+    for line in regressions:
+        print(f"РЕГРЕССИЯ {line}")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,72 @@
+"""
+Латентность лёгких запросов во время «шторма» логинов.
+
+Сравнивает bcrypt прямо в event loop (как было) с пулом PasswordHasher:
+пока N корутин проверяют пароли, параллельно идут запросы к /health
+через ASGI, и для них считаются p50/p99.
+
+    python -m benchmarks.login_storm_bench --logins 200
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+from app.main import app
+from app.services.auth import AuthService, pwd_context
+from app.services.hashing import password_hasher
+
+
+async def probe(client: httpx.AsyncClient, stop: asyncio.Event, timings: list):
+    # Время считается от момента, когда запрос должен был уйти, поэтому
+    # сюда попадает и простой event loop, заблокированного bcrypt.
+    while not stop.is_set():
+        scheduled = time.perf_counter() + 0.005
+        await asyncio.sleep(0.005)
+        await client.get("/health")
+        timings.append((time.perf_counter() - scheduled) * 1000)
+
+
+async def inline_login(password: str, hashed: str):
+    return pwd_context.verify(password, hashed)
+
+
+async def pooled_login(password: str, hashed: str):
+    return await AuthService.verify_and_update_password(password, hashed)
+
+
+async def run(name: str, login, logins: int, hashed: str):
+    timings: list[float] = []
+    stop = asyncio.Event()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        prober = asyncio.create_task(probe(client, stop, timings))
+        started = time.perf_counter()
+        await asyncio.gather(*(login("correct horse", hashed) for _ in range(logins)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await prober
+
+    timings.sort()
+    p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+    print(
+        f"{name:<8} logins/s={logins / elapsed:7.1f}  probe n={len(timings):4d}  "
+        f"p50={statistics.median(timings):8.2f} ms  p99={p99:8.2f} ms"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=200)
+    args = parser.parse_args()
+
+    password_hasher.max_queue = args.logins
+    hashed = pwd_context.hash("correct horse")
+    await run("inline", inline_login, args.logins, hashed)
+    await run("pooled", pooled_login, args.logins, hashed)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,102 @@
+"""
+Пропускная способность почтовой очереди против локального SMTP (aiosmtpd):
+N писем через Redis и пул постоянных соединений против отдельного
+соединения на каждое письмо.
+
+    python -m benchmarks.mail_bench --messages 2000 --pool-size 4
+    python -m benchmarks.mail_bench --fail-rate 0.1     # часть писем с 451 — проверка повторов
+
+Нужен Redis из REDIS_URL; ключи mail:* должны быть пусты (бенчмарк не
+трогает чужие письма и откажется запускаться).
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from aiosmtpd.controller import Controller
+from redis.exceptions import RedisError
+
+from app.config import settings
+from app.services import mail
+from app.services.mail import MailQueue, SMTPPool
+
+
+class CountingHandler:
+    """Принимает письма; доля fail_rate получает 451 на первой попытке"""
+
+    def __init__(self, fail_rate: float):
+        self.fail_rate = fail_rate
+        self.received: set[str] = set()
+        self.refused: set[str] = set()
+
+    async def handle_DATA(self, server, session, envelope):
+        recipient = envelope.rcpt_tos[0]
+        if recipient not in self.refused and random.random() < self.fail_rate:
+            self.refused.add(recipient)
+            return "451 Try again later"
+        self.received.add(recipient)
+        return "250 OK"
+
+
+async def run(queue: MailQueue, count: int) -> float:
+    await queue.enqueue_many([
+        (f"user{i}@bench.local", "order_confirmation",
+         {"order_number": f"F{i}", "items": "Товар × 1 — 1000 KZT", "total": "1000", "bonus_earned": 10})
+        for i in range(count)
+    ])
+    started = time.perf_counter()
+    while True:
+        if not await queue.process_batch():
+            pending = await queue.queue_stats()
+            if not pending["retry"]:
+                break
+            # Повторы ждут своего времени в mail:retry — ускоряем для бенчмарка
+            await queue.redis.zadd(mail.RETRY_KEY, {
+                member: 0 for member in await queue.redis.zrange(mail.RETRY_KEY, 0, -1)
+            })
+    return time.perf_counter() - started
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--pool-size", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--smtp-port", type=int, default=8026)
+    args = parser.parse_args()
+
+    handler = CountingHandler(args.fail_rate)
+    controller = Controller(handler, hostname="127.0.0.1", port=args.smtp_port)
+    controller.start()
+    try:
+        for label, idle_timeout in (("pooled", 60.0), ("connect-per-message", 0.0)):
+            handler.received.clear()
+            handler.refused.clear()
+            smtp = SMTPPool("127.0.0.1", args.smtp_port, "", "", size=args.pool_size, idle_timeout=idle_timeout)
+            queue = MailQueue(settings.redis_url, smtp, batch_size=args.batch_size, max_attempts=3,
+                              retry_base=0.01, visibility_timeout=60, poll_interval=0.1)
+            try:
+                pending = await queue.queue_stats()
+            except (RedisError, OSError):
+                print("Redis недоступен, бенчмарк пропущен")
+                return
+            if any(pending.values()):
+                print(f"В mail:* уже есть письма {pending} — бенчмарк не запущен")
+                await queue.stop()
+                return
+
+            elapsed = await run(queue, args.messages)
+            await queue.stop()
+            lost = args.messages - len(handler.received)
+            print(f"{label}: {args.messages} писем за {elapsed:.2f}s = {args.messages / elapsed:,.0f}/s "
+                  f"connects={smtp.stats['connects']} reused={smtp.stats['reused']} "
+                  f"retried={queue.stats['retried']} dead={queue.stats['dead']} lost={lost}")
+            assert lost == 0, "письма потеряны"
+    finally:
+        controller.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
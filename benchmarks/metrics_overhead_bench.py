@@ -0,0 +1,57 @@
+"""
+Накладные расходы MetricsMiddleware на запрос: пустое ASGI-приложение
+с middleware и без него, плюс стоимость хуков SQLAlchemy на один запрос.
+
+    python -m benchmarks.metrics_overhead_bench --requests 200000
+"""
+import argparse
+import asyncio
+import time
+from types import SimpleNamespace
+
+from app.services.metrics import MetricsMiddleware, RequestMetrics
+
+ROUTE = SimpleNamespace(path="/api/v1/shop/products/{product_id}")
+
+
+async def endpoint(scope, receive, send):
+    scope["route"] = ROUTE
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b'{"success":true}'})
+
+
+async def receive():
+    return {"type": "http.request", "body": b""}
+
+
+async def send(message):
+    pass
+
+
+async def run(app, requests: int) -> float:
+    started = time.perf_counter()
+    for i in range(requests):
+        await app({"type": "http", "method": "GET", "path": f"/api/v1/shop/products/p{i}"}, receive, send)
+    return (time.perf_counter() - started) / requests * 1e6
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200000)
+    args = parser.parse_args()
+
+    metrics = RequestMetrics()
+    bare = await run(endpoint, args.requests)
+    wrapped = await run(MetricsMiddleware(endpoint, metrics), args.requests)
+    print(f"без middleware {bare:.2f} µs/запрос, с middleware {wrapped:.2f} µs/запрос, "
+          f"накладные {wrapped - bare:.2f} µs")
+
+    started = time.perf_counter()
+    for _ in range(args.requests):
+        metrics.db_statement.observe(("SELECT",), 0.0012)
+    print(f"запись времени SQL-запроса {(time.perf_counter() - started) / args.requests * 1e6:.2f} µs")
+    print(f"/metrics: {len(metrics.render())} байт")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
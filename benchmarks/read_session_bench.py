@@ -0,0 +1,129 @@
+"""
+Сессия для чтения (get_read_db) против get_db на запросах каталога:
+латентность и сколько времени соединение реально занято.
+
+    python -m benchmarks.read_session_bench --requests 2000 --concurrency 50
+
+Таблицы в DATABASE_URL пересоздаются; DATABASE_READ_URL, если задан, должен
+смотреть на ту же базу. --render-ms имитирует работу хендлера после запросов
+(сериализация ответа): get_db держит соединение и на ней, get_read_db — нет.
+На SQLite каждая лишняя выдача соединения заметно дороже, чем на asyncpg,
+поэтому по req/s ориентироваться стоит на прогон против PostgreSQL.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import event, insert
+from starlette.requests import Request
+
+from app.database import engine, read_engine, Base, AsyncSessionLocal, get_db, get_read_db
+from app.models.product import Category, Product
+from app.services.catalog import CatalogService
+
+
+async def seed(products: int, categories: int):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    now = datetime.now(timezone.utc)
+    async with AsyncSessionLocal() as session:
+        await session.execute(insert(Category), [
+            {"id": i + 1, "name": f"Категория {i}", "slug": f"cat-{i}", "sort_order": i, "is_active": True}
+            for i in range(categories)
+        ])
+        await session.execute(insert(Product), [{
+            "id": f"p{i}", "name": f"Товар {i}", "slug": f"p-{i}", "price": 1000 + i,
+            "category_id": i % categories + 1, "stock_quantity": 10, "in_stock": True, "is_active": True,
+            "created_at": now - timedelta(seconds=i),
+        } for i in range(products)])
+        await session.commit()
+
+
+class HoldTracker:
+    """Сколько миллисекунд соединения проводят вне пула"""
+
+    def __init__(self):
+        self.holds: list[float] = []
+        self.in_use = 0
+        self.peak = 0
+        for pool in {engine.sync_engine.pool, read_engine.sync_engine.pool}:
+            event.listen(pool, "checkout", self._checkout)
+            event.listen(pool, "checkin", self._checkin)
+
+    def _checkout(self, dbapi_connection, record, proxy):
+        record.info["checked_out_at"] = time.perf_counter()
+        self.in_use += 1
+        self.peak = max(self.peak, self.in_use)
+
+    def _checkin(self, dbapi_connection, record):
+        started = record.info.pop("checked_out_at", None)
+        if started is not None:
+            self.holds.append((time.perf_counter() - started) * 1000)
+        self.in_use -= 1
+
+    def reset(self):
+        self.holds.clear()
+        self.peak = self.in_use
+
+
+async def handler(dependency, render_ms: float, i: int):
+    request = Request({"type": "http", "method": "GET", "headers": []})
+    dependency_gen = dependency(request) if dependency is get_read_db else dependency()
+    db = await anext(dependency_gen)
+    if i % 2:
+        await CatalogService.list_categories(db)
+    else:
+        await CatalogService.list_products(db, category_id=i % 5 + 1, limit=20)
+    await asyncio.sleep(render_ms / 1000)
+    try:
+        await anext(dependency_gen)
+    except StopAsyncIteration:
+        pass
+
+
+async def run(name: str, dependency, tracker: HoldTracker, requests: int, concurrency: int, render_ms: float):
+    semaphore = asyncio.Semaphore(concurrency)
+    timings: list[float] = []
+
+    async def one(i: int):
+        async with semaphore:
+            started = time.perf_counter()
+            await handler(dependency, render_ms, i)
+            timings.append((time.perf_counter() - started) * 1000)
+
+    tracker.reset()
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - started
+
+    timings.sort()
+    holds = sorted(tracker.holds)
+    print(f"{name:12} {requests / elapsed:8.1f} req/s  p50={statistics.median(timings):6.2f} ms  "
+          f"p99={timings[int(len(timings) * 0.99) - 1]:6.2f} ms  "
+          f"conn hold p50={statistics.median(holds):6.2f} ms  checkouts={len(holds)}  peak in use={tracker.peak}")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--categories", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--render-ms", type=float, default=2.0)
+    args = parser.parse_args()
+
+    await seed(args.products, args.categories)
+    tracker = HoldTracker()
+    # прогрев пула и кэша планов
+    await run("warmup", get_db, tracker, 100, args.concurrency, 0)
+    await run("get_db", get_db, tracker, args.requests, args.concurrency, args.render_ms)
+    await run("get_read_db", get_read_db, tracker, args.requests, args.concurrency, args.render_ms)
+    await engine.dispose()
+    await read_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,110 @@
+"""
+Бенчмарк поиска товаров: tsvector + pg_trgm против наивного ILIKE.
+
+Запуск (нужен PostgreSQL в DATABASE_URL, таблицы создаются заново):
+    python -m benchmarks.search_bench --products 100000 --queries 500
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+from sqlalchemy import select, insert
+
+from app.database import engine, Base, AsyncSessionLocal
+from app.models.product import Product, Category
+from app.services.search import apply_search, ilike_condition, normalize_query
+
+WORDS = [
+    "крем", "сыворотка", "витамины", "леденцы", "батончик", "протеиновый",
+    "увлажняющий", "антивозрастной", "медовый", "натуральный", "детский",
+    "шампунь", "бальзам", "маска", "коллаген", "омега", "магний", "цинк",
+    "дәрумендер", "бал", "кілегей", "табиғи", "шоколадный", "ореховый",
+]
+QUERIES = [
+    "крем", "увлажняющие кремы", "витамин", "леденцы мед", "протеин",
+    "сывортка", "батончики", "табиғи", "коллагеновая маска", "шампуни",
+]
+
+
+def make_text(rng: random.Random, n: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n))
+
+
+async def seed(products: int):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+    rng = random.Random(42)
+    async with AsyncSessionLocal() as session:
+        await session.execute(insert(Category), [{"id": 1, "name": "Все", "slug": "all"}])
+        batch = []
+        for i in range(products):
+            batch.append({
+                "id": f"prod_{i:07d}",
+                "name": make_text(rng, 3),
+                "slug": f"prod-{i}",
+                "description": make_text(rng, 12),
+                "full_description": make_text(rng, 40),
+                "category_id": 1,
+                "price": rng.randint(500, 20000),
+            })
+            if len(batch) == 5000:
+                await session.execute(insert(Product), batch)
+                batch = []
+        if batch:
+            await session.execute(insert(Product), batch)
+        await session.commit()
+
+    async with engine.connect() as conn:
+        await conn.exec_driver_sql("ANALYZE products")
+
+
+async def measure(name: str, build, queries: int) -> None:
+    timings = []
+    async with AsyncSessionLocal() as session:
+        for i in range(queries):
+            stmt = build(QUERIES[i % len(QUERIES)]).limit(20)
+            started = time.perf_counter()
+            await session.execute(stmt)
+            timings.append((time.perf_counter() - started) * 1000)
+
+    timings.sort()
+    p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+    print(
+        f"{name:<10} p50={statistics.median(timings):7.2f} ms  "
+        f"p95={timings[int(len(timings) * 0.95)]:7.2f} ms  p99={p99:7.2f} ms"
+    )
+
+
+def fulltext(query: str):
+    stmt, rank = apply_search(select(Product.id), query, "postgresql")
+    return stmt.order_by(rank.desc())
+
+
+def naive(query: str):
+    return select(Product.id).where(ilike_condition(normalize_query(query)))
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--skip-seed", action="store_true")
+    args = parser.parse_args()
+
+    if engine.dialect.name != "postgresql":
+        raise SystemExit("Бенчмарк поиска требует PostgreSQL в DATABASE_URL")
+
+    if not args.skip_seed:
+        await seed(args.products)
+
+    await measure("fulltext", fulltext, args.queries)
+    await measure("ilike", naive, args.queries)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
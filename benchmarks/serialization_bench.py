@@ -0,0 +1,100 @@
+"""
+Стоимость кодирования ответов по эндпоинтам: прежний путь FastAPI
+(jsonable_encoder + json.dumps, для response_model — ещё и валидация)
+против orjson и готового сериализатора pydantic. Без БД и сети.
+
+    python -m benchmarks.serialization_bench --repeat 2000
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timezone
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from app.models.user import UserStatus, PartnershipType
+from app.schemas.user import TokenResponse
+from app.services.serialization import dumps
+
+
+def stdlib_encode(payload) -> bytes:
+    # То же, что JSONResponse.render после jsonable_encoder
+    return json.dumps(jsonable_encoder(payload), ensure_ascii=False, allow_nan=False,
+                      indent=None, separators=(",", ":")).encode()
+
+
+def product(i: int) -> dict:
+    return {
+        "id": f"p{i}", "name": f"Товар {i}", "description": "Описание товара " * 5,
+        "price": 12990.0 + i, "old_price": 15990.0, "discount_percent": 19, "currency": "KZT",
+        "category_id": i % 20, "category_name": "Витамины",
+        "images": [f"/media/products/p{i}/{n}.webp" for n in range(3)],
+        "in_stock": True, "stock_quantity": 40, "bonus_points": 120, "rating": 4.7, "reviews_count": 31,
+    }
+
+
+def payloads() -> dict:
+    now = datetime.now(timezone.utc)
+    user = {
+        "id": "ID0001", "full_name": "Айгерим Сапарова", "email": "a@fenix.kz", "phone": "+77010000000",
+        "city": "Алматы", "partnership_type": "leader", "status": "active", "main_balance": 125000.5,
+        "bonus_balance": 3200.0, "referral_code": "ABCDEF12", "created_at": now,
+    }
+    return {
+        "categories": {"success": True, "data": [
+            {"id": i, "name": f"Категория {i}", "slug": f"cat-{i}", "image_url": None, "product_count": 40}
+            for i in range(20)
+        ]},
+        "products x20": {"success": True, "data": [product(i) for i in range(20)],
+                         "pagination": {"limit": 20, "next_cursor": "WzEyOTkwLCJwMTkiXQ", "total": 5000}},
+        "products x100": {"success": True, "data": [product(i) for i in range(100)],
+                          "pagination": {"limit": 100, "next_cursor": "WzEyOTkwLCJwOTkiXQ", "total": 5000}},
+        "product card": {"success": True, "data": {
+            **product(1), "full_description": "Полное описание " * 60,
+            "category": {"id": 1, "name": "Витамины"},
+            "specifications": {f"Параметр {n}": f"Значение {n}" for n in range(15)}, "reviews": [],
+        }},
+        "dashboard": {"success": True, "data": {
+            "user": {"id": "ID0001", "full_name": "Айгерим Сапарова", "email": "a@fenix.kz",
+                     "partnership_type": PartnershipType.LEADER, "status": UserStatus.ACTIVE},
+            "balances": {"main_balance": 125000.5, "bonus_balance": 3200.0, "frozen_balance": 0.0, "currency": "KZT"},
+            "statistics": {"total_orders": 12, "total_purchases": 240000.0, "total_earnings": 56000.0,
+                           "active_referrals": 8, "team_size": 312},
+            "recent_activities": [],
+        }},
+        "token": {"success": True, "token": "eyJhbGciOiJIUzI1NiJ9." + "x" * 180, "user": user},
+    }
+
+
+def measure(func, payload, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func(payload)
+    return (time.perf_counter() - started) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    token_field = TypeAdapter(TokenResponse)
+    print(f"{'endpoint':16} {'bytes':>8} {'stdlib µs':>10} {'orjson µs':>10} {'speedup':>8}")
+    for name, payload in payloads().items():
+        if name == "token":
+            model = TokenResponse.model_validate(payload)
+            # Было: FastAPI снова валидирует модель по response_model и кодирует через json
+            old = measure(lambda m: stdlib_encode(token_field.validate_python(m.model_dump())), model, args.repeat)
+            new = measure(lambda m: m.__pydantic_serializer__.to_json(m), model, args.repeat)
+            size = len(model.__pydantic_serializer__.to_json(model))
+        else:
+            assert json.loads(stdlib_encode(payload)) == json.loads(dumps(payload))
+            old = measure(stdlib_encode, payload, args.repeat)
+            new = measure(dumps, payload, args.repeat)
+            size = len(dumps(payload))
+        print(f"{name:16} {size:8d} {old:10.1f} {new:10.1f} {old / new:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()